@@ -0,0 +1,79 @@
+import os
+import logging
+from collections import namedtuple
+
+from pipeline.script import count_mutations
+
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+# seconds of one core to fold a sequence of N nt is about FOLD_SECONDS_PER_NT3 * N^3
+# (MFE and partition function, 1024 nt take about 11 s)
+FOLD_SECONDS_PER_NT3 = float(os.getenv('SNP_FOLD_SECONDS_PER_NT3', 1e-8))
+# core-seconds of the queued and running analyses above which new analyses are refused
+COMPUTE_BUDGET = float(os.getenv('SNP_COMPUTE_BUDGET', 6 * 3600))
+# core-seconds of the largest analysis accepted, a larger single scan must use a reduced mode
+MAX_JOB_COST = float(os.getenv('SNP_MAX_JOB_COST', COMPUTE_BUDGET))
+# cores folding the queued analyses, used to estimate the waiting time
+COMPUTE_CORES = int(os.getenv('SNP_COMPUTE_CORES', os.cpu_count() or 1))
+
+# a pair analysis folds both sequences for RNApdist and RNAfold, then draws the plots
+PAIR_FOLDS = 4
+PAIR_OVERHEAD = 2.0
+
+# single scan modes, from the most to the least expensive
+SINGLE_MODES = ['full', 'substitutions']
+
+Decision = namedtuple('Decision', ['action', 'cost', 'wait', 'mode'])
+
+
+def estimate_cost(kind, length, mode='full'):
+    """
+    Estimates the compute cost of an analysis.
+
+    A single scan folds about 8N mutants of N nt, its cost grows with N^4.
+
+    Args:
+    - kind (str): "pair" or "single".
+    - length (int): Length of the wild-type sequence.
+    - mode (str): Single scan mode, "full" or "substitutions".
+
+    Returns:
+    - float: Estimated core-seconds.
+    """
+    fold = FOLD_SECONDS_PER_NT3 * length ** 3
+    if kind == 'pair':
+        return PAIR_FOLDS * fold + PAIR_OVERHEAD
+    if kind == 'single':
+        return (count_mutations(length, mode) + 1) * fold
+    raise ValueError(f"Unknown analysis kind: {kind}")
+
+
+def admit(kind, length, mode, pending_cost, budget=COMPUTE_BUDGET, max_job_cost=MAX_JOB_COST, cores=COMPUTE_CORES):
+    """
+    Decides whether an analysis can be queued.
+
+    Args:
+    - kind (str): "pair" or "single".
+    - length (int): Length of the wild-type sequence.
+    - mode (str): Requested single scan mode.
+    - pending_cost (float): Core-seconds of the queued and running analyses.
+
+    Returns:
+    - Decision: action is "accept", "reduce" (too expensive, mode gives the cheapest mode
+      small enough), "too_large" (too expensive in every mode) or "busy" (over the budget,
+      wait gives the estimated seconds before it can be accepted).
+    """
+    cost = estimate_cost(kind, length, mode)
+    if cost > max_job_cost:
+        if kind == 'single':
+            for reduced in SINGLE_MODES[SINGLE_MODES.index(mode) + 1:]:
+                if estimate_cost(kind, length, reduced) <= max_job_cost:
+                    return Decision('reduce', cost, 0.0, reduced)
+        return Decision('too_large', cost, 0.0, mode)
+
+    # an analysis is always accepted on an idle server
+    if pending_cost > 0 and pending_cost + cost > budget:
+        wait = (pending_cost + cost - budget) / cores
+        return Decision('busy', cost, wait, mode)
+    return Decision('accept', cost, 0.0, mode)
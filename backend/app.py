@@ -5,19 +5,29 @@ import logging
 import subprocess
 import os
 import uuid
-import shutil
 import eventlet
 import pandas as pd
-import requests
-import tempfile
-from concurrent.futures import ThreadPoolExecutor, as_completed, wait
-from pipeline.script import generate_mutations, process_mutation, generate_mutated_sequences
+import time
+import math
+import hashlib
+from pipeline.script import generate_mutations, count_mutations, generate_mutated_sequences, save_top_10_artifacts
+from pipeline.engine import get_engine, run_process
+from pipeline.scan import scan_mutations, run_in_worker, fold_wild_type_in_worker
+from pipeline.cache import get_fold_cache, TieredCache
+from pipeline.aggregate import ScanAggregator, COLUMNS as SCAN_COLUMNS
+from pipeline.checkpoint import ScanCheckpoint, CHECKPOINT_FILE, read_checkpoint_header
+from pipeline.dag import Node, run_dag
+from pipeline.precompress import precompress, load_manifest, ENCODING_SUFFIXES
 # db
 import re
 import numpy as np
-import scipy.stats as stats
 
 import db_func
+from jobs import create_job_queue, current_job, in_current_job, QueueFull, JobCancelled, JOB_BACKEND
+import admission
+import archive
+import dbsnp
+import migrations
 
 
 
@@ -30,6 +40,31 @@ logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# results of 01-RNApdist, 02-RNAfold and 03-RNAdistance kept in the fold cache for pair analyses
+PAIR_CACHE_PARAMS = 'pair-pipeline'
+PAIR_CACHED_FILES = [
+    'RNApdist-result.txt',
+    'wt-dotbracket.txt',
+    'mut-dotbracket.txt',
+    'RNAdistance-result.txt',
+    'RNAdistance-backtrack.txt'
+]
+
+# seconds between two provisional top 10 updates sent during a single scan
+PROVISIONAL_TOP_10_INTERVAL = 1.0
+
+# seconds the clients should wait before submitting again when the job queue is full
+QUEUE_FULL_RETRY_AFTER = 30
+# finished single results kept in memory by get_csv
+RESULTS_CACHE_ITEMS = int(os.getenv('SNP_RESULTS_CACHE_ITEMS', 256))
+# SVG paths and hashes kept in memory by get_svg_from_database
+SVG_CACHE_ITEMS = int(os.getenv('SNP_SVG_CACHE_ITEMS', 4096))
+# pictures of an analysis never change, browsers and proxies may keep them
+SVG_MAX_AGE = int(os.getenv('SNP_SVG_MAX_AGE', 365 * 24 * 3600))
+# rows per page of the mutations endpoint, by default and at most
+MUTATION_PAGE_SIZE = 100
+MAX_MUTATION_PAGE_SIZE = 1000
     
 """Database handling"""
 
@@ -77,143 +112,111 @@ def extract_dot_bracket_and_energy(file_content):
     else:
         raise ValueError("Nie udało się poprawnie wyodrębnić dot-bracket i energii.")
     
-def save_from_file_to_database(analysis_id):
-    pipeline_dir = os.path.join(BASE_DIR, 'pipeline', analysis_id)
+# each saver persists the outputs of one pipeline node as soon as the node finished,
+# in one transaction, a missing output marks the row as error; the saved status is returned
 
-    if not os.path.exists(pipeline_dir):
-        return jsonify({'error': 'Analysis not found'}), 404
+def read_result_file(analysis_dir, filename):
+    file_path = os.path.join(analysis_dir, filename)
+    if not os.path.exists(file_path):
+        return None
+    with open(file_path, 'r') as file:
+        return file.read()
 
-    file_save_to_db_as_text = [
-        'RNApdist-result.txt',
-        'RNAdistance-result.txt',
-        'RNAdistance-backtrack.txt', 
-        'mut-dotbracket.txt',   
-        'wt-dotbracket.txt'
-    ]
-    file_save_to_db_as_path = [
-        'mut-dotbracket.svg',
-        'wt-dotbracket.svg',
-        'tree_mut.svg',
-        'tree_wt.svg'
-    ]
-    file_RNApdsit_found = False
-    file_RNAdistance_result_found = False
-    file_RNAdistance_backtrack_found = False
-    file_mut_dotbracket_found = False
-    file_wt_dotbracket_found = False
-    file_mut_dotbracket_svg_found = False
-    file_wt_dotbracket_svg_found = False
-    file_mut_tree_svg_found = False
-    file_wt_tree_svg_found = False
-    full_content = "" 
-
-    for filename in file_save_to_db_as_text:
-        file_path = os.path.join(pipeline_dir, filename)
-        if os.path.exists(file_path):
-            with open(file_path, 'r') as file:
-                content = file.read()
-                full_content += f"=== {filename} ===\n{content}\n\n"
-                if filename == 'RNApdist-result.txt':
-                    file_RNApdsit_found = True
-                    try:
-                        with app.app_context():
-                            db_func.save_to_table_rna_pdist_result(analysis_id, float(content), 'completed')
-                    except ValueError:
-                        with app.app_context():
-                            db_func.save_to_table_rna_pdist_result(analysis_id, 0, 'error')
-                elif filename == 'RNAdistance-result.txt':
-                    file_RNAdistance_result_found = True
-                    params = parse_rnadistance_result_safe(content)
-                    with app.app_context():
-                        db_func.save_to_table_rna_distance_result(analysis_id, params, 'empty', 'in_progress')
-                elif filename == 'RNAdistance-backtrack.txt':
-                    file_RNAdistance_backtrack_found = True
-                    with app.app_context():
-                        db_func.save_to_table_rna_distance_result(analysis_id, 'empty', content, 'completed')
-                elif filename == 'mut-dotbracket.txt':
-                    file_mut_dotbracket_found = True
-                    mutant_dot_bracket, mutant_energy = extract_dot_bracket_and_energy(content)
-                    with app.app_context():
-                        db_func.save_to_table_rna_fold_result(analysis_id, 'empty', mutant_dot_bracket, 0, mutant_energy, 'in_progress', 1)
-                elif filename == 'wt-dotbracket.txt':
-                    file_wt_dotbracket_found = True
-                    wild_type_dot_bracket, wild_type_energy = extract_dot_bracket_and_energy(content)
-                    with app.app_context():
-                        db_func.save_to_table_rna_fold_result(analysis_id, wild_type_dot_bracket,'empty',wild_type_energy, 0, 'completed', 2)
-                else:
-
-                    logger.debug(f"{filename} not found")
-                    
-        else:
-            full_content += f"=== {filename} ===\nFile not found\n\n"
 
-    if not file_RNApdsit_found:
-        with app.app_context():
-            db_func.save_to_table_rna_pdist_result(analysis_id, 0, 'error')
+def save_result_row(analysis_id, table, row):
+    with app.app_context():
+        _, code = db_func.save_pair_results(analysis_id, {table: row})
+    return row['processing_status'] if code == 201 else 'error'
 
-    if not file_RNAdistance_result_found:
-        with app.app_context():
-            db_func.save_to_table_rna_distance_result(analysis_id, 'empty', 'empty', 'error')
-    
-    if not file_RNAdistance_backtrack_found:
-        with app.app_context():
-            db_func.save_to_table_rna_distance_result(analysis_id, 'null', 'empty', 'error')
-    
-    if not file_mut_dotbracket_found and not file_wt_dotbracket_found:
-        with app.app_context():
-            db_func.save_to_table_rna_fold_result(analysis_id, 'empty', 'empty', 0, 0, 'error', 3)
 
-    if not file_wt_dotbracket_found and file_mut_dotbracket_found:
-        with app.app_context():
-            db_func.save_to_table_rna_fold_result(analysis_id, 'not_exists', 'empty', 0, 0, 'error', 4)
-
-    for filename in file_save_to_db_as_path:
-        file_path = os.path.join(pipeline_dir, filename)
-        if os.path.exists(file_path):
-            if filename == 'mut-dotbracket.svg':
-                file_mut_dotbracket_svg_found = True
-                with app.app_context():
-                    db_func.save_to_table_rna_plot_result(analysis_id, file_path, 1)
-            elif filename == 'wt-dotbracket.svg':
-                file_wt_dotbracket_svg_found = True
-                with app.app_context():
-                    db_func.save_to_table_rna_plot_result(analysis_id, file_path, 2)
-            elif filename == 'tree_mut.svg':
-                file_mut_tree_svg_found = True
-                with app.app_context():
-                    db_func.save_to_table_tree_result(analysis_id, file_path, 1)
-            elif filename == 'tree_wt.svg':
-                file_wt_tree_svg_found = True
-                with app.app_context():
-                    db_func.save_to_table_tree_result(analysis_id, file_path, 2)
-            else:
-                logger.debug(f"{filename} not found")
-
-    if not file_mut_dotbracket_svg_found and not file_wt_dotbracket_svg_found:
-        with app.app_context():
-            db_func.save_to_table_rna_plot_result(analysis_id, 'empty', 4)
+def save_pdist_result(analysis_id, analysis_dir):
+    content = read_result_file(analysis_dir, 'RNApdist-result.txt')
+    try:
+        row = {'distance': float(content), 'processing_status': 'completed'}
+    except (TypeError, ValueError):
+        row = {'distance': 0, 'processing_status': 'error'}
+    return save_result_row(analysis_id, 'rna_pdist_result', row)
+
+
+def save_fold_result(analysis_id, analysis_dir):
+    row = {'wild_type_dot_bracket': 'empty', 'mutant_dot_bracket': 'empty', 'wild_type_energy': 0, 'mutant_energy': 0}
+    wt_content = read_result_file(analysis_dir, 'wt-dotbracket.txt')
+    mut_content = read_result_file(analysis_dir, 'mut-dotbracket.txt')
+    if wt_content is not None:
+        row['wild_type_dot_bracket'], row['wild_type_energy'] = extract_dot_bracket_and_energy(wt_content)
+    if mut_content is not None:
+        row['mutant_dot_bracket'], row['mutant_energy'] = extract_dot_bracket_and_energy(mut_content)
+    row['processing_status'] = 'completed' if wt_content is not None and mut_content is not None else 'error'
+    return save_result_row(analysis_id, 'rna_fold_result', row)
+
+
+def save_distance_result(analysis_id, analysis_dir):
+    result_content = read_result_file(analysis_dir, 'RNAdistance-result.txt')
+    backtrack_content = read_result_file(analysis_dir, 'RNAdistance-backtrack.txt')
+    params = parse_rnadistance_result_safe(result_content or '')
+    row = {
+        'distance_f': params['f'], 'distance_h': params['h'], 'distance_w': params['w'], 'distance_c': params['c'],
+        'distance_big_f': params['F'], 'distance_big_h': params['H'], 'distance_big_w': params['W'],
+        'distance_big_c': params['C'], 'distance_big_p': params['P'],
+        'backtrack_data': backtrack_content if backtrack_content is not None else 'empty',
+        'processing_status': 'completed' if result_content is not None and backtrack_content is not None else 'error'
+    }
+    return save_result_row(analysis_id, 'rna_distance_result', row)
+
+
+def precompress_svgs(analysis_id, paths):
+    # the compressed variants are stored once, when the pictures are drawn, not on every request
+    for path in paths:
+        svg_cache.delete(f"{analysis_id}/{os.path.basename(path)}")
+        if os.path.exists(path):
+            try:
+                precompress(path)
+            except OSError as e:
+                logger.error(f"Error while precompressing {path}: {e}")
+
+
+def save_plot_result(analysis_id, analysis_dir):
+    wt_file_path = os.path.join(analysis_dir, 'wt-dotbracket.svg')
+    mut_file_path = os.path.join(analysis_dir, 'mut-dotbracket.svg')
+    precompress_svgs(analysis_id, [wt_file_path, mut_file_path])
+    row = {
+        'wild_type_url': wt_file_path if os.path.exists(wt_file_path) else 'empty',
+        'mutant_url': mut_file_path if os.path.exists(mut_file_path) else 'empty',
+        'processing_status': 'completed' if os.path.exists(wt_file_path) and os.path.exists(mut_file_path) else 'error'
+    }
+    return save_result_row(analysis_id, 'rna_plot_result', row)
 
-    if not file_wt_dotbracket_svg_found and file_mut_dotbracket_svg_found:
-        with app.app_context():
-            db_func.save_to_table_rna_plot_result(analysis_id, 'empty', 3)
-    
-    if not file_mut_tree_svg_found and not file_wt_tree_svg_found:
-        with app.app_context():
-            db_func.save_to_table_tree_result(analysis_id, 'empty', 4)
 
-    if not file_wt_tree_svg_found and file_mut_tree_svg_found:
-        with app.app_context():
-            db_func.save_to_table_tree_result(analysis_id, 'empty', 3) 
+def save_tree_result(analysis_id, analysis_dir):
+    wt_file_path = os.path.join(analysis_dir, 'tree_wt.svg')
+    mut_file_path = os.path.join(analysis_dir, 'tree_mut.svg')
+    precompress_svgs(analysis_id, [wt_file_path, mut_file_path])
+    row = {
+        'tree_wt_url': wt_file_path if os.path.exists(wt_file_path) else 'empty',
+        'tree_mut_url': mut_file_path if os.path.exists(mut_file_path) else 'empty',
+        'processing_status': 'completed' if os.path.exists(wt_file_path) and os.path.exists(mut_file_path) else 'error'
+    }
+    return save_result_row(analysis_id, 'tree_result', row)
+
+
+PAIR_SAVERS = [save_pdist_result, save_fold_result, save_distance_result, save_plot_result, save_tree_result]
 
 """Helper functions for API"""
 
 #helper functions for executing pipeline
 
 def run_step(step_name, command, cwd, analysis_id):
+    # the step runs in its own process group, killed with its children on timeout or cancel
+    job = current_job()
     try:
-        subprocess.run(command, cwd=cwd, check=True)
+        result = run_process(command, cwd=cwd, groups=job.process_groups if job else None)
+        if result.returncode != 0:
+            raise subprocess.CalledProcessError(result.returncode, command, result.stdout, result.stderr)
         
-    except subprocess.CalledProcessError as e:
+    except subprocess.SubprocessError as e:
+        if job:
+            job.check()
+        logger.error(f"Step {step_name} of analysis {analysis_id} failed: {e}")
         socketio.emit('task_status', {'analysis_id': analysis_id, 'status': 'failed', 'step': step_name, 'error': str(e)}, namespace=f'/{analysis_id}')
         with app.app_context():
             db_func.update_table_pair(analysis_id, 'error')
@@ -241,74 +244,136 @@ def run_pipeline(mutant_sequence, wild_sequence, analysis_id):
 
     
 
-    steps = [
-        ("01-RNApdist", ['bash', os.path.join(BASE_DIR, 'pipeline', '01-RNApdist')]),
-        ("02-RNAfold", ['bash', os.path.join(BASE_DIR, 'pipeline', '02-RNAfold')]),
-        ("03-RNAdistance", ['bash', os.path.join(BASE_DIR, 'pipeline', '03-RNAdistance')]),
-        ("04-RNAplot", ['bash', os.path.join(BASE_DIR, 'pipeline', '04-RNAplot')]),
-        ("HITtree", ['python3', os.path.join(BASE_DIR, 'pipeline', 'tree.py'), analysis_dir])
+    def script(name):
+        return ['bash', os.path.join(BASE_DIR, 'pipeline', name)]
+
+    commands = {
+        "01-RNApdist": script('01-RNApdist'),
+        "02-RNAfold-wt": script('02-RNAfold') + ['wt'],
+        "02-RNAfold-mut": script('02-RNAfold') + ['mut'],
+        "03-RNAdistance": script('03-RNAdistance'),
+        "04-RNAplot": script('04-RNAplot'),
+        "HITtree": ['python3', os.path.join(BASE_DIR, 'pipeline', 'tree.py'), analysis_dir]
+    }
 
+    # folds and distances of a pair analysed before are restored from the cache,
+    # only the plots are drawn again
+    cache = get_fold_cache()
+    cached_files = cache.get_pair(PAIR_CACHE_PARAMS, wild_sequence, mutant_sequence)
+    if cached_files is not None:
+        for filename, content in cached_files.items():
+            with open(os.path.join(analysis_dir, filename), 'w') as file:
+                file.write(content)
+        for step_name in ["01-RNApdist", "02-RNAfold-wt", "02-RNAfold-mut", "03-RNAdistance"]:
+            commands[step_name] = None
+
+    def step(step_name):
+        command = commands[step_name]
+        return in_current_job(lambda: command is None or run_step(step_name, command, analysis_dir, analysis_id))
+
+    outcomes = {}
+
+    def save(saver):
+        def run():
+            outcomes[saver.__name__] = saver(analysis_id, analysis_dir)
+        return in_current_job(run)
+
+    # RNApdist and the two folds are independent, every result is saved once its step finished
+    nodes = [
+        Node("01-RNApdist", [], step("01-RNApdist")),
+        Node("02-RNAfold-wt", [], step("02-RNAfold-wt")),
+        Node("02-RNAfold-mut", [], step("02-RNAfold-mut")),
+        Node("03-RNAdistance", ["02-RNAfold-wt", "02-RNAfold-mut"], step("03-RNAdistance")),
+        Node("04-RNAplot", ["02-RNAfold-wt", "02-RNAfold-mut"], step("04-RNAplot")),
+        Node("HITtree", ["03-RNAdistance"], step("HITtree")),
+        Node("save-pdist", ["01-RNApdist"], save(save_pdist_result)),
+        Node("save-fold", ["02-RNAfold-wt", "02-RNAfold-mut"], save(save_fold_result)),
+        Node("save-distance", ["03-RNAdistance"], save(save_distance_result)),
+        Node("save-plot", ["04-RNAplot"], save(save_plot_result)),
+        Node("save-tree", ["HITtree"], save(save_tree_result))
     ]
 
-    for step_name, command in steps:
-        if not run_step(step_name, command, analysis_dir, analysis_id):
-            return
+    job = current_job()
+    if run_dag(nodes, check=job.check if job else None):
+        return
+
+    if cached_files is None:
+        store_pair_in_cache(cache, analysis_dir, wild_sequence, mutant_sequence)
 
-    save_from_file_to_database(analysis_id)
     with app.app_context():
-        db_func.update_table_pair(analysis_id, 'completed')
+        db_func.update_table_pair(analysis_id, pair_status(outcomes.values()))
 
 
-#helper functions for dbSNP
+def pair_status(outcomes):
+    # the pair is completed when every saved result is, no need to read them back
+    outcomes = list(outcomes)
+    return 'completed' if len(outcomes) == len(PAIR_SAVERS) and all(status == 'completed' for status in outcomes) else 'error'
 
-def get_sequence(chromosome, start_pos, end_pos):
-    """
-    Fetch DNA sequence from Ensembl REST API for given genomic coordinates
-    """
-    base_url = "https://rest.ensembl.org/sequence/region/human"
-    headers = {"Content-Type": "application/json"}
-    region = f"{chromosome}:{start_pos}..{end_pos}"
-    url = f"{base_url}/{region}"
-    params = {"coord_system_version": "GRCh38"}
+
+def store_pair_in_cache(cache, analysis_dir, wild_sequence, mutant_sequence):
+    cached_files = {}
+    for filename in PAIR_CACHED_FILES:
+        file_path = os.path.join(analysis_dir, filename)
+        if not os.path.exists(file_path):
+            return
+        with open(file_path) as file:
+            cached_files[filename] = file.read()
+    cache.set_pair(PAIR_CACHE_PARAMS, wild_sequence, mutant_sequence, cached_files)
 
 
+#helper functions for the job queue
 
-    try:
-        response = requests.get(url, headers=headers, params=params)
-        response.raise_for_status()
-        response_json = response.json()
+def mark_analysis_failed(analysis_id, error):
+    status, code = db_func.read_processing_status(analysis_id)
+    if code != 200:
+        return
+    if status['type'] == 'pair':
+        db_func.update_table_pair(analysis_id, 'error')
+    else:
+        db_func.update_table_single(analysis_id, 'error')
+        for rank in range(1, 11):
+            db_func.update_table_top_10(analysis_id, 'empty', str(rank), 'error')
+    message = str(error) if isinstance(error, JobCancelled) else "Analysis failed"
+    socketio.emit('task_status', {'analysis_id': analysis_id, 'status': message}, broadcast=True, namespace=f'/{analysis_id}')
 
-        return response_json
 
-    except requests.exceptions.RequestException as e:
-        return {"error": str(e)}
-    except ValueError as e:
-        return {"error": "Invalid JSON response"}
-    except Exception as e:
-        return {"error": "Unexpected error"}
+def admission_response(decision):
+    """Response to an analysis refused by admission.admit."""
+    if decision.action == 'reduce':
+        return jsonify({
+            'error': 'Sequence too long for a full scan, use a reduced mode',
+            'required_mode': decision.mode,
+            'estimated_cost': decision.cost
+        }), 422
+    if decision.action == 'too_large':
+        return jsonify({'error': 'Sequence too long to be analysed', 'estimated_cost': decision.cost}), 413
+
+    response = jsonify({
+        'error': 'Too many analyses in progress, try again later',
+        'estimated_wait': decision.wait
+    })
+    response.headers['Retry-After'] = str(math.ceil(decision.wait))
+    return response, 429
 
 
-def search_clinical_tables(snp_id):
+def enqueue_analysis(analysis_id, cost, kind, *args):
     """
-    Search clinicaltables.nlm.nih.gov API for SNP information
-    Args:
-        snp_id (str): RS ID of the SNP (e.g., 'rs328')
+    Runs an analysis on the job queue.
+
     Returns:
-        dict: Response from clinical tables API
+    - Response: 202 with the analysis_id, or 503 when the queue is full.
     """
-    base_url = "https://clinicaltables.nlm.nih.gov/api/snps/v3/search"
-    params = {
-        "terms": snp_id,
-        "maxList": 1,
-        "df": "rsNum,38.alleles,38.chr,38.pos",
-    }
-
     try:
-        response = requests.get(base_url, params=params)
-        response.raise_for_status()
-        return response.json()
-    except Exception as e:
-        return {"error": str(e)}
+        job_queue.submit(analysis_id, kind, *args, cost=cost)
+    except QueueFull as e:
+        mark_analysis_failed(analysis_id, e)
+        response = jsonify({'error': 'Too many analyses in progress, try again later'})
+        response.headers['Retry-After'] = str(QUEUE_FULL_RETRY_AFTER)
+        return response, 503
+    except RuntimeError as e:
+        logger.error(f"Error while queueing analysis {analysis_id}: {e}")
+        return jsonify({'error': 'Failed to queue the analysis'}), 500
+    return jsonify({"analysis_id": analysis_id}), 202
 
 
 """API endpoints"""
@@ -326,6 +391,10 @@ def analyze_pair():
     if not wild_sequence or not mutant_sequence:
         return jsonify({'error': 'Invalid input data'}), 400
 
+    decision = admission.admit('pair', max(len(wild_sequence), len(mutant_sequence)), 'full', job_queue.pending_cost())
+    if decision.action != 'accept':
+        return admission_response(decision)
+
     #analysis_id = str(uuid.uuid4())
     socketio.emit('task_status', {'analysis_id': analysis_id, 'status': "Analysis started"}, broadcast=True, namespace=f'/{analysis_id}')
 
@@ -333,30 +402,64 @@ def analyze_pair():
         db_func.save_to_table_pair(analysis_id, wild_sequence, mutant_sequence, 'pending')
    
 
-    run_pipeline(mutant_sequence, wild_sequence, analysis_id)
+    return enqueue_analysis(analysis_id, decision.cost, 'pair', mutant_sequence, wild_sequence, analysis_id)
+
 
-    return jsonify({"analysis_id": analysis_id}), 200
+# "<analysis_id>/<file name>" -> path of the SVG and its precompression manifest
+svg_cache = TieredCache(None, memory_items=SVG_CACHE_ITEMS, max_bytes=0)
+
+# column of the result tables holding an SVG of a pair analysis -> endpoint serving it
+PAIR_SVGS = {
+    'wild_type_url': 'rna-plot-wt',
+    'mutant_url': 'rna-plot-mut',
+    'tree_wt_url': 'hit-tree-wt',
+    'tree_mut_url': 'hit-tree-mut'
+}
 
 
 @app.route('/api/results/pair/<analysis_id>', methods=['GET'])
 def read_from_database(analysis_id):
     try:
-        pdist_result, _ = db_func.read_from_table_rna_pdist_result(analysis_id)
-        fold_result, _ = db_func.read_from_table_rna_fold_result(analysis_id)
-        distance_result, _ = db_func.read_from_table_rna_distance_result(analysis_id)
+        row, code = db_func.read_pair_results(analysis_id)
+        if code != 200:
+            return jsonify(row), code
 
-        sequences, _ = db_func.read_sequences_from_database_pair(analysis_id)
-        if isinstance(sequences, tuple):
-            return sequences  
+        # results not saved yet keep the messages of the former per-table reads
+        if row['pdist_task_id'] is not None:
+            pdist_result = row['distance']
+        else:
+            pdist_result = "file RNApdist_result.txt not found\n"
+        if row['fold_task_id'] is not None:
+            fold_result = {'mutant_energy': row['mutant_energy'], 'wild_type_energy': row['wild_type_energy']}
+        else:
+            fold_result = "files: mut-dotbarcket.txt wt_dotbracket.txt not found"
+        if row['distance_task_id'] is not None:
+            distance_result = {
+                "RNAdistance_result": {
+                    "f": row['distance_f'], "h": row['distance_h'], "w": row['distance_w'], "c": row['distance_c'],
+                    "F": row['distance_big_f'], "H": row['distance_big_h'], "W": row['distance_big_w'],
+                    "C": row['distance_big_c'], "P": row['distance_big_p']
+                },
+                "RNAdistance_backtrack": row['backtrack_data']
+            }
+        else:
+            distance_result = "file RNAdistance-result.txt and RNAdistance-backtrack.txt not found\n"
+
+        # URLs of the SVG endpoints, None for a picture the pipeline did not draw
+        svg = {endpoint: (f"/api/results/pair/{analysis_id}/{endpoint}" if row[column] not in (None, 'empty') else None)
+               for column, endpoint in PAIR_SVGS.items()}
 
         return jsonify({
             'RNApdist': pdist_result,
             'RNAfold': fold_result,
             'RNAdistance': distance_result,
-            "wt_sequence": sequences.get("wild_type_sequence"),
-            "mut_sequence": sequences.get("mutant_sequence")
+            "wt_sequence": row["wild_type_sequence"],
+            "mut_sequence": row["mutant_sequence"],
+            "processing_status": row["processing_status"],
+            "svg": svg
         })
     except Exception as e:
+        logger.error(f"Error while reading the results of analysis {analysis_id}: {e}")
         return jsonify({"error": "Failed to fetch results"}), 500
 
 
@@ -377,25 +480,56 @@ def get_svg_hit_tree_mut(analysis_id):
     return get_svg_from_database(analysis_id, 'tree_mut.svg')
 
 def get_svg_from_database(analysis_id, filename):
-    if filename == 'mut-dotbracket.svg' or filename == 'wt-dotbracket.svg':
-        svg_path = db_func.extract_mut_or_wt_dotbracket_svg_from_database(analysis_id, filename)
-    
-    if filename == 'tree_wt.svg' or filename == 'tree_mut.svg':
-        svg_path = db_func.extract_mut_or_wt_tree_svg_from_database(analysis_id, filename)
+    # the path and hashes of a picture never change once drawn, the database is asked once
+    key = f"{analysis_id}/{filename}"
+    entry = svg_cache.get(key)
+    if entry is None or not os.path.exists(entry['path']):
+        if filename == 'mut-dotbracket.svg' or filename == 'wt-dotbracket.svg':
+            svg_path = db_func.extract_mut_or_wt_dotbracket_svg_from_database(analysis_id, filename)
+
+        if filename == 'tree_wt.svg' or filename == 'tree_mut.svg':
+            svg_path = db_func.extract_mut_or_wt_tree_svg_from_database(analysis_id, filename)
+
+        if not isinstance(svg_path, str) or not os.path.exists(svg_path):
+            return jsonify({'error': 'SVG file not found'}), 404
+
+        entry = {'path': svg_path, 'manifest': load_manifest(svg_path)}
+        svg_cache.set(key, entry)
+
+    return send_svg(entry)
+
+
+def send_svg(entry):
+    """
+    Sends a picture in the best encoding accepted by the client.
+
+    Args:
+    - entry (dict): Path of the SVG and its precompression manifest.
 
-    if not os.path.exists(svg_path):
-        return jsonify({'error': 'SVG file not found'}), 404
+    Returns:
+    - Response: The picture with a strong ETag of the sent bytes and long-lived cache headers.
+    """
+    manifest = entry['manifest']
+    path, etag, encoding = entry['path'], manifest['sha256'], None
+    # ENCODING_SUFFIXES is in order of preference, br before gzip
+    for candidate, suffix in ENCODING_SUFFIXES.items():
+        if candidate in manifest['encodings'] and request.accept_encodings.quality(candidate) > 0:
+            path, etag, encoding = entry['path'] + suffix, manifest['encodings'][candidate]['sha256'], candidate
+            break
 
-    return send_file(svg_path, mimetype='image/svg+xml')
+    response = send_file(path, mimetype='image/svg+xml', etag=etag[:32], max_age=SVG_MAX_AGE, conditional=True)
+    if encoding is not None:
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    return response
 
 
-def run_single(wild_sequence, analysis_id, script_directory, analysis_dir):
-    results = []
-    arr_pdist = []
-    arr_distance = []
+def run_single(wild_sequence, analysis_id, script_directory, analysis_dir, mode='full'):
+    aggregator = ScanAggregator(top_k=10)
 
-    total_mutations = 3 * (len(wild_sequence)) + len(wild_sequence) + 4 * (len(wild_sequence)+1)
+    total_mutations = count_mutations(len(wild_sequence), mode)
     processed_mutations = 0
+    last_provisional = time.monotonic()
 
     try:
 
@@ -405,65 +539,95 @@ def run_single(wild_sequence, analysis_id, script_directory, analysis_dir):
                 db_func.update_table_top_10(analysis_id, 'empty', str(rank), 'in_progress')
         
 
-        with ThreadPoolExecutor() as executor:
-            futures = []
-            for key, mutation in generate_mutations(wild_sequence):
-                futures.append(executor.submit(process_mutation, key, mutation, script_directory, analysis_dir, wild_sequence))
-
-            for future in as_completed(futures):
-                result = future.result()
+        engine = get_engine(script_directory=script_directory, work_directory=analysis_dir)
+        cache = get_fold_cache()
+        job = current_job()
+        check = job.check if job else None
+        # the wild type is folded once and shared read-only by every mutant,
+        # in a worker process like the mutants, not in the eventlet hub
+        wild_fold = fold_wild_type_in_worker(engine, wild_sequence, script_directory, analysis_dir, cache, check)
+
+        # a scan interrupted by a restart continues with the mutants it had not finished
+        checkpoint = ScanCheckpoint(os.path.join(analysis_dir, CHECKPOINT_FILE), wild_sequence, mode, engine.params)
+        finished = checkpoint.load()
+        for result in finished:
+            aggregator.add(result)
+        finished_keys = {result['Mutation'] for result in finished}
+        processed_mutations = len(finished)
+        if finished:
+            logger.info(f"Resuming scan {analysis_id} after {processed_mutations} mutants")
+
+        mutations = ((key, mutation) for key, mutation in generate_mutations(wild_sequence, mode) if key not in finished_keys)
+        with checkpoint:
+            for result in scan_mutations(mutations, engine, wild_fold, script_directory, analysis_dir, cache=cache,
+                                         check=check):
+                checkpoint.append(result)
 
                 processed_mutations += 1
                 progress = (processed_mutations / total_mutations) * 100
                 socketio.emit('progress_update', { 'progress': f"{progress:.2f}"}, broadcast=True, namespace=f'/{analysis_id}')
 
                 if result:
-                    results.append(result)
-                    rnapdist_value = result['RNApdist']
-                    rnadistance_value = result['RNAdistance(f)']
-
-                    arr_pdist.append(float(rnapdist_value) if isinstance(rnapdist_value, float) else np.nan)
-                    arr_distance.append(float(rnadistance_value) if isinstance(rnadistance_value, float) else np.nan)
-
-            wait(futures)
+                    aggregator.add(result)
 
-        arr_pdist = np.array(arr_pdist)
-        arr_distance = np.array(arr_distance)
+                if time.monotonic() - last_provisional >= PROVISIONAL_TOP_10_INTERVAL:
+                    last_provisional = time.monotonic()
+                    emit_top_10(analysis_id, aggregator.provisional_top(), provisional=True)
 
-        arr_pdist_z = stats.zscore(arr_pdist, nan_policy='omit')
-        arr_distance_z = stats.zscore(arr_distance, nan_policy='omit')
-
-        for i, result in enumerate(results):
-            result['Z-score'] = arr_pdist_z[i] + arr_distance_z[i] if not np.isnan(arr_pdist_z[i]) and not np.isnan(arr_distance_z[i]) else np.nan
-
-        results_df = pd.DataFrame(results)
-        results_df.insert(0, 'no', range(1, len(results_df) + 1)) #no column
-        output_csv_path = os.path.join(analysis_dir, "mutation_results.csv")
-        results_df.to_csv(output_csv_path, index=False)
-
-        ten_best = results_df.sort_values(by='Z-score', ascending=False).head(10)
-        ten_best['no'] = range(1, 11) # by deleting this there should be the original numeration
+        ten_best = pd.DataFrame(aggregator.finalize(), columns=SCAN_COLUMNS)
+        ten_best['no'] = range(1, len(ten_best) + 1) # by deleting this there should be the original numeration
         ten_best_csv_path = os.path.join(analysis_dir, "ten_best_results.csv")
         ten_best.to_csv(ten_best_csv_path, index=False)
+        emit_top_10(analysis_id, ten_best.to_dict(orient='records'), provisional=False)
 
         mutations = ten_best['Mutation'].tolist()
         mutated_sequences = generate_mutated_sequences(wild_sequence, mutations)
+        run_in_worker(save_top_10_artifacts, engine, script_directory, analysis_dir,
+                      wild_fold, mutations, mutated_sequences, analysis_dir, check=check)
         with app.app_context():
             rank = 1
             for mutated_sequence in mutated_sequences: 
                 db_func.update_table_top_10(analysis_id, mutated_sequence, rank, 'completed')
                 rank += 1
-        ten_best.to_csv("ten_best_results.csv", index=False)
+
+        # the full table is only written once the top 10 is available
+        results_df = pd.DataFrame(aggregator.rows, columns=SCAN_COLUMNS)
+        output_csv_path = os.path.join(analysis_dir, "mutation_results.csv")
+        results_df.to_csv(output_csv_path, index=False)
+        with app.app_context():
+            db_func.save_mutation_results(analysis_id, [mutation_result_row(row) for row in aggregator.rows])
+        checkpoint.remove()
 
         with app.app_context():  
             db_func.update_table_single(analysis_id, 'completed') 
+        # the results page loads the final results and the archive on this event
+        socketio.emit('task_status', {'analysis_id': analysis_id, 'status': "Analysis completed"}, broadcast=True, namespace=f'/{analysis_id}')
 
-    except subprocess.CalledProcessError as e:
+    except (subprocess.SubprocessError, RuntimeError) as e:
         with app.app_context():  
             db_func.update_table_single(analysis_id, 'error')
             for rank in range(1, 11):   
                 db_func.update_table_top_10(analysis_id, 'empty', str(rank), 'error')
         socketio.emit('task_status', {'analysis_id': analysis_id, 'status': "Analysis failed"}, broadcast=True, namespace=f'/{analysis_id}')
+    finally:
+        results_cache.delete(analysis_id)
+
+
+def scan_value(value):
+    # "Error" and NaN results are stored as NULL
+    return float(value) if isinstance(value, float) and not np.isnan(value) else None
+
+
+def mutation_result_row(row):
+    wild_type_nucleotide, position, mutant_nucleotide = row['Mutation'].split('_')
+    return (row['Mutation'], int(position), wild_type_nucleotide, mutant_nucleotide,
+            scan_value(row['RNApdist']), scan_value(row['RNAdistance(f)']), scan_value(row['Z-score']))
+
+
+def emit_top_10(analysis_id, rows, provisional):
+    rows = [{column: (None if isinstance(row[column], float) and np.isnan(row[column]) else row[column])
+             for column in SCAN_COLUMNS} for row in rows]
+    socketio.emit('top_10_update', {'provisional': provisional, 'rows': rows}, broadcast=True, namespace=f'/{analysis_id}')
 
 @app.route('/api/analyze/single', methods=['POST'])
 def analyze_single():
@@ -473,9 +637,15 @@ def analyze_single():
 
     wild_sequence = data.get('wildSequence')
     analysis_id = data.get('analysisId')
+    mode = data.get('mode', 'full')
 
-    if not wild_sequence:
+    if not wild_sequence or mode not in admission.SINGLE_MODES:
         return jsonify({'error': 'Invalid input data'}), 400
+
+    decision = admission.admit('single', len(wild_sequence), mode, job_queue.pending_cost())
+    if decision.action != 'accept':
+        return admission_response(decision)
+
     socketio.emit('task_status', {'analysis_id': analysis_id, 'status': "Analysis started"}, broadcast=True, namespace=f'/{analysis_id}')
     
 
@@ -488,11 +658,13 @@ def analyze_single():
             db_func.save_to_table_top_10(id, analysis_id, 'empty', rank, 'pending')
 
 
-    
-    analysis_dir = os.path.join(BASE_DIR, 'pipeline', analysis_id)
-    os.makedirs(analysis_dir, exist_ok=True)
+    return enqueue_analysis(analysis_id, decision.cost, 'single', wild_sequence, analysis_id, mode)
 
 
+def start_single(wild_sequence, analysis_id, mode='full'):
+    # runs on the node executing the job, which is not always the one that received the request
+    analysis_dir = os.path.join(BASE_DIR, 'pipeline', analysis_id)
+    os.makedirs(analysis_dir, exist_ok=True)
 
     wt_file_path = os.path.join(analysis_dir, 'wt.txt')
     with open(wt_file_path, 'w') as wt_file:
@@ -500,23 +672,75 @@ def analyze_single():
 
     script_directory = os.path.join(BASE_DIR, 'pipeline')
 
-    os.makedirs(analysis_dir, exist_ok=True)
-    os.chdir(analysis_dir)
+    run_single(wild_sequence, analysis_id, script_directory, analysis_dir, mode)
+
+
+job_queue = create_job_queue(
+    {'pair': run_pipeline, 'single': start_single},
+    on_error=mark_analysis_failed,
+    connect=db_func.connect_to_database
+)
+
+
+@app.route('/api/cancel/<analysis_id>', methods=['POST'])
+def cancel_analysis(analysis_id):
+    status, code = db_func.read_processing_status(analysis_id)
+    if code != 200:
+        return jsonify(status), code
+    if status['processing_status'] in ('completed', 'error'):
+        return jsonify({'error': 'Analysis already finished'}), 409
+
+    job_queue.cancel(analysis_id)
+    # the rows are updated at once, the job reports the cancellation again when it stops
+    mark_analysis_failed(analysis_id, JobCancelled('cancelled'))
+    return jsonify({"analysis_id": analysis_id, "status": "cancelled"}), 200
+
+
+@app.route('/api/status/<analysis_id>', methods=['GET'])
+def get_status(analysis_id):
+    status, code = db_func.read_processing_status(analysis_id)
+    if code != 200:
+        return jsonify(status), code
+
+    return jsonify({
+        "analysis_id": analysis_id,
+        "type": status["type"],
+        "status": status["processing_status"],
+        "queue_state": job_queue.state(analysis_id)
+    })
 
-    run_single(wild_sequence, analysis_id, script_directory, analysis_dir)
 
-    return jsonify({"analysis_id": analysis_id}), 200
 
+# results of finished single scans, only in memory; entries are dropped when run_single ends
+results_cache = TieredCache(None, memory_items=RESULTS_CACHE_ITEMS, max_bytes=0)
 
 
 @app.route('/api/results/single/<analysis_id>', methods=['GET'])
 def get_csv(analysis_id):
+    # a finished scan never changes, polls are answered from memory, with 304 when the client has it
+    cached = results_cache.get(analysis_id)
+    if cached is not None:
+        return results_response(cached)
+
     analysis_dir = os.path.join(BASE_DIR, 'pipeline', analysis_id)
     csv_file_path = os.path.join(analysis_dir, 'ten_best_results.csv')
 
-    if not os.path.exists(csv_file_path):
+    try:
+        csv_stat = os.stat(csv_file_path)
+    except OSError:
         return jsonify({'error': 'File not found'}), 404
 
+    # the results only change with the CSV or the status, a poll of a running scan is checked
+    # with one stat and one status query before the CSV and the sequences are read
+    status, code = db_func.read_processing_status(analysis_id)
+    processing_status = status.get('processing_status') if code == 200 else None
+    etag = hashlib.sha256(f"{csv_stat.st_mtime_ns}:{csv_stat.st_size}:{processing_status}".encode()).hexdigest()[:32]
+    completed = processing_status == 'completed'
+    # the top 10 sequences are written after the CSV, the CSV time only dates a completed scan
+    last_modified = csv_stat.st_mtime if completed else None
+    if request.if_none_match.contains(etag):
+        return results_response({'body': '', 'etag': etag, 'last_modified': last_modified})
+
     try:
         df = pd.read_csv(csv_file_path)
         csv_data = {
@@ -531,92 +755,195 @@ def get_csv(analysis_id):
         wild_sequence = wild_sequence_result.get("wild_type_sequence")
         mutant_sequences = wild_sequence_result.get("mutant_sequences")
 
-        return jsonify({
+        body = jsonify({
             "analysis_id": analysis_id,
             "csv_data": csv_data,
             "wt_sequence": wild_sequence,
             "mutant_sequences": mutant_sequences
-        })
+        }).get_data(as_text=True)
+        entry = {'body': body, 'etag': etag, 'last_modified': last_modified}
+        if completed:
+            results_cache.set(analysis_id, entry)
+        return results_response(entry)
 
     except Exception as e:
         return jsonify({'error': f'Error reading the file: {str(e)}'}), 500
 
 
+def results_response(entry):
+    response = Response(entry['body'], mimetype='application/json')
+    response.set_etag(entry['etag'])
+    if entry['last_modified'] is not None:
+        response.last_modified = entry['last_modified']
+    # browsers revalidate on every poll and get 304 while the results are unchanged
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+
+@app.route('/api/results/single/<analysis_id>/mutations', methods=['GET'])
+def get_mutation_results(analysis_id):
+    """
+    One page of all the mutants of a single scan.
+
+    Query parameters: page (from 1), page_size, sort (z_score, position, rna_pdist,
+    rna_distance_f or mutation), order (asc or desc), position_min, position_max,
+    z_min, z_max and kind (substitution, deletion or insertion).
+    """
+    args = request.args
+    try:
+        page = int(args.get('page', 1))
+        page_size = int(args.get('page_size', MUTATION_PAGE_SIZE))
+        if page < 1 or not 1 <= page_size <= MAX_MUTATION_PAGE_SIZE:
+            raise ValueError(f"page must be at least 1 and page_size between 1 and {MAX_MUTATION_PAGE_SIZE}")
+        order = args.get('order', 'desc')
+        if order not in ('asc', 'desc'):
+            raise ValueError("order must be asc or desc")
+        filters = {
+            'position_min': int(args['position_min']) if 'position_min' in args else None,
+            'position_max': int(args['position_max']) if 'position_max' in args else None,
+            'z_min': float(args['z_min']) if 'z_min' in args else None,
+            'z_max': float(args['z_max']) if 'z_max' in args else None,
+            'kind': args.get('kind')
+        }
+        result, code = db_func.read_mutation_results(analysis_id, filters, sort=args.get('sort', 'z_score'),
+                                                     descending=order == 'desc', limit=page_size,
+                                                     offset=(page - 1) * page_size)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if code != 200:
+        return jsonify(result), code
+
+    rows = [{
+        'Mutation': row['mutation'],
+        'position': row['position'],
+        'RNApdist': row['rna_pdist'],
+        'RNAdistance(f)': row['rna_distance_f'],
+        'Z-score': row['z_score']
+    } for row in result['rows']]
+    return jsonify({
+        'analysis_id': analysis_id,
+        'total': result['total'],
+        'page': page,
+        'page_size': page_size,
+        'rows': rows
+    })
+
+
+def zip_patterns(name):
+    # ?include=*.svg&include=top_10/* or ?include=*.svg,top_10/*
+    return [pattern for value in request.args.getlist(name) for pattern in value.split(',') if pattern]
+
+
+def analysis_finished(analysis_id):
+    status, code = db_func.read_processing_status(analysis_id)
+    return code == 200 and status['processing_status'] in ('completed', 'error') and job_queue.state(analysis_id) is None
+
+
 @app.route('/api/results/<analysis_id>/zip-download', methods=['GET'])
 def download_results_zip(analysis_id):
     analysis_dir = os.path.join(BASE_DIR, 'pipeline', analysis_id)
     zip_filename = f"{analysis_id}.zip"
     zip_path = os.path.join(analysis_dir, zip_filename)
 
-    if not os.path.exists(analysis_dir):
+    if not os.path.isdir(analysis_dir):
         return jsonify({'error': 'Analysis not found'}), 404
 
-    #deleting unnecesary for user files
-    for file_name in os.listdir(analysis_dir):
-        if file_name.endswith('.ps') or file_name in ['tree_wt', 'tree_mut']:
-            file_path = os.path.join(analysis_dir, file_name)
-            if os.path.isfile(file_path):
-                os.remove(file_path)
-
-    #creating temp catalogue to avoid pasting zip into zip
-    with tempfile.TemporaryDirectory() as temp_dir:
-        temp_zip_path = os.path.join(temp_dir, zip_filename)
-        shutil.make_archive(temp_zip_path.replace(".zip", ""), 'zip', analysis_dir)
-        
-        #moving zip into analysis dir
-        shutil.move(temp_zip_path, zip_path)
+    include, exclude = zip_patterns('include'), zip_patterns('exclude')
+    names = archive.list_files(analysis_dir, include, exclude)
 
-    return send_file(zip_path, as_attachment=True)
+    # the full archive of a finished analysis is kept, it is rebuilt only if a file changed since
+    save_to = None
+    if not include and not exclude and analysis_finished(analysis_id):
+        newest = max((os.path.getmtime(os.path.join(analysis_dir, name)) for name in names), default=0)
+        if os.path.exists(zip_path) and os.path.getmtime(zip_path) >= newest:
+            return send_file(zip_path, as_attachment=True, download_name=zip_filename, conditional=True)
+        save_to = zip_path
+
+    return Response(archive.stream_zip(analysis_dir, names, save_to), mimetype='application/zip',
+                    headers={'Content-Disposition': f'attachment; filename={zip_filename}'})
 
 
 @app.route('/api/dbsnp/<dbSnpId>', methods=['GET'])
 def get_dbSNP(dbSnpId):
+    result, code = dbsnp.snp_sequences(dbSnpId)
+    return jsonify(result), code
 
-    result = search_clinical_tables(dbSnpId)
-    if "error" in result:
-        return jsonify({"error": "Error fetching SNP data", "details": result["error"]}), 500
 
-    try:
-        rs_num, alleles, chromosome, position = result[3][0]
-    except (IndexError, KeyError):
-        return jsonify({"error": "Invalid SNP data returned from API"}), 404
+@app.route('/api/dbsnp/batch', methods=['POST'])
+def get_dbSNP_batch():
+    data = request.get_json(silent=True) or {}
+    snp_ids = data.get('ids')
+    if not isinstance(snp_ids, list) or not snp_ids or not all(isinstance(snp_id, str) for snp_id in snp_ids):
+        return jsonify({'error': 'ids must be a non-empty list of rsIDs'}), 400
+    if len(snp_ids) > dbsnp.DBSNP_BATCH_MAX:
+        return jsonify({'error': f'At most {dbsnp.DBSNP_BATCH_MAX} rsIDs per request'}), 400
 
-    if rs_num != dbSnpId:
-        return jsonify({"error": "SNP ID mismatch"}), 400
+    return jsonify({'results': dbsnp.batch_snp_sequences(snp_ids)})
 
-    alleles = alleles.split(",")
-    alleles = alleles[0].split("/")
-    if len(alleles) != 2 or any(len(allele) != 1 for allele in alleles):
-        return jsonify({"error": "Invalid alleles data"}), 400
 
-    position = int(position)
-    flank = 50
+@app.route('/api/dbsnp/stats', methods=['GET'])
+def get_dbsnp_stats():
+    return jsonify(dbsnp.stats())
 
-    seq_result = get_sequence(chromosome, position - flank + 1, position + flank + 1)
-    if "error" in seq_result or "seq" not in seq_result:
-        return jsonify({"error": "Error fetching sequence", "details": seq_result.get("error", "Unknown error")}), 500
 
-    sequence = seq_result["seq"]
-    if sequence[flank] != alleles[0]:
-        return jsonify({"error": "Reference allele mismatch",
-                        "expected": alleles[0],
-                        "found": sequence[flank]}), 400
+@app.route('/api/cache/stats', methods=['GET'])
+def get_cache_stats():
+    return jsonify(get_fold_cache().stats())
 
-    mutant = list(sequence)
-    mutant[flank] = alleles[1]
-    mutant = "".join(mutant)
 
-    return jsonify({
-        "wildType": sequence,
-        "mutantType": mutant,
-    })
+@app.route('/api/jobs/stats', methods=['GET'])
+def get_job_stats():
+    return jsonify(job_queue.stats())
 
 
+@app.route('/api/db/stats', methods=['GET'])
+def get_db_stats():
+    return jsonify(db_func.get_pool().stats())
+
 
 @socketio.on('connect')
 def handle_connect():
     emit('response', {'data': 'Connected to WebSocket'})
 
+def resume_interrupted_scans():
+    """
+    Queues again the single scans a restart of the local queue interrupted.
+
+    The local queue keeps its jobs in memory, so a scan still in_progress at startup has no job anymore.
+    A scan with a checkpoint of its sequence resumes from it, the others are marked as failed.
+    """
+    analyses = db_func.read_single_analyses('in_progress')
+    if analyses is None:
+        logger.error("Cannot read the interrupted scans, the database is unreachable")
+        return
+    for analysis_id, wild_sequence in analyses:
+        checkpoint_path = os.path.join(BASE_DIR, 'pipeline', analysis_id, CHECKPOINT_FILE)
+        header = read_checkpoint_header(checkpoint_path)
+        if header is None or header.get('sequence') != hashlib.sha256(wild_sequence.encode()).hexdigest() \
+                or header.get('mode') not in admission.SINGLE_MODES:
+            logger.warning(f"Scan {analysis_id} was interrupted without a checkpoint, marking it as failed")
+            mark_analysis_failed(analysis_id, "Interrupted by a restart")
+            continue
+        mode = header['mode']
+        try:
+            job_queue.submit(analysis_id, 'single', wild_sequence, analysis_id, mode,
+                             cost=admission.estimate_cost('single', len(wild_sequence), mode))
+        except QueueFull as e:
+            mark_analysis_failed(analysis_id, e)
+            continue
+        logger.info(f"Resuming interrupted scan {analysis_id} from its checkpoint")
+
+
+def start_background_work():
+    # the migrations have run before, requests and jobs never see an old schema
+    job_queue.start()
+    if JOB_BACKEND == 'local':
+        # the durable queue requeues its own stale jobs
+        resume_interrupted_scans()
+
+
 if __name__ == '__main__':
     eventlet.monkey_patch()
+    migrations.migrate_when_ready(db_func.connect_to_database)
+    start_background_work()
     socketio.run(app, host='0.0.0.0', port=8080)
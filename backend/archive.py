@@ -0,0 +1,138 @@
+import os
+import logging
+import tempfile
+import zipfile
+from fnmatch import fnmatch
+
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+# bytes read from a file before the compressed data is handed to the response
+ZIP_CHUNK = 64 * 1024
+# files of an analysis directory left out of the archives, the users have no use for them
+ZIP_EXCLUDE = [
+    '*.ps',
+    'tree_wt',  # graphviz sources of the trees
+    'tree_mut',
+    'scan-checkpoint.jsonl',
+    '*.svg.gz',  # precompressed variants of the pictures
+    '*.svg.br',
+    '*.svg.json',
+    '*.zip',
+    '*.zip.part'  # archive being saved by stream_zip
+]
+
+
+class ZipStream:
+    """
+    Write-only, unseekable file collecting the bytes zipfile writes, handed out with pop().
+
+    zipfile writes a data descriptor after every entry when it cannot seek back, so the
+    archive can be sent while it is built.
+    """
+
+    def __init__(self):
+        self.chunks = []
+        self.offset = 0
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.offset += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.offset
+
+    def flush(self):
+        pass
+
+    def pop(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def list_files(directory, include=None, exclude=None):
+    """
+    Lists the files of a directory tree to archive.
+
+    Args:
+    - directory (str): Analysis directory.
+    - include (list of str): fnmatch patterns of the relative paths to keep, all files by default.
+    - exclude (list of str): Patterns left out on top of ZIP_EXCLUDE.
+
+    Returns:
+    - list of str: Relative paths with '/' separators, sorted.
+    """
+    include = include or ['*']
+    exclude = ZIP_EXCLUDE + (exclude or [])
+    names = []
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        for file_name in sorted(files):
+            name = os.path.relpath(os.path.join(root, file_name), directory).replace(os.sep, '/')
+            if any(fnmatch(name, pattern) for pattern in include) and \
+                    not any(fnmatch(name, pattern) for pattern in exclude):
+                names.append(name)
+    return names
+
+
+def stream_zip(directory, names, save_to=None):
+    """
+    Builds a zip archive of files chunk by chunk, without a copy of the files on disk.
+
+    Args:
+    - directory (str): Directory the names are relative to.
+    - names (list of str): Files to archive, see list_files.
+    - save_to (str): Path the archive is also written to, replaced only once it is complete.
+
+    Yields:
+    - bytes: Consecutive parts of the archive.
+    """
+    stream = ZipStream()
+    saved = None
+    if save_to is not None:
+        saved = tempfile.NamedTemporaryFile('wb', dir=os.path.dirname(save_to), suffix='.zip.part', delete=False)
+
+    def parts():
+        with zipfile.ZipFile(stream, 'w', zipfile.ZIP_DEFLATED) as archive:
+            for name in names:
+                path = os.path.join(directory, name)
+                try:
+                    info = zipfile.ZipInfo.from_file(path, name)
+                    info.compress_type = zipfile.ZIP_DEFLATED
+                    with open(path, 'rb') as src, \
+                            archive.open(info, 'w', force_zip64=info.file_size > zipfile.ZIP64_LIMIT) as dest:
+                        while True:
+                            chunk = src.read(ZIP_CHUNK)
+                            if not chunk:
+                                break
+                            dest.write(chunk)
+                            data = stream.pop()
+                            if data:
+                                yield data
+                except FileNotFoundError:
+                    # removed since it was listed
+                    logger.warning(f"Skipping {path}, not found")
+                yield stream.pop()
+        yield stream.pop()
+
+    try:
+        for data in parts():
+            if not data:
+                continue
+            if saved is not None:
+                saved.write(data)
+            yield data
+        if saved is not None:
+            saved.close()
+            os.replace(saved.name, save_to)
+            saved = None
+    finally:
+        # the client went away or reading a file failed, the partial archive is dropped
+        if saved is not None:
+            saved.close()
+            try:
+                os.remove(saved.name)
+            except OSError:
+                pass
@@ -4,8 +4,11 @@ import os
 import uuid
 # db
 import re
+import threading
 import mysql.connector
 
+from db_pool import ConnectionPool, PoolTimeout
+
 
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
@@ -87,313 +90,90 @@ def extract_mut_or_wt_dotbracket_svg_from_database(analysis_id, filename):
             return ("No wt-dotbracket.svg found for the given analysis_id."), 404
     else: return ("No dotbracket.svg found for the given analysis_id."), 404
 
-def read_from_table_rna_fold_result(analysis_id):
-    conn = connect_to_database()
-    if conn is None:
-        return ({f"error while connecting to databse (files: mut-dotbarcket.txt wt_dotbracket.txt)\n"}), 500
-    try: 
-        cursor = conn.cursor()
-        cursor.execute("SELECT wild_type_energy, mutant_energy FROM rna_fold_result WHERE task_id = %s", (analysis_id,))
-        result = cursor.fetchone()
-        conn.commit()
-        cursor.close()
-        conn.close()
-
-        if result:
-            wild_type_energy, mutant_energy = result
-            return({
-                'mutant_energy': mutant_energy,
-                'wild_type_energy': wild_type_energy
-            }), 200
-        else:
-            return ("files: mut-dotbarcket.txt wt_dotbracket.txt not found"), 404
-    
-    except Exception as e:
-        return ({f"Error while fetching data: {e}"}), 500
-
-def read_from_table_rna_pdist_result(analysis_id):
-    conn = connect_to_database()
-    if conn is None:
-        return ({f"error while connecting to databse (file RNApdist_result.txt)\n"}), 500
-    cursor = conn.cursor()
-    cursor.execute("SELECT distance FROM rna_pdist_result WHERE task_id = %s", (analysis_id,))
-    result = cursor.fetchone()
-    conn.commit()
-    cursor.close()
-    conn.close()
-
-    if result:
-        distance = result[0]
-        return (distance), 201
-    else:
-        return ("file RNApdist_result.txt not found\n"), 404
+def read_pair_results(analysis_id):
+    """
+    Reads a pair analysis and all its results with one query.
 
-def read_from_table_rna_distance_result(analysis_id):
+    Returns:
+    - tuple: (dict, 200) with the sequences, status and every result row (None for a
+      result not saved yet), or an error and 404 / 500.
+    """
     conn = connect_to_database()
     if conn is None:
-        return ({f"error while connecting to databse (file RNAdistance-result.txt and RNAdistance-backtrack.txt )\n"}), 500
-    cursor = conn.cursor()
+        return ({"error": "Failed to connect to the database"}), 500
+    cursor = conn.cursor(dictionary=True)
+    # task_id is unique in every result table, the joins give at most one row
     cursor.execute("""
-        SELECT 
-        distance_f, distance_h, distance_w, distance_c, 
-        distance_big_f, distance_big_h, distance_big_w, 
-        distance_big_c, distance_big_p, backtrack_data 
-        FROM rna_distance_result WHERE task_id = %s
+        SELECT
+        p.wild_type_sequence, p.mutant_sequence, p.processing_status,
+        pd.task_id AS pdist_task_id, pd.distance,
+        f.task_id AS fold_task_id, f.wild_type_energy, f.mutant_energy,
+        d.task_id AS distance_task_id,
+        d.distance_f, d.distance_h, d.distance_w, d.distance_c,
+        d.distance_big_f, d.distance_big_h, d.distance_big_w,
+        d.distance_big_c, d.distance_big_p, d.backtrack_data,
+        pl.wild_type_url, pl.mutant_url,
+        t.tree_wt_url, t.tree_mut_url
+        FROM pair p
+        LEFT JOIN rna_pdist_result pd ON pd.task_id = p.id
+        LEFT JOIN rna_fold_result f ON f.task_id = p.id
+        LEFT JOIN rna_distance_result d ON d.task_id = p.id
+        LEFT JOIN rna_plot_result pl ON pl.task_id = p.id
+        LEFT JOIN tree_result t ON t.task_id = p.id
+        WHERE p.id = %s
         """, (analysis_id,))
-    result = cursor.fetchone()
-    conn.commit()
-    cursor.close()
-    conn.close()
-    if result:
-        (distance_f, distance_h, distance_w, distance_c,
-        distance_big_f, distance_big_h, distance_big_w,
-        distance_big_c, distance_big_p, backtrack_data) = result
-
-
-        result = {
-        "RNAdistance_result": {
-            "f": distance_f,
-            "h": distance_h,
-            "w": distance_w,
-            "c": distance_c,
-            "F": distance_big_f,
-            "H": distance_big_h,
-            "W": distance_big_w,
-            "C": distance_big_c,
-            "P": distance_big_p
-        },
-        "RNAdistance_backtrack": backtrack_data
-        }
-
-
-        return (result), 201
-    else:
-        return ({f"file RNAdistance-result.txt and RNAdistance-backtrack.txt not found\n"}),404
-
-def save_to_table_tree_result(analysis_id, file_path, scenerio):
-    id = str(uuid.uuid4())
-    conn = connect_to_database()
-    if conn is None:
-        return ({"error": "Failed to connect to the database"}), 500
-    cursor = conn.cursor()
-
-    if scenerio == 1:
-        cursor.execute(
-            "INSERT INTO tree_result (id, task_id, tree_wt_url, tree_mut_url, created_at, processing_status) VALUES (%s, %s, %s, %s, NOW(), %s)",
-            (id, analysis_id, 'empty', file_path, 'in_progress')
-        )
-
-    if scenerio == 2:
-        cursor.execute(
-        "SELECT COUNT(*) FROM tree_result WHERE task_id = %s",
-        (analysis_id,)
-        )
-        row_exists = cursor.fetchone()[0] > 0
-
-        if row_exists:
-            cursor.execute(
-                """
-                UPDATE tree_result
-                SET tree_wt_url = %s, processing_status = %s
-                WHERE task_id = %s
-                """,
-                (file_path, 'completed', analysis_id)
-            )
-        else:
-            cursor.execute(
-                "INSERT INTO tree_result (id, task_id, tree_wt_url, tree_mut_url, created_at, processing_status) VALUES (%s, %s, %s, %s, NOW(), %s)",
-                (id, analysis_id, file_path, 'empty', 'error')
-            )
-    if scenerio == 3:
-        cursor.execute(
-            """
-            UPDATE tree_result
-            SET processing_status = %s
-            WHERE task_id = %s
-            """,
-            ('error', analysis_id)
-        )
-    if scenerio == 4:
-        cursor.execute(
-            "INSERT INTO tree_result (id, task_id, tree_wt_url, tree_mut_url, created_at, processing_status) VALUES (%s, %s, %s, %s, NOW(), %s)",
-            (id, analysis_id, 'empty', 'empty', 'error')
-        )
-    
-    conn.commit()
+    row = cursor.fetchone()
     cursor.close()
     conn.close()
 
-    return ({"message": "Result added successfully!"}), 201
+    if not row:
+        return ({"error": "No sequences found for the given analysis_id"}), 404
+    return (row), 200
 
-def save_to_table_rna_plot_result(analysis_id, file_path, scenerio):
-    id = str(uuid.uuid4())
-    conn = connect_to_database()
-    if conn is None:
-        return ({"error": "Failed to connect to the database"}), 500
-    cursor = conn.cursor()
 
-    if scenerio == 1:
-        cursor.execute(
-            "INSERT INTO rna_plot_result (id, task_id, wild_type_url, mutant_url, created_at, processing_status) VALUES (%s, %s, %s, %s, NOW(), %s)",
-            (id, analysis_id, 'empty', file_path, 'in_progress')
-        )
+# columns written by save_pair_results, one row per analysis and table (UNIQUE task_id, see migrations.py)
+PAIR_RESULT_COLUMNS = {
+    'rna_pdist_result': ['distance', 'processing_status'],
+    'rna_fold_result': ['wild_type_dot_bracket', 'mutant_dot_bracket', 'wild_type_energy', 'mutant_energy', 'processing_status'],
+    'rna_distance_result': ['distance_f', 'distance_h', 'distance_w', 'distance_c', 'distance_big_f', 'distance_big_h',
+                            'distance_big_w', 'distance_big_c', 'distance_big_p', 'backtrack_data', 'processing_status'],
+    'rna_plot_result': ['wild_type_url', 'mutant_url', 'processing_status'],
+    'tree_result': ['tree_wt_url', 'tree_mut_url', 'processing_status']
+}
 
-    if scenerio == 2:
-        cursor.execute(
-        "SELECT COUNT(*) FROM rna_plot_result WHERE task_id = %s",
-        (analysis_id,)
-    )
-        row_exists = cursor.fetchone()[0] > 0
 
-        if row_exists:
-            cursor.execute(
-                """
-                UPDATE rna_plot_result
-                SET wild_type_url = %s, processing_status = %s
-                WHERE task_id = %s
-                """,
-                (file_path, 'completed', analysis_id)
-            )
-        else:
-            cursor.execute(
-                "INSERT INTO rna_plot_result (id, task_id, wild_type_url, mutant_url, created_at, processing_status) VALUES (%s, %s, %s, %s, NOW(), %s)",
-                (id, analysis_id, file_path, 'empty', 'error')
-            )
-    if scenerio == 3:
-        cursor.execute(
-            """
-            UPDATE rna_plot_result
-            SET processing_status = %s
-            WHERE task_id = %s
-            """,
-            ('error', analysis_id)
-        )
-    if scenerio == 4:
-        cursor.execute(
-            "INSERT INTO rna_plot_result (id, task_id, wild_type_url, mutant_url, created_at, processing_status) VALUES (%s, %s, %s, %s, NOW(), %s)",
-            (id, analysis_id, 'empty', 'empty', 'error')
-        )
-        
-    conn.commit()
-    cursor.close()
-    conn.close()
+def save_pair_results(analysis_id, results):
+    """
+    Writes result rows of a pair analysis in one transaction, all or none of them.
 
-    return ({"message": "Result added successfully!"}), 201
+    Each row is an upsert on the task_id of the table, saving a result again replaces it.
 
-def save_to_table_rna_fold_result(analysis_id, wild_type_dot_bracket, mutant_dot_bracket, wild_type_energy, mutant_energy, processing_status, scenerio):
-    id = str(uuid.uuid4())
+    Args:
+    - analysis_id (str): Identifier of the pair analysis.
+    - results (dict): Table name -> {column: value}, with every column of PAIR_RESULT_COLUMNS.
+    """
     conn = connect_to_database()
     if conn is None:
         return ({"error": "Failed to connect to the database"}), 500
     cursor = conn.cursor()
-    
-
-    if scenerio == 1:
-        cursor.execute(
-            "INSERT INTO rna_fold_result (id, task_id, wild_type_dot_bracket, mutant_dot_bracket, wild_type_energy, mutant_energy, created_at, processing_status) VALUES (%s, %s, %s, %s, %s, %s, NOW(), %s)",
-            (id, analysis_id, wild_type_dot_bracket, mutant_dot_bracket, wild_type_energy, mutant_energy, processing_status)
-        )
-    if scenerio == 2:
-        cursor.execute(
-        "SELECT COUNT(*) FROM rna_fold_result WHERE task_id = %s",
-        (analysis_id,)
-    )
-        row_exists = cursor.fetchone()[0] > 0
-
-        if row_exists:
-            cursor.execute(
-                """
-                UPDATE rna_fold_result
-                SET wild_type_dot_bracket = %s, wild_type_energy = %s, processing_status = %s
-                WHERE task_id = %s
-                """,
-                (wild_type_dot_bracket, wild_type_energy, processing_status, analysis_id)
-            )
-        else:
+    try:
+        for table, row in results.items():
+            columns = PAIR_RESULT_COLUMNS[table]
             cursor.execute(
-                """
-                INSERT INTO rna_fold_result (id, task_id, wild_type_dot_bracket, mutant_dot_bracket, wild_type_energy, mutant_energy, created_at, processing_status)
-                VALUES (%s, %s, %s, %s, %s, %s, NOW(), %s)
+                f"""
+                INSERT INTO {table} (id, task_id, {', '.join(columns)}, created_at)
+                VALUES (%s, %s, {', '.join(['%s'] * len(columns))}, NOW())
+                ON DUPLICATE KEY UPDATE {', '.join(f'{column} = VALUES({column})' for column in columns)}
                 """,
-                (id, analysis_id, wild_type_dot_bracket, 'empty', wild_type_energy, 0, 'error')
+                (str(uuid.uuid4()), analysis_id, *[row[column] for column in columns])
             )
-
-    if scenerio == 3:
-        cursor.execute(
-            "INSERT INTO rna_fold_result (id, task_id, wild_type_dot_bracket, mutant_dot_bracket, wild_type_energy, mutant_energy, created_at, processing_status) VALUES (%s, %s, %s, %s, %s, %s, NOW(), %s)",
-            (id, analysis_id, 'empty', 'empty', 0, 0, 'error')
-        )
-    if scenerio == 4:
-        cursor.execute(
-            """
-            UPDATE rna_fold_result
-            SET processing_status = %s
-            WHERE task_id = %s
-            """,
-            ('error', analysis_id)
-        )
-    conn.commit()
-    cursor.close()
-    conn.close()
-
-    return ({"message": "Result added successfully!"}), 201
-
-def save_to_table_rna_distance_result(analysis_id, params, backtrack_data, processing_status):
-    id = str(uuid.uuid4())
-    conn = connect_to_database()
-    if conn is None:
-        return ({"error": "Failed to connect to the database"}), 500
-    
-    cursor = conn.cursor()
-
-    if params == 'empty' and processing_status == 'error':
-        cursor.execute(
-            "INSERT INTO rna_distance_result (id, task_id, distance_f, distance_h, distance_w, distance_c, distance_big_f, distance_big_h, distance_big_w, distance_big_c, distance_big_p, backtrack_data, created_at, processing_status) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, NOW(), %s)",
-            (id, analysis_id, 0, 0, 0, 0, 0, 0, 0, 0, 0, backtrack_data,processing_status)
-        )
-    if params != 'empty' and processing_status == 'in_progress':
-        cursor.execute(
-            "INSERT INTO rna_distance_result (id, task_id, distance_f, distance_h, distance_w, distance_c, distance_big_f, distance_big_h, distance_big_w, distance_big_c, distance_big_p, backtrack_data, created_at, processing_status) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, NOW(), %s)",
-            (id, analysis_id, params['f'], params['h'], params['w'], params['c'], params['F'], params['H'], params['W'], params['C'], params['P'], backtrack_data,processing_status)
-        )
-    if params == 'empty' and backtrack_data != 'empty':
-        cursor.execute(
-            """
-            UPDATE rna_distance_result
-            SET backtrack_data = %s, processing_status = %s
-            WHERE task_id = %s
-            """,
-            (backtrack_data, processing_status, analysis_id)
-        )
-    if params == 'null' and backtrack_data == 'empty':
-        cursor.execute(
-            """
-            UPDATE rna_distance_result
-            SET processing_status = %s
-            WHERE task_id = %s
-            """,
-            (processing_status, analysis_id)
-        )
-
-    conn.commit()
-    cursor.close()
-    conn.close()
-    return ({"message": "Result added successfully!"}), 201
-
-
-def save_to_table_rna_pdist_result(analysis_id, distance, processing_status):
-    id = str(uuid.uuid4())
-    conn = connect_to_database()
-    if conn is None:
-        return ({"error": "Failed to connect to the database"}), 500
-    cursor = conn.cursor()
-    cursor.execute(
-        "INSERT INTO rna_pdist_result (id, task_id, distance, created_at, processing_status) VALUES (%s, %s, %s, NOW(), %s)",
-        (id, analysis_id, distance, processing_status)
-    )
-    conn.commit()
-    cursor.close()
-    conn.close()
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+        conn.close()
 
     return ({"message": "Result added successfully!"}), 201
 
@@ -440,87 +220,25 @@ def save_to_table_top_10(id, analysis_id, mutated_sequence, rank, processing_sta
     return ({"message": "Result added successfully!"}), 201
 
 def update_table_pair(analysis_id, processing_status):
+    # the final status is computed by run_pipeline from the results it saved, see pair_status
     conn = connect_to_database()
     if conn is None:
         return ({"error": "Failed to connect to the database"}), 500
     cursor = conn.cursor()
-    if processing_status != 'completed':
-        cursor.execute(
-                """
-                UPDATE pair
-                SET processing_status = %s
-                WHERE id = %s
-                """,
-                (processing_status, analysis_id) 
-            )
-    if processing_status == 'completed':
-        cursor.execute(
-    """
-    UPDATE pair
-    SET processing_status = 
-        CASE
-            WHEN (
-                -- Sprawdzenie, czy w każdej tabeli istnieje dokładnie jeden rekord powiązany
-                (SELECT COUNT(*) FROM rna_pdist_result rpd WHERE rpd.task_id = pair.id) = 1
-                AND
-                (SELECT COUNT(*) FROM rna_distance_result rdr WHERE rdr.task_id = pair.id) = 1
-                AND
-                (SELECT COUNT(*) FROM rna_fold_result rfr WHERE rfr.task_id = pair.id) = 1
-                AND
-                (SELECT COUNT(*) FROM rna_plot_result rpr WHERE rpr.task_id = pair.id) = 1
-                AND
-                (SELECT COUNT(*) FROM tree_result tr WHERE tr.task_id = pair.id) = 1
-                -- Sprawdzenie, czy rekordy mają status 'completed'
-                AND
-                (SELECT processing_status FROM rna_pdist_result rpd WHERE rpd.task_id = pair.id) = 'completed'
-                AND
-                (SELECT processing_status FROM rna_distance_result rdr WHERE rdr.task_id = pair.id) = 'completed'
-                AND
-                (SELECT processing_status FROM rna_fold_result rfr WHERE rfr.task_id = pair.id) = 'completed'
-                AND
-                (SELECT processing_status FROM rna_plot_result rpr WHERE rpr.task_id = pair.id) = 'completed'
-                AND
-                (SELECT processing_status FROM tree_result tr WHERE tr.task_id = pair.id) = 'completed'
-            )
-            THEN 'completed'
-            ELSE 'error'
-        END
-    WHERE id = %s
-    """,
-    (analysis_id,)
-)
+    cursor.execute(
+            """
+            UPDATE pair
+            SET processing_status = %s
+            WHERE id = %s
+            """,
+            (processing_status, analysis_id) 
+        )
     conn.commit()
     cursor.close()
     conn.close()
 
     return ({"message": "Status update successfully!"}), 201
 
-def read_sequences_from_database_pair(analysis_id):
-    conn = connect_to_database()
-    if conn is None:
-        return ({"error": "Failed to connect to the database"}), 500
-    
-    cursor = conn.cursor()
-    cursor.execute("""
-        SELECT wild_type_sequence, mutant_sequence 
-        FROM pair 
-        WHERE id = %s
-    """, (analysis_id,))
-    
-    result = cursor.fetchone()
-    conn.commit()
-    cursor.close()
-    conn.close()
-    
-    if result:
-        wild_type_sequence, mutant_sequence = result
-        return ({
-            "wild_type_sequence": wild_type_sequence,
-            "mutant_sequence": mutant_sequence
-        }), 201
-    else:
-        return ({"error": "No sequences found for the given analysis_id"}), 404
-
 def save_to_table_pair(analysis_id, wild_sequence, mutant_sequence, processing_status):
     conn = connect_to_database()
     if conn is None:
@@ -555,6 +273,28 @@ def update_table_single(analysis_id, processing_status):
 
     return ({"message": "Status update successfully!"}), 201
 
+def read_single_analyses(processing_status):
+    """
+    Returns the single analyses in a processing status.
+
+    Returns:
+    - list of tuple: (analysis_id, wild_type_sequence) of every matching single row, None when the database is unreachable.
+    """
+    conn = connect_to_database()
+    if conn is None:
+        return None
+    cursor = conn.cursor()
+    cursor.execute(
+        "SELECT id, wild_type_sequence FROM single WHERE processing_status = %s ORDER BY created_at",
+        (processing_status,)
+    )
+    rows = cursor.fetchall()
+    conn.commit()
+    cursor.close()
+    conn.close()
+
+    return [(analysis_id, wild_sequence) for analysis_id, wild_sequence in rows]
+
 def save_to_table_single(analysis_id, wild_sequence, processing_status):
     conn = connect_to_database()
     if conn is None:
@@ -570,23 +310,150 @@ def save_to_table_single(analysis_id, wild_sequence, processing_status):
 
     return ({"message": "Result added successfully!"}), 201
 
+# rows of mutation_result sent by one executemany, the connector turns a batch into one multi-row INSERT
+MUTATION_RESULT_BATCH = int(os.getenv('SNP_MUTATION_RESULT_BATCH', 1000))
+# mutation_result columns the mutations endpoint can sort by
+MUTATION_RESULT_SORT_COLUMNS = ['z_score', 'position', 'rna_pdist', 'rna_distance_f', 'mutation']
+
+
+def save_mutation_results(analysis_id, rows):
+    """
+    Replaces the mutation_result rows of a single scan, in one transaction.
+
+    Args:
+    - analysis_id (str): Identifier of the single analysis.
+    - rows (list of tuple): (mutation, position, wild_type_nucleotide, mutant_nucleotide,
+      rna_pdist, rna_distance_f, z_score), None for a missing value.
+    """
+    conn = connect_to_database()
+    if conn is None:
+        return ({"error": "Failed to connect to the database"}), 500
+    cursor = conn.cursor()
+    try:
+        # a resumed or repeated scan writes the whole table again
+        cursor.execute("DELETE FROM mutation_result WHERE analysis_id = %s", (analysis_id,))
+        for start in range(0, len(rows), MUTATION_RESULT_BATCH):
+            cursor.executemany(
+                """
+                INSERT INTO mutation_result (analysis_id, mutation, position, wild_type_nucleotide, mutant_nucleotide, rna_pdist, rna_distance_f, z_score)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+                """,
+                [(analysis_id, *row) for row in rows[start:start + MUTATION_RESULT_BATCH]]
+            )
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+        conn.close()
+
+    return ({"message": "Result added successfully!"}), 201
+
+
+def read_mutation_results(analysis_id, filters, sort='z_score', descending=True, limit=100, offset=0):
+    """
+    Reads one page of the mutation_result rows of a single scan.
+
+    Args:
+    - analysis_id (str): Identifier of the single analysis.
+    - filters (dict): Optional position_min, position_max, z_min, z_max (inclusive) and
+      kind ("substitution", "deletion" or "insertion").
+    - sort (str): One of MUTATION_RESULT_SORT_COLUMNS, ties are broken by mutation.
+    - descending (bool): Sort order.
+    - limit (int), offset (int): Page of the sorted rows.
+
+    Returns:
+    - tuple: ({"total": int, "rows": list of dict}, 200), or an error and 500.
+    """
+    if sort not in MUTATION_RESULT_SORT_COLUMNS:
+        raise ValueError(f"Unknown sort column: {sort}")
+    conditions = ["analysis_id = %s"]
+    params = [analysis_id]
+    for key, condition in [('position_min', "position >= %s"), ('position_max', "position <= %s"),
+                           ('z_min', "z_score >= %s"), ('z_max', "z_score <= %s")]:
+        if filters.get(key) is not None:
+            conditions.append(condition)
+            params.append(filters[key])
+    kind = filters.get('kind')
+    if kind == 'substitution':
+        conditions.append("wild_type_nucleotide != '-' AND mutant_nucleotide != '-'")
+    elif kind == 'deletion':
+        conditions.append("mutant_nucleotide = '-'")
+    elif kind == 'insertion':
+        conditions.append("wild_type_nucleotide = '-'")
+    elif kind is not None:
+        raise ValueError(f"Unknown mutation kind: {kind}")
+    where = " AND ".join(conditions)
+    order = "DESC" if descending else "ASC"
+
+    conn = connect_to_database()
+    if conn is None:
+        return ({"error": "Failed to connect to the database"}), 500
+    cursor = conn.cursor(dictionary=True)
+    cursor.execute(f"SELECT COUNT(*) AS total FROM mutation_result WHERE {where}", params)
+    total = cursor.fetchone()['total']
+    # (analysis_id, z_score) and (analysis_id, position) serve the usual sorts and ranges
+    cursor.execute(
+        f"""
+        SELECT mutation, position, wild_type_nucleotide, mutant_nucleotide, rna_pdist, rna_distance_f, z_score
+        FROM mutation_result WHERE {where}
+        ORDER BY {sort} {order}, mutation {order}
+        LIMIT %s OFFSET %s
+        """,
+        params + [limit, offset]
+    )
+    rows = cursor.fetchall()
+    cursor.close()
+    conn.close()
+
+    return ({"total": total, "rows": rows}), 200
+
+
 # Konfiguracja połączenia z bazą danych
 db_config = {
     'host': os.getenv('MYSQL_HOST', 'http://localhost:8081'),
     'host': os.getenv('MYSQL_HOST', 'mysql'),
     'user': os.getenv('MYSQL_USER', 'root'),
     'password': os.getenv('MYSQL_PASSWORD', 'qwas'),
-    'database': os.getenv('MYSQL_DATABASE', 'SNPsniper_database')
+    'database': os.getenv('MYSQL_DATABASE', 'SNPsniper_database'),
+    'connection_timeout': int(os.getenv('MYSQL_CONNECT_TIMEOUT', 10))
+}
+# pool of connections shared by the request handlers and the jobs of this process
+db_pool_config = {
+    'size': int(os.getenv('MYSQL_POOL_SIZE', 10)),
+    'timeout': float(os.getenv('MYSQL_POOL_TIMEOUT', 10)),
+    'ping_after': float(os.getenv('MYSQL_POOL_PING_AFTER', 30)),
+    'recycle': float(os.getenv('MYSQL_POOL_RECYCLE', 3600))
 }
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Returns the connection pool of this process, created on first use (after a fork)."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ConnectionPool(lambda: mysql.connector.connect(**db_config), **db_pool_config)
+        return _pool
+
+
 # Funkcja do uzyskania połączenia z bazą danych
 def connect_to_database():
+    """
+    Borrows a connection of the pool, conn.close() gives it back.
+
+    Returns:
+    - PooledConnection: The connection, or None when the database cannot be reached
+      or no connection was free within MYSQL_POOL_TIMEOUT seconds.
+    """
     try:
-        conn = mysql.connector.connect(**db_config)
-        return conn
-    except mysql.connector.Error as err:
+        return get_pool().get()
+    except (mysql.connector.Error, PoolTimeout) as err:
         print(f"Error: {err}")
         return None
-    
+
 def read_sequence_from_database_single(analysis_id):
     conn = connect_to_database()
     if conn is None:
@@ -638,4 +505,30 @@ def read_sequences_from_database_top_10(analysis_id):
             "mutant_sequences": mutant_sequences
         }), 201
     else:
-        return ({"error": "No sequences found for the given analysis ID"}), 404
\ No newline at end of file
+        return ({"error": "No sequences found for the given analysis ID"}), 404
+
+def read_processing_status(analysis_id):
+    conn = connect_to_database()
+    if conn is None:
+        return ({"error": "Failed to connect to the database"}), 500
+
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT 'pair', processing_status FROM pair WHERE id = %s
+        UNION ALL
+        SELECT 'single', processing_status FROM single WHERE id = %s
+    """, (analysis_id, analysis_id))
+
+    result = cursor.fetchone()
+    conn.commit()
+    cursor.close()
+    conn.close()
+
+    if result:
+        analysis_type, processing_status = result
+        return ({
+            "type": analysis_type,
+            "processing_status": processing_status
+        }), 200
+    else:
+        return ({"error": "No analysis found for the given analysis_id"}), 404
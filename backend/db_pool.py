@@ -0,0 +1,191 @@
+import time
+import logging
+import threading
+
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+
+class PoolTimeout(Exception):
+    """No connection of the pool was returned in time."""
+
+
+class PooledConnection:
+    """
+    Connection borrowed from a ConnectionPool.
+
+    Behaves like the wrapped DB-API connection, close() gives it back to the pool
+    instead of closing it. A connection dropped without close() is given back when
+    it is garbage collected.
+    """
+
+    def __init__(self, pool, conn, opened_at):
+        self._pool = pool
+        self._conn = conn
+        self._opened_at = opened_at
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def close(self):
+        conn, self._conn = self._conn, None
+        if conn is not None:
+            self._pool.put(conn, self._opened_at)
+
+    def discard(self):
+        """Closes the connection for good, e.g. after a network error."""
+        conn, self._conn = self._conn, None
+        if conn is not None:
+            self._pool.put(conn, self._opened_at, broken=True)
+
+    def __del__(self):
+        if getattr(self, '_conn', None) is not None:
+            self._pool.leaked += 1
+            self.close()
+
+
+class ConnectionPool:
+    """
+    Size-bounded pool of database connections shared by the threads of a process.
+
+    Connections are opened lazily up to size. A borrower waits up to timeout seconds
+    for one to be returned, then gets PoolTimeout. A connection idle for more than
+    ping_after seconds is checked with SELECT 1 before being handed out, one older
+    than recycle seconds is reopened. Returned connections are rolled back so that
+    the next borrower never sees an open transaction.
+
+    Args:
+    - connect (callable): Opens a new DB-API connection.
+    - size (int): Maximum number of open connections.
+    - timeout (float): Seconds to wait for a free connection.
+    - ping_after (float): Idle seconds after which a connection is checked.
+    - recycle (float): Seconds after which a connection is reopened, 0 to keep it.
+    """
+
+    def __init__(self, connect, size=10, timeout=10.0, ping_after=30.0, recycle=3600.0):
+        self.connect = connect
+        self.size = size
+        self.timeout = timeout
+        self.ping_after = ping_after
+        self.recycle = recycle
+        self.idle = []  # (connection, opened at, returned at), the most recent last
+        self.open = 0
+        self.borrowed = 0
+        self.condition = threading.Condition()
+        self.created = 0
+        self.reused = 0
+        self.broken = 0
+        self.timeouts = 0
+        self.waits = 0
+        self.leaked = 0
+
+    def get(self):
+        """
+        Borrows a connection.
+
+        Returns:
+        - PooledConnection: Connection to give back with close().
+        """
+        deadline = time.monotonic() + self.timeout
+        with self.condition:
+            while not self.idle and self.open >= self.size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.timeouts += 1
+                    raise PoolTimeout(f"No database connection free after {self.timeout} s")
+                self.waits += 1
+                self.condition.wait(remaining)
+            if self.idle:
+                conn, opened_at, returned_at = self.idle.pop()
+            else:
+                conn, opened_at, returned_at = None, None, None
+            self.open += conn is None
+            self.borrowed += 1
+
+        try:
+            if conn is not None and not self.healthy(conn, opened_at, returned_at):
+                self.close_quietly(conn)
+                conn = None
+            if conn is None:
+                conn = self.connect()
+                opened_at = time.monotonic()
+                with self.condition:
+                    self.created += 1
+            else:
+                with self.condition:
+                    self.reused += 1
+        except BaseException:
+            self.release()
+            raise
+        return PooledConnection(self, conn, opened_at)
+
+    def healthy(self, conn, opened_at, returned_at):
+        now = time.monotonic()
+        if self.recycle and now - opened_at > self.recycle:
+            return False
+        if now - returned_at <= self.ping_after:
+            return True
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT 1")
+            cursor.fetchall()
+            cursor.close()
+            return True
+        except Exception as e:
+            logger.warning(f"Dropping a dead database connection: {e}")
+            with self.condition:
+                self.broken += 1
+            return False
+
+    def put(self, conn, opened_at, broken=False):
+        if not broken:
+            try:
+                conn.rollback()
+            except Exception as e:
+                logger.warning(f"Dropping a database connection that failed to roll back: {e}")
+                broken = True
+        if broken:
+            self.close_quietly(conn)
+            with self.condition:
+                self.broken += 1
+            self.release()
+            return
+        with self.condition:
+            self.idle.append((conn, opened_at, time.monotonic()))
+            self.borrowed -= 1
+            self.condition.notify()
+
+    def release(self):
+        # the slot of a connection closed for good can be used to open a new one
+        with self.condition:
+            self.open -= 1
+            self.borrowed -= 1
+            self.condition.notify()
+
+    def close_quietly(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def close_all(self):
+        with self.condition:
+            idle, self.idle = self.idle, []
+            self.open -= len(idle)
+        for conn, _, _ in idle:
+            self.close_quietly(conn)
+
+    def stats(self):
+        with self.condition:
+            return {
+                'size': self.size,
+                'open': self.open,
+                'borrowed': self.borrowed,
+                'idle': len(self.idle),
+                'created': self.created,
+                'reused': self.reused,
+                'broken': self.broken,
+                'waits': self.waits,
+                'timeouts': self.timeouts,
+                'leaked': self.leaked
+            }
@@ -0,0 +1,298 @@
+import os
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from pipeline.cache import TieredCache
+
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+DBSNP_URL = os.getenv('SNP_DBSNP_URL', 'https://clinicaltables.nlm.nih.gov/api/snps/v3/search')
+ENSEMBL_URL = os.getenv('SNP_ENSEMBL_URL', 'https://rest.ensembl.org')
+# seconds to open a connection and to wait for the response
+HTTP_CONNECT_TIMEOUT = float(os.getenv('SNP_HTTP_CONNECT_TIMEOUT', 3.05))
+HTTP_READ_TIMEOUT = float(os.getenv('SNP_HTTP_READ_TIMEOUT', 10))
+# retries of a failed connection or of a 429/5xx answer, waiting backoff * 2^n seconds in between
+HTTP_RETRIES = int(os.getenv('SNP_HTTP_RETRIES', 3))
+HTTP_BACKOFF = float(os.getenv('SNP_HTTP_BACKOFF', 0.5))
+# connections kept open per host
+HTTP_POOL_SIZE = int(os.getenv('SNP_HTTP_POOL_SIZE', 10))
+
+DBSNP_CACHE_DIR = os.getenv('SNP_DBSNP_CACHE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), '.dbsnp-cache'))
+DBSNP_CACHE_MAX_BYTES = int(os.getenv('SNP_DBSNP_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+# seconds an rsID -> locus record is kept, dbSNP builds change a few times a year
+DBSNP_LOCUS_TTL = int(os.getenv('SNP_DBSNP_LOCUS_TTL', 7 * 24 * 3600))
+# seconds a sequence region is kept, the GRCh38 sequence itself does not change
+DBSNP_SEQUENCE_TTL = int(os.getenv('SNP_DBSNP_SEQUENCE_TTL', 30 * 24 * 3600))
+# nucleotides on each side of the SNP in the returned sequences
+FLANK = 50
+# most rsIDs in one batch request, and how many of them are looked up at the same time
+DBSNP_BATCH_MAX = int(os.getenv('SNP_DBSNP_BATCH_MAX', 200))
+DBSNP_BATCH_WORKERS = int(os.getenv('SNP_DBSNP_BATCH_WORKERS', 8))
+# regions of one POST to the Ensembl sequence endpoint, the limit of the service
+ENSEMBL_MAX_REGIONS = 50
+
+_session = None
+_caches = None
+_lock = threading.Lock()
+
+
+def get_session():
+    """Returns the HTTP session shared by the whole process, keeping the connections open."""
+    global _session
+    with _lock:
+        if _session is None:
+            retry = Retry(total=HTTP_RETRIES, backoff_factor=HTTP_BACKOFF,
+                          status_forcelist=(429, 500, 502, 503, 504), allowed_methods=['GET', 'POST'])
+            adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE, max_retries=retry)
+            session = requests.Session()
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            _session = session
+        return _session
+
+
+def get_caches():
+    """
+    Returns:
+    - tuple of TieredCache: The rsID -> locus cache and the sequence cache, sharing one directory.
+    """
+    global _caches
+    with _lock:
+        if _caches is None:
+            _caches = (TieredCache(os.path.join(DBSNP_CACHE_DIR, 'locus'), max_bytes=DBSNP_CACHE_MAX_BYTES // 2,
+                                   ttl=DBSNP_LOCUS_TTL),
+                       TieredCache(os.path.join(DBSNP_CACHE_DIR, 'sequence'), max_bytes=DBSNP_CACHE_MAX_BYTES // 2,
+                                   ttl=DBSNP_SEQUENCE_TTL))
+        return _caches
+
+
+def http_get(url, **kwargs):
+    response = get_session().get(url, timeout=(HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT), **kwargs)
+    response.raise_for_status()
+    return response.json()
+
+
+def get_sequence(chromosome, start_pos, end_pos):
+    """
+    Fetch DNA sequence from Ensembl REST API for given genomic coordinates
+
+    Args:
+    - chromosome (str): Chromosome of the region.
+    - start_pos (int): First position of the region.
+    - end_pos (int): Last position of the region.
+
+    Returns:
+    - dict: Response of Ensembl with the sequence in "seq", or {"error": ...}.
+    """
+    region = f"{chromosome}:{start_pos}..{end_pos}"
+    cache = get_caches()[1]
+    key = f"GRCh38:{region}"
+    cached = cache.get(key)
+    if cached is not None:
+        return cached
+
+    try:
+        result = http_get(f"{ENSEMBL_URL}/sequence/region/human/{region}",
+                          headers={"Content-Type": "application/json"},
+                          params={"coord_system_version": "GRCh38"})
+    except requests.exceptions.RequestException as e:
+        return {"error": str(e)}
+    except ValueError:
+        return {"error": "Invalid JSON response"}
+    if isinstance(result, dict) and "seq" in result:
+        cache.set(key, result)
+    return result
+
+
+def search_clinical_tables(snp_id):
+    """
+    Search clinicaltables.nlm.nih.gov API for SNP information
+
+    Args:
+    - snp_id (str): RS ID of the SNP (e.g., 'rs328')
+
+    Returns:
+    - list or dict: Response from clinical tables API, or {"error": ...}.
+    """
+    cache = get_caches()[0]
+    cached = cache.get(snp_id)
+    if cached is not None:
+        return cached
+
+    params = {
+        "terms": snp_id,
+        "maxList": 1,
+        "df": "rsNum,38.alleles,38.chr,38.pos",
+    }
+    try:
+        result = http_get(DBSNP_URL, params=params)
+    except (requests.exceptions.RequestException, ValueError) as e:
+        return {"error": str(e)}
+    # an unknown rsID is not cached, it may be added by the next dbSNP build
+    if isinstance(result, list) and len(result) > 3 and result[3]:
+        cache.set(snp_id, result)
+    return result
+
+
+def snp_locus(snp_id):
+    """
+    Looks up the position and alleles of an SNP.
+
+    Args:
+    - snp_id (str): RS ID of the SNP.
+
+    Returns:
+    - tuple: ({"chromosome", "position", "alleles"} or an error, HTTP status code)
+    """
+    result = search_clinical_tables(snp_id)
+    if "error" in result:
+        return {"error": "Error fetching SNP data", "details": result["error"]}, 500
+
+    try:
+        rs_num, alleles, chromosome, position = result[3][0]
+    except (IndexError, KeyError):
+        return {"error": "Invalid SNP data returned from API"}, 404
+
+    if rs_num != snp_id:
+        return {"error": "SNP ID mismatch"}, 400
+
+    alleles = alleles.split(",")
+    alleles = alleles[0].split("/")
+    if len(alleles) != 2 or any(len(allele) != 1 for allele in alleles):
+        return {"error": "Invalid alleles data"}, 400
+
+    return {"chromosome": chromosome, "position": int(position), "alleles": alleles}, 200
+
+
+def locus_region(locus):
+    return f"{locus['chromosome']}:{locus['position'] - FLANK + 1}..{locus['position'] + FLANK + 1}"
+
+
+def build_sequences(locus, seq_result):
+    """
+    Puts the alleles of an SNP into the sequence of its region.
+
+    Args:
+    - locus (dict): Result of snp_locus.
+    - seq_result (dict): Response of Ensembl for locus_region(locus).
+
+    Returns:
+    - tuple: ({"wildType": ..., "mutantType": ...} or an error, HTTP status code)
+    """
+    if "error" in seq_result or "seq" not in seq_result:
+        return {"error": "Error fetching sequence", "details": seq_result.get("error", "Unknown error")}, 500
+
+    alleles = locus["alleles"]
+    sequence = seq_result["seq"]
+    if sequence[FLANK] != alleles[0]:
+        return {"error": "Reference allele mismatch",
+                "expected": alleles[0],
+                "found": sequence[FLANK]}, 400
+
+    mutant = list(sequence)
+    mutant[FLANK] = alleles[1]
+    mutant = "".join(mutant)
+
+    return {"wildType": sequence, "mutantType": mutant}, 200
+
+
+def snp_sequences(snp_id):
+    """
+    Builds the wild-type and mutant sequences around an SNP.
+
+    Args:
+    - snp_id (str): RS ID of the SNP.
+
+    Returns:
+    - tuple: ({"wildType": ..., "mutantType": ...} or an error, HTTP status code)
+    """
+    locus, code = snp_locus(snp_id)
+    if code != 200:
+        return locus, code
+    position = locus["position"]
+    return build_sequences(locus, get_sequence(locus["chromosome"], position - FLANK + 1, position + FLANK + 1))
+
+
+def get_sequences(regions):
+    """
+    Fetches many regions with the multi-region POST of Ensembl, ENSEMBL_MAX_REGIONS per request.
+
+    Args:
+    - regions (list of str): Regions as "chromosome:start..end".
+
+    Returns:
+    - dict: Region -> response of Ensembl with the sequence in "seq", or {"error": ...}.
+    """
+    cache = get_caches()[1]
+    results = {}
+    missing = []
+    for region in dict.fromkeys(regions):
+        cached = cache.get(f"GRCh38:{region}")
+        if cached is not None:
+            results[region] = cached
+        else:
+            missing.append(region)
+
+    for i in range(0, len(missing), ENSEMBL_MAX_REGIONS):
+        chunk = missing[i:i + ENSEMBL_MAX_REGIONS]
+        try:
+            response = get_session().post(f"{ENSEMBL_URL}/sequence/region/human",
+                                          timeout=(HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT),
+                                          headers={"Content-Type": "application/json", "Accept": "application/json"},
+                                          params={"coord_system_version": "GRCh38"},
+                                          json={"regions": chunk})
+            response.raise_for_status()
+            returned = {item.get("query"): item for item in response.json() if isinstance(item, dict)}
+        except requests.exceptions.RequestException as e:
+            returned, error = {}, str(e)
+        except ValueError:
+            returned, error = {}, "Invalid JSON response"
+        else:
+            error = "Region not returned by Ensembl"
+        for region in chunk:
+            result = returned.get(region)
+            if result is not None and "seq" in result:
+                cache.set(f"GRCh38:{region}", result)
+                results[region] = result
+            else:
+                results[region] = {"error": error}
+    return results
+
+
+def batch_snp_sequences(snp_ids, workers=None):
+    """
+    Builds the sequences of many SNPs, looking them up DBSNP_BATCH_WORKERS at a time
+    and fetching all their regions with get_sequences.
+
+    Args:
+    - snp_ids (list of str): RS IDs, duplicates are looked up once.
+    - workers (int): Lookups running at the same time, defaults to DBSNP_BATCH_WORKERS.
+
+    Returns:
+    - list of dict: One entry per distinct rsID, in request order, with "id" and "status"
+      and either "wildType"/"mutantType" or "error".
+    """
+    snp_ids = list(dict.fromkeys(snp_ids))
+    if not snp_ids:
+        return []
+    with ThreadPoolExecutor(max_workers=min(workers or DBSNP_BATCH_WORKERS, len(snp_ids))) as pool:
+        loci = list(pool.map(snp_locus, snp_ids))
+
+    sequences = get_sequences([locus_region(locus) for locus, code in loci if code == 200])
+    results = []
+    for snp_id, (locus, code) in zip(snp_ids, loci):
+        if code == 200:
+            locus, code = build_sequences(locus, sequences[locus_region(locus)])
+        results.append({"id": snp_id, "status": code, **locus})
+    return results
+
+
+def stats():
+    locus_cache, sequence_cache = get_caches()
+    return {'locus': locus_cache.stats(), 'sequence': sequence_cache.stats()}
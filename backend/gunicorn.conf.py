@@ -0,0 +1,15 @@
+# read by gunicorn from the working directory, see the CMD of the Dockerfile
+import subprocess
+import sys
+
+
+def on_starting(server):
+    # the schema is migrated once, in its own process, before any worker serves a request;
+    # gunicorn does not start when the migrations fail
+    subprocess.run([sys.executable, 'migrations.py'], check=True)
+
+
+def post_worker_init(worker):
+    # the workers of the durable job queue start once eventlet has patched the worker
+    from app import start_background_work
+    start_background_work()
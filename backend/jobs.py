@@ -0,0 +1,554 @@
+import os
+import json
+import time
+import uuid
+import socket
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from pipeline.engine import kill_process_group
+
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+# "local" runs the analyses in the process receiving the request, "mysql" stores them
+# in the job table so that every backend connected to the database can run them
+JOB_BACKEND = os.getenv('SNP_JOB_BACKEND', 'local')
+# analyses executed at the same time by this process, the others wait in the queue
+JOB_WORKERS = int(os.getenv('SNP_JOB_WORKERS', 2))
+# analyses accepted but not finished yet (running + waiting), 0 means no limit
+JOB_QUEUE_SIZE = int(os.getenv('SNP_JOB_QUEUE_SIZE', 100))
+# durable queue: seconds between two polls of an idle worker, between two heartbeats,
+# without heartbeat before a running job is given to another worker, and runs of a job
+JOB_POLL_INTERVAL = float(os.getenv('SNP_JOB_POLL_INTERVAL', 1.0))
+JOB_HEARTBEAT_INTERVAL = float(os.getenv('SNP_JOB_HEARTBEAT_INTERVAL', 10))
+JOB_STALE_AFTER = float(os.getenv('SNP_JOB_STALE_AFTER', 60))
+JOB_MAX_ATTEMPTS = int(os.getenv('SNP_JOB_MAX_ATTEMPTS', 3))
+# seconds a job may run before it is cancelled, 0 means no limit
+JOB_TIMEOUT = float(os.getenv('SNP_JOB_TIMEOUT', 6 * 3600))
+
+
+class QueueFull(Exception):
+    """Raised when the job queue already holds JOB_QUEUE_SIZE analyses."""
+
+
+class JobCancelled(Exception):
+    """Raised in a job that was cancelled or ran longer than JOB_TIMEOUT."""
+
+    def __init__(self, reason):
+        super().__init__(f"Analysis {reason}")
+        self.reason = reason  # "cancelled" or "timed out"
+
+
+class ProcessGroups(set):
+    """Process groups of a job's commands, a group added once the job is cancelled is killed at once."""
+
+    def __init__(self):
+        super().__init__()
+        self.killed = False
+
+    def add(self, pgid):
+        super().add(pgid)
+        if self.killed:
+            kill_process_group(pgid)
+
+    def kill(self):
+        self.killed = True
+        for pgid in list(self):
+            kill_process_group(pgid)
+
+
+class JobContext:
+    """
+    Cancellation state of a running job, available in the job with current_job().
+
+    cancel() kills the process groups registered by run_process(groups=...) at once,
+    the job itself stops at its next check() (the scans check twice per second).
+    """
+
+    def __init__(self, analysis_id, timeout=JOB_TIMEOUT):
+        self.analysis_id = analysis_id
+        self.reason = None
+        self.cancelled = threading.Event()
+        self.process_groups = ProcessGroups()
+        self.timer = None
+        if timeout:
+            self.timer = threading.Timer(timeout, self.cancel, args=('timed out',))
+            self.timer.daemon = True
+            self.timer.start()
+
+    def cancel(self, reason='cancelled'):
+        if self.reason is None:
+            self.reason = reason
+        self.cancelled.set()
+        self.process_groups.kill()
+
+    def check(self):
+        if self.cancelled.is_set():
+            raise JobCancelled(self.reason)
+
+    def close(self):
+        if self.timer is not None:
+            self.timer.cancel()
+
+
+_local = threading.local()
+
+
+def current_job():
+    """Returns the JobContext of the job running in this thread, or None."""
+    return getattr(_local, 'job', None)
+
+
+def in_current_job(function):
+    """Wraps function to run with the JobContext of this thread, e.g. in another thread of the job."""
+    job = current_job()
+
+    def run(*args, **kwargs):
+        previous = current_job()
+        _local.job = job
+        try:
+            return function(*args, **kwargs)
+        finally:
+            _local.job = previous
+    return run
+
+
+class JobQueue:
+    """
+    Bounded pool of background workers running analyses outside of the HTTP requests.
+
+    A job is the kind of the analysis ('pair', 'single') and its arguments, handlers
+    maps every kind to the function running it. Only the state of the unfinished jobs
+    (queued or running) is kept in memory, the pair/single tables stay the reference
+    for the users. on_error is called with the analysis id and the exception when a
+    job raises, so that the analysis can be marked as failed.
+    """
+
+    def __init__(self, handlers, workers=JOB_WORKERS, max_pending=JOB_QUEUE_SIZE, on_error=None, timeout=JOB_TIMEOUT):
+        self.handlers = handlers
+        self.workers = workers
+        self.max_pending = max_pending
+        self.on_error = on_error
+        self.timeout = timeout
+        self.executor = None
+        self.lock = threading.Lock()
+        self.states = {}  # analysis id -> 'queued' or 'running'
+        self.costs = {}  # analysis id -> estimated cost of the unfinished jobs
+        self.futures = {}  # analysis id -> future of the unfinished jobs
+        self.contexts = {}  # analysis id -> JobContext of the running jobs
+        self.cancelled = set()  # jobs cancelled before their context was created
+        self.counters = {'finished': 0, 'failed': 0, 'cancelled': 0}
+
+    def start(self):
+        """Nothing to do, the threads are created with the first job."""
+
+    def submit(self, analysis_id, kind, *args, cost=0.0):
+        """
+        Adds a job to the queue.
+
+        Args:
+        - analysis_id (str): Identifier of the analysis run by the job.
+        - kind (str): Key of the handler running the job.
+        - args: Arguments of the handler.
+        - cost (float): Estimated cost of the job, see admission.estimate_cost.
+
+        Raises:
+        - QueueFull: When max_pending jobs are already waiting or running.
+        """
+        with self.lock:
+            if self.max_pending and len(self.states) >= self.max_pending:
+                raise QueueFull(f"{self.max_pending} analyses are already queued")
+            if self.executor is None:
+                # created on the first job, after eventlet patched the threading module
+                self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='analysis')
+            self.states[analysis_id] = 'queued'
+            self.costs[analysis_id] = cost
+            future = self.executor.submit(self.run, analysis_id, kind, args)
+            self.futures[analysis_id] = future
+            return future
+
+    def run(self, analysis_id, kind, args):
+        context = JobContext(analysis_id, self.timeout)
+        with self.lock:
+            self.states[analysis_id] = 'running'
+            self.contexts[analysis_id] = context
+            if analysis_id in self.cancelled:
+                context.cancel()
+        outcome = run_handler(self.handlers, self.on_error, context, kind, args)
+        self.finish(analysis_id, outcome)
+
+    def finish(self, analysis_id, outcome):
+        with self.lock:
+            self.states.pop(analysis_id, None)
+            self.costs.pop(analysis_id, None)
+            self.futures.pop(analysis_id, None)
+            self.contexts.pop(analysis_id, None)
+            self.cancelled.discard(analysis_id)
+            self.counters[outcome] += 1
+
+    def cancel(self, analysis_id):
+        """
+        Cancels a queued or running job, its worker slot is freed at once.
+
+        Returns:
+        - bool: False when the job is not queued or running in this process.
+        """
+        with self.lock:
+            if analysis_id not in self.states:
+                return False
+            future = self.futures.get(analysis_id)
+            context = self.contexts.get(analysis_id)
+            if context is None:
+                self.cancelled.add(analysis_id)
+        if context is not None:
+            context.cancel()
+        elif future is not None and future.cancel():
+            self.finish(analysis_id, 'cancelled')
+        return True
+
+    def state(self, analysis_id):
+        with self.lock:
+            return self.states.get(analysis_id)
+
+    def pending_cost(self):
+        with self.lock:
+            return sum(self.costs.values())
+
+    def stats(self):
+        with self.lock:
+            states = list(self.states.values())
+            counters = dict(self.counters)
+        return dict(
+            counters,
+            backend='local',
+            workers=self.workers,
+            max_pending=self.max_pending,
+            queued=states.count('queued'),
+            running=states.count('running'),
+            pending_cost=sum(self.costs.values())
+        )
+
+    def shutdown(self, wait=True):
+        with self.lock:
+            executor, self.executor = self.executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait)
+
+
+def run_handler(handlers, on_error, context, kind, args):
+    """Runs one job with its JobContext, returns 'finished', 'failed' or 'cancelled'."""
+    analysis_id = context.analysis_id
+    _local.job = context
+    try:
+        handlers[kind](*args)
+    except JobCancelled as e:
+        logger.warning(f"Analysis {analysis_id} {e.reason}")
+        if on_error is not None:
+            on_error(analysis_id, e)
+        return 'cancelled'
+    except Exception as e:
+        logger.exception(f"Analysis {analysis_id} failed")
+        if on_error is not None:
+            on_error(analysis_id, e)
+        return 'failed'
+    finally:
+        context.close()
+        _local.job = None
+    return 'finished'
+
+
+class JobStore:
+    """
+    Job table shared by all the backends connected to the same database.
+
+    Workers claim the oldest queued job with SELECT ... FOR UPDATE SKIP LOCKED, so two
+    workers never take the same row and none of them waits for the others. Running jobs
+    are heartbeated, a job whose worker stopped sending heartbeats is queued again.
+    SQLite has no row locks, there BEGIN IMMEDIATE locks the whole database for the
+    claim instead, which is enough for tests and a single machine.
+
+    Args:
+    - connect (callable): Returns a new DB-API connection.
+    - dialect (str): "mysql" or "sqlite".
+    """
+
+    def __init__(self, connect, dialect='mysql'):
+        self.connect = connect
+        self.dialect = dialect
+
+    def sql(self, query):
+        return query.replace('%s', '?') if self.dialect == 'sqlite' else query
+
+    def execute(self, query, params=(), fetch=False):
+        conn = self.connect()
+        if conn is None:
+            raise RuntimeError("Failed to connect to the database")
+        try:
+            cursor = conn.cursor()
+            cursor.execute(self.sql(query), params)
+            result = cursor.fetchall() if fetch else cursor.rowcount
+            conn.commit()
+            cursor.close()
+            return result
+        finally:
+            conn.close()
+
+    def enqueue(self, analysis_id, kind, args, cost=0.0):
+        self.execute(
+            "INSERT INTO job (id, kind, payload, status, attempts, cost, created_at) VALUES (%s, %s, %s, 'queued', 0, %s, %s)",
+            (analysis_id, kind, json.dumps(list(args)), cost, time.time())
+        )
+
+    def claim(self, worker_id):
+        """
+        Takes the oldest queued job.
+
+        Returns:
+        - tuple: (analysis_id, kind, args), or None when the queue is empty.
+        """
+        conn = self.connect()
+        if conn is None:
+            raise RuntimeError("Failed to connect to the database")
+        try:
+            cursor = conn.cursor()
+            if self.dialect == 'sqlite':
+                cursor.execute("BEGIN IMMEDIATE")
+                lock = ""
+            else:
+                lock = " FOR UPDATE SKIP LOCKED"
+            cursor.execute(
+                "SELECT id, kind, payload FROM job WHERE status = 'queued' ORDER BY created_at LIMIT 1" + lock
+            )
+            row = cursor.fetchone()
+            if row is not None:
+                cursor.execute(self.sql(
+                    "UPDATE job SET status = 'running', worker_id = %s, attempts = attempts + 1, heartbeat_at = %s WHERE id = %s"
+                ), (worker_id, time.time(), row[0]))
+            conn.commit()
+            cursor.close()
+        finally:
+            conn.close()
+        if row is None:
+            return None
+        analysis_id, kind, payload = row
+        return analysis_id, kind, json.loads(payload)
+
+    def heartbeat(self, analysis_id, worker_id):
+        self.execute(
+            "UPDATE job SET heartbeat_at = %s WHERE id = %s AND worker_id = %s AND status IN ('running', 'cancelling')",
+            (time.time(), analysis_id, worker_id)
+        )
+
+    def finish(self, analysis_id, worker_id, status):
+        """Marks a job as finished, failed or cancelled, unless it was given to another worker meanwhile."""
+        return self.execute(
+            "UPDATE job SET status = %s WHERE id = %s AND worker_id = %s AND status IN ('running', 'cancelling')",
+            (status, analysis_id, worker_id)
+        )
+
+    def request_cancel(self, analysis_id):
+        """
+        Cancels a queued job, or asks the worker running it to cancel it.
+
+        Returns:
+        - str: "cancelled", "cancelling" (running job) or None when the job is finished.
+        """
+        if self.execute("UPDATE job SET status = 'cancelled' WHERE id = %s AND status = 'queued'", (analysis_id,)):
+            return 'cancelled'
+        if self.execute("UPDATE job SET status = 'cancelling' WHERE id = %s AND status = 'running'", (analysis_id,)):
+            return 'cancelling'
+        return None
+
+    def cancel_requested(self, worker_id):
+        rows = self.execute(
+            "SELECT id FROM job WHERE worker_id = %s AND status = 'cancelling'", (worker_id,), fetch=True
+        )
+        return [row[0] for row in rows]
+
+    def requeue_stale(self, stale_after=JOB_STALE_AFTER, max_attempts=JOB_MAX_ATTEMPTS):
+        """
+        Queues again the running jobs without heartbeat for stale_after seconds.
+
+        Returns:
+        - list of str: Jobs failed instead because they already ran max_attempts times.
+        """
+        deadline = time.time() - stale_after
+        failed = [row[0] for row in self.execute(
+            "SELECT id FROM job WHERE status = 'running' AND heartbeat_at < %s AND attempts >= %s",
+            (deadline, max_attempts), fetch=True
+        )]
+        for analysis_id in failed:
+            self.execute("UPDATE job SET status = 'failed' WHERE id = %s AND status = 'running'", (analysis_id,))
+        requeued = self.execute(
+            "UPDATE job SET status = 'queued', worker_id = NULL WHERE status = 'running' AND heartbeat_at < %s",
+            (deadline,)
+        )
+        self.execute(
+            "UPDATE job SET status = 'cancelled' WHERE status = 'cancelling' AND heartbeat_at < %s", (deadline,)
+        )
+        if requeued or failed:
+            logger.warning(f"Requeued {requeued} stale jobs, failed {len(failed)}")
+        return failed
+
+    def state(self, analysis_id):
+        rows = self.execute("SELECT status FROM job WHERE id = %s", (analysis_id,), fetch=True)
+        return rows[0][0] if rows else None
+
+    def counts(self):
+        rows = self.execute("SELECT status, COUNT(*) FROM job GROUP BY status", fetch=True)
+        return {status: count for status, count in rows}
+
+    def pending_cost(self):
+        rows = self.execute("SELECT SUM(cost) FROM job WHERE status IN ('queued', 'running', 'cancelling')", fetch=True)
+        return float(rows[0][0] or 0.0)
+
+
+class DurableJobQueue:
+    """
+    Job queue kept in a JobStore, any process started with the same store runs the jobs.
+
+    start() launches the workers of this process and a maintenance thread sending the
+    heartbeats of the local jobs and requeueing the jobs of workers that died.
+    """
+
+    def __init__(self, store, handlers, workers=JOB_WORKERS, max_pending=JOB_QUEUE_SIZE, on_error=None,
+                 poll_interval=JOB_POLL_INTERVAL, heartbeat_interval=JOB_HEARTBEAT_INTERVAL,
+                 stale_after=JOB_STALE_AFTER, max_attempts=JOB_MAX_ATTEMPTS, timeout=JOB_TIMEOUT):
+        self.store = store
+        self.handlers = handlers
+        self.workers = workers
+        self.max_pending = max_pending
+        self.on_error = on_error
+        self.poll_interval = poll_interval
+        self.heartbeat_interval = heartbeat_interval
+        self.stale_after = stale_after
+        self.max_attempts = max_attempts
+        self.timeout = timeout
+        self.worker_id = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self.lock = threading.Lock()
+        self.contexts = {}  # analysis id -> JobContext of the jobs running in this process
+        self.stopping = threading.Event()
+        self.threads = []
+
+    def start(self):
+        # the job table is created by the migrations, run before the workers start
+        self.stopping.clear()
+        self.threads = [threading.Thread(target=self.work, name=f'analysis-{i}', daemon=True)
+                        for i in range(self.workers)]
+        self.threads.append(threading.Thread(target=self.maintain, name='analysis-heartbeat', daemon=True))
+        for thread in self.threads:
+            thread.start()
+
+    def submit(self, analysis_id, kind, *args, cost=0.0):
+        """Same as JobQueue.submit, the job is stored and run by the first free worker."""
+        if self.max_pending:
+            # a cancelling job holds its worker until its processes are gone
+            counts = self.store.counts()
+            if sum(counts.get(status, 0) for status in ('queued', 'running', 'cancelling')) >= self.max_pending:
+                raise QueueFull(f"{self.max_pending} analyses are already queued")
+        self.store.enqueue(analysis_id, kind, args, cost)
+
+    def work(self):
+        while not self.stopping.is_set():
+            try:
+                job = self.store.claim(self.worker_id)
+            except Exception as e:
+                logger.error(f"Error while claiming a job: {e}")
+                job = None
+            if job is None:
+                self.stopping.wait(self.poll_interval)
+                continue
+
+            analysis_id, kind, args = job
+            context = JobContext(analysis_id, self.timeout)
+            with self.lock:
+                self.contexts[analysis_id] = context
+            try:
+                outcome = run_handler(self.handlers, self.on_error, context, kind, args)
+                self.store.finish(analysis_id, self.worker_id, outcome)
+            except Exception as e:
+                logger.error(f"Error while finishing job {analysis_id}: {e}")
+            finally:
+                with self.lock:
+                    self.contexts.pop(analysis_id, None)
+
+    def cancel(self, analysis_id):
+        """
+        Cancels a queued job, or a running one: at once when it runs in this process,
+        within heartbeat_interval seconds on another backend.
+        """
+        state = self.store.request_cancel(analysis_id)
+        if state == 'cancelling':
+            self.cancel_local(analysis_id)
+        return state is not None
+
+    def cancel_local(self, analysis_id):
+        with self.lock:
+            context = self.contexts.get(analysis_id)
+        if context is not None:
+            context.cancel()
+
+    def maintain(self):
+        while not self.stopping.wait(self.heartbeat_interval):
+            try:
+                with self.lock:
+                    running = list(self.contexts)
+                for analysis_id in running:
+                    self.store.heartbeat(analysis_id, self.worker_id)
+                for analysis_id in self.store.cancel_requested(self.worker_id):
+                    self.cancel_local(analysis_id)
+                for analysis_id in self.store.requeue_stale(self.stale_after, self.max_attempts):
+                    if self.on_error is not None:
+                        self.on_error(analysis_id, RuntimeError("Job abandoned by its workers"))
+            except Exception as e:
+                logger.error(f"Error while maintaining the job queue: {e}")
+
+    def state(self, analysis_id):
+        state = self.store.state(analysis_id)
+        return state if state in ('queued', 'running', 'cancelling') else None
+
+    def pending_cost(self):
+        return self.store.pending_cost()
+
+    def stats(self):
+        counts = self.store.counts()
+        with self.lock:
+            running_here = len(self.contexts)
+        return {
+            'backend': 'mysql',
+            'worker_id': self.worker_id,
+            'workers': self.workers,
+            'max_pending': self.max_pending,
+            'running_here': running_here,
+            'queued': counts.get('queued', 0),
+            'running': counts.get('running', 0),
+            'finished': counts.get('finished', 0),
+            'failed': counts.get('failed', 0),
+            'cancelled': counts.get('cancelled', 0),
+            'pending_cost': self.store.pending_cost()
+        }
+
+    def shutdown(self, wait=True):
+        self.stopping.set()
+        if wait:
+            for thread in self.threads:
+                thread.join()
+
+
+def create_job_queue(handlers, on_error=None, backend=JOB_BACKEND, connect=None):
+    """
+    Returns the job queue selected by SNP_JOB_BACKEND.
+
+    Args:
+    - handlers (dict): Analysis kind -> function running it.
+    - on_error (callable): Called with the analysis id and the exception of a failed job.
+    - backend (str): "local" or "mysql".
+    - connect (callable): Connection factory of the durable queue.
+    """
+    if backend == 'local':
+        return JobQueue(handlers, on_error=on_error)
+    if backend == 'mysql':
+        return DurableJobQueue(JobStore(connect, 'mysql'), handlers, on_error=on_error)
+    raise ValueError(f"Unknown job backend: {backend}")
@@ -0,0 +1,199 @@
+import sys
+import time
+import logging
+
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+# lock taken by the backend applying the migrations, the others wait for it
+MIGRATION_LOCK = 'snp_schema_migrations'
+MIGRATION_LOCK_TIMEOUT = 300
+# attempts to migrate a database that is still starting, and seconds between two of them
+MIGRATION_ATTEMPTS = 24
+MIGRATION_RETRY_INTERVAL = 5
+
+RESULT_TABLES = ['rna_pdist_result', 'rna_fold_result', 'rna_distance_result', 'rna_plot_result', 'tree_result']
+
+
+def index_exists(cursor, dialect, table, index):
+    if dialect == 'sqlite':
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'index' AND tbl_name = ? AND name = ?", (table, index))
+    else:
+        cursor.execute("""
+            SELECT 1 FROM information_schema.statistics
+            WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s
+        """, (table, index))
+    return bool(cursor.fetchall())
+
+
+def create_index(table, index, columns, unique=False):
+    """
+    Returns a migration step creating an index, skipped when the index already exists,
+    so that a migration stopped halfway can be run again.
+    """
+    def step(cursor, dialect):
+        if index_exists(cursor, dialect, table, index):
+            logger.info(f"Index {index} already exists")
+            return
+        cursor.execute(f"CREATE {'UNIQUE ' if unique else ''}INDEX {index} ON {table} ({columns})")
+    return step
+
+
+def unique_task_id(table):
+    """
+    Returns the migration step making task_id unique in a result table.
+
+    The savers used to write an analysis twice in some cases, the most recent row is kept.
+    The older duplicates are copied to <table>_duplicates before they are deleted.
+    """
+    add_index = create_index(table, f"{table}_task_id", 'task_id', unique=True)
+
+    def step(cursor, dialect):
+        if index_exists(cursor, dialect, table, f"{table}_task_id"):
+            logger.info(f"{table}.task_id is already unique")
+            return
+        backup = f"{table}_duplicates"
+        cursor.execute(f"CREATE TABLE IF NOT EXISTS {backup} AS SELECT * FROM {table} WHERE 1 = 0")
+        cursor.execute(f"""
+            INSERT INTO {backup}
+            SELECT * FROM {table} older
+            WHERE EXISTS (
+                SELECT 1 FROM {table} newer
+                WHERE newer.task_id = older.task_id
+                    AND (newer.created_at > older.created_at OR (newer.created_at = older.created_at AND newer.id > older.id))
+            )
+            AND older.id NOT IN (SELECT id FROM {backup})
+        """)
+        cursor.execute(f"DELETE FROM {table} WHERE id IN (SELECT id FROM {backup})")
+        if cursor.rowcount:
+            logger.warning(f"Removed {cursor.rowcount} duplicate rows from {table}, kept in {backup}")
+        add_index(cursor, dialect)
+    return step
+
+
+# schema changes applied after init.sql, in order, each one once; never edit an applied migration
+MIGRATIONS = [
+    ('001-unique-result-task-id', [unique_task_id(table) for table in RESULT_TABLES]),
+    # update_table_top_10 and the top 10 reads look rows up by analysis and rank
+    ('002-top-10-seq-rank', [create_index('top_10', 'top_10_seq_rank', 'wild_type_seq_id, rank_snp')]),
+    # every mutant of a single scan, the rows of mutation_results.csv
+    ('003-mutation-result', ["""
+        CREATE TABLE IF NOT EXISTS mutation_result (
+            analysis_id CHAR(36) NOT NULL,
+            mutation VARCHAR(32) NOT NULL,
+            position INT NOT NULL,
+            wild_type_nucleotide CHAR(1) NOT NULL,
+            mutant_nucleotide CHAR(1) NOT NULL,
+            rna_pdist DOUBLE,
+            rna_distance_f DOUBLE,
+            z_score DOUBLE,
+            PRIMARY KEY (analysis_id, mutation),
+            INDEX mutation_result_z_score (analysis_id, z_score),
+            INDEX mutation_result_position (analysis_id, position),
+            FOREIGN KEY (analysis_id) REFERENCES single(id) ON DELETE CASCADE
+        )
+    """]),
+    # queued pair and single analyses claimed by the backend workers (SNP_JOB_BACKEND=mysql);
+    # timestamps are seconds since the epoch, and the claim would scan and lock the whole table without the index
+    ('004-job', ["""
+        CREATE TABLE IF NOT EXISTS job (
+            id CHAR(36) PRIMARY KEY,
+            kind VARCHAR(16) NOT NULL,
+            payload TEXT NOT NULL,
+            status VARCHAR(16) NOT NULL DEFAULT 'queued',
+            worker_id VARCHAR(128),
+            attempts INT NOT NULL DEFAULT 0,
+            cost DOUBLE NOT NULL DEFAULT 0,
+            created_at DOUBLE NOT NULL,
+            heartbeat_at DOUBLE
+        )
+    """, create_index('job', 'job_status_created', 'status, created_at')]),
+]
+
+
+def migrate(connect, migrations=MIGRATIONS, dialect='mysql'):
+    """
+    Applies the migrations missing from the schema_migrations table.
+
+    MySQL commits every DDL statement, so a migration is not atomic; its steps are written
+    to be run again after a failure halfway, the migration is recorded once all passed.
+
+    Args:
+    - connect (callable): Returns a DB-API connection.
+    - migrations (list): (id, steps) pairs, in order. A step is an SQL statement or
+      a callable taking the cursor and the dialect.
+    - dialect (str): "mysql" or "sqlite", only MySQL takes the migration lock.
+
+    Returns:
+    - list of str: Identifiers of the migrations applied.
+    """
+    conn = connect()
+    if conn is None:
+        raise RuntimeError("Failed to connect to the database")
+    placeholder = '?' if dialect == 'sqlite' else '%s'
+    applied_now = []
+    try:
+        cursor = conn.cursor()
+        if dialect == 'mysql':
+            cursor.execute("SELECT GET_LOCK(%s, %s)", (MIGRATION_LOCK, MIGRATION_LOCK_TIMEOUT))
+            if cursor.fetchone()[0] != 1:
+                raise RuntimeError("Timed out waiting for the migration lock")
+        try:
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS schema_migrations (
+                    id VARCHAR(64) PRIMARY KEY,
+                    applied_at DATETIME DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            cursor.execute("SELECT id FROM schema_migrations")
+            applied = {row[0] for row in cursor.fetchall()}
+            for migration_id, statements in migrations:
+                if migration_id in applied:
+                    continue
+                logger.info(f"Applying migration {migration_id}")
+                for statement in statements:
+                    if callable(statement):
+                        statement(cursor, dialect)
+                    else:
+                        cursor.execute(statement)
+                cursor.execute(f"INSERT INTO schema_migrations (id) VALUES ({placeholder})", (migration_id,))
+                conn.commit()
+                applied_now.append(migration_id)
+        finally:
+            if dialect == 'mysql':
+                cursor.execute("SELECT RELEASE_LOCK(%s)", (MIGRATION_LOCK,))
+                cursor.fetchall()
+            cursor.close()
+    finally:
+        conn.close()
+    return applied_now
+
+
+def migrate_when_ready(connect, attempts=MIGRATION_ATTEMPTS, interval=MIGRATION_RETRY_INTERVAL):
+    """
+    Migrates the database, retrying while it is still starting.
+
+    Raises:
+    - Exception: The error of the last attempt, when none passed.
+    """
+    for attempt in range(1, attempts + 1):
+        try:
+            return migrate(connect)
+        except Exception as e:
+            if attempt == attempts:
+                raise
+            logger.error(f"Error while migrating the database (attempt {attempt} of {attempts}): {e}")
+            time.sleep(interval)
+
+
+if __name__ == '__main__':
+    # run by gunicorn before the workers start, see gunicorn.conf.py
+    import mysql.connector
+    from db_func import db_config
+
+    try:
+        applied = migrate_when_ready(lambda: mysql.connector.connect(**db_config))
+    except Exception as e:
+        logger.error(f"Database migrations failed: {e}")
+        sys.exit(1)
+    logger.info(f"Database schema up to date, applied: {', '.join(applied) or 'none'}")
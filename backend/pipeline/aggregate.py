@@ -0,0 +1,125 @@
+import math
+
+import numpy as np
+import scipy.stats as stats
+
+COLUMNS = ['no', 'Mutation', 'RNApdist', 'RNAdistance(f)', 'Z-score']
+
+
+def metric(value):
+    return float(value) if isinstance(value, float) else np.nan
+
+
+class RunningStats:
+    """Running mean and population variance (Welford), NaN values are skipped like nan_policy='omit'."""
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def add(self, value):
+        if math.isnan(value):
+            return
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+
+    @property
+    def std(self):
+        return math.sqrt(self.m2 / self.count) if self.count else np.nan
+
+    def zscore(self, value):
+        std = self.std
+        if math.isnan(value) or not std:
+            return np.nan
+        return (value - self.mean) / std
+
+
+class ScanAggregator:
+    """
+    Collects the rows of a single-mutation scan and keeps track of its best mutants.
+
+    The Z-score of a mutant is z(RNApdist) + z(RNAdistance(f)), a combination of the
+    two distances with positive weights that are only known at the end of the scan.
+    A mutant dominated by at least top_k others in both distances can never reach the
+    top_k whatever the weights are, so only the remaining candidates (the k-skyband,
+    a small set) are kept ranked. This gives a provisional top list from the running
+    statistics during the scan, and the exact one at the end without sorting all rows.
+    """
+
+    def __init__(self, top_k=10):
+        self.top_k = top_k
+        self.rows = []
+        self.pdist = []
+        self.distance = []
+        self.pdist_stats = RunningStats()
+        self.distance_stats = RunningStats()
+        self.candidates = {}  # row index -> number of candidates dominating it
+        self.first_rows = []  # fill the top list when Z-scores are NaN, like sort_values(na_position='last')
+        self.first_nan_rows = []
+
+    def add(self, result):
+        index = len(self.rows)
+        row = dict(result, no=index + 1)
+        pdist, distance = metric(result['RNApdist']), metric(result['RNAdistance(f)'])
+        self.rows.append(row)
+        self.pdist.append(pdist)
+        self.distance.append(distance)
+        self.pdist_stats.add(pdist)
+        self.distance_stats.add(distance)
+
+        if len(self.first_rows) < self.top_k:
+            self.first_rows.append(index)
+        if math.isnan(pdist) or math.isnan(distance):
+            if len(self.first_nan_rows) < self.top_k:
+                self.first_nan_rows.append(index)
+            return
+        self.add_candidate(index, pdist, distance)
+
+    def dominates(self, a, b):
+        pa, da, pb, db = self.pdist[a], self.distance[a], self.pdist[b], self.distance[b]
+        return pa >= pb and da >= db and (pa > pb or da > db)
+
+    def add_candidate(self, index, pdist, distance):
+        dominated_by = sum(1 for other in self.candidates if self.dominates(other, index))
+        if dominated_by >= self.top_k:
+            return
+        for other in list(self.candidates):
+            if self.dominates(index, other):
+                self.candidates[other] += 1
+                if self.candidates[other] >= self.top_k:
+                    del self.candidates[other]
+        self.candidates[index] = dominated_by
+
+    def ranked(self, zscores):
+        """Top rows for the given Z-scores (index -> value), ties keep the scan order."""
+        scored = sorted(
+            (index for index in self.candidates if not math.isnan(zscores[index])),
+            key=lambda index: (-zscores[index], index)
+        )
+        fillers = sorted(set(self.first_rows + self.first_nan_rows) - set(scored))
+        fillers = [index for index in fillers if math.isnan(zscores[index])]
+        return [dict(self.rows[index], **{'Z-score': zscores[index]}) for index in (scored + fillers)[:self.top_k]]
+
+    def provisional_top(self):
+        """Top list from the running mean and variance of the rows seen so far."""
+        zscores = {
+            index: self.pdist_stats.zscore(self.pdist[index]) + self.distance_stats.zscore(self.distance[index])
+            for index in set(self.candidates) | set(self.first_rows) | set(self.first_nan_rows)
+        }
+        return self.ranked(zscores)
+
+    def finalize(self):
+        """
+        Computes the Z-scores of all rows exactly as scipy.stats.zscore does.
+
+        Returns:
+        - list of dict: The top_k rows, best first.
+        """
+        pdist_z = stats.zscore(np.array(self.pdist), nan_policy='omit')
+        distance_z = stats.zscore(np.array(self.distance), nan_policy='omit')
+        for row, z_pdist, z_distance in zip(self.rows, pdist_z, distance_z):
+            row['Z-score'] = z_pdist + z_distance if not np.isnan(z_pdist) and not np.isnan(z_distance) else np.nan
+        return self.ranked([row['Z-score'] for row in self.rows])
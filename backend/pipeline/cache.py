@@ -0,0 +1,281 @@
+import os
+import json
+import hashlib
+import time
+import logging
+import tempfile
+import threading
+from collections import OrderedDict
+
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+CACHE_DIR = os.getenv('SNP_CACHE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache'))
+CACHE_MEMORY_ITEMS = int(os.getenv('SNP_CACHE_MEMORY_ITEMS', 4096))
+CACHE_MAX_BYTES = int(os.getenv('SNP_CACHE_MAX_BYTES', 512 * 1024 * 1024))
+
+
+class TieredCache:
+    """
+    Key-value cache with an in-memory LRU tier backed by an on-disk store.
+
+    Values must be JSON serialisable. Every entry is one file named after the
+    hash of its key, so several processes can share the same directory. When the
+    directory grows over max_bytes the least recently used files are removed.
+    With a ttl, entries older than ttl seconds are misses and are dropped.
+    """
+
+    def __init__(self, directory, memory_items=CACHE_MEMORY_ITEMS, max_bytes=CACHE_MAX_BYTES, ttl=None):
+        self.directory = directory
+        self.memory_items = memory_items
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.memory = OrderedDict()
+        self.lock = threading.Lock()
+        self.disk_bytes = None  # computed on the first write
+        self.counters = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'writes': 0, 'evictions': 0, 'expired': 0}
+
+    @staticmethod
+    def digest(key):
+        return hashlib.sha256(key.encode()).hexdigest()
+
+    def path(self, digest):
+        return os.path.join(self.directory, digest[:2], f"{digest}.json")
+
+    def expired(self, entry):
+        # wall clock, the expiry times on disk are shared with other processes
+        return self.ttl is not None and entry['expires'] <= time.time()
+
+    def unwrap(self, entry):
+        return entry['value'] if self.ttl is not None else entry
+
+    def get(self, key):
+        digest = self.digest(key)
+        expired = False
+        with self.lock:
+            if digest in self.memory:
+                entry = self.memory[digest]
+                if not self.expired(entry):
+                    self.memory.move_to_end(digest)
+                    self.counters['memory_hits'] += 1
+                    return self.unwrap(entry)
+                del self.memory[digest]
+                expired = True
+
+        entry = self.read(digest)
+        if entry is not None and self.expired(entry):
+            self.remove_file(digest)
+            expired = True
+            entry = None
+        with self.lock:
+            self.counters['expired'] += expired
+            if entry is None:
+                self.counters['misses'] += 1
+                return None
+            self.counters['disk_hits'] += 1
+            self.remember(digest, entry)
+        return self.unwrap(entry)
+
+    def set(self, key, value):
+        digest = self.digest(key)
+        entry = {'expires': time.time() + self.ttl, 'value': value} if self.ttl is not None else value
+        with self.lock:
+            self.counters['writes'] += 1
+            self.remember(digest, entry)
+        self.write(digest, entry)
+
+    def delete(self, key):
+        digest = self.digest(key)
+        with self.lock:
+            self.memory.pop(digest, None)
+        self.remove_file(digest)
+
+    def remove_file(self, digest):
+        if self.max_bytes:
+            path = self.path(digest)
+            try:
+                size = os.path.getsize(path)
+                os.remove(path)
+            except OSError:
+                return
+            with self.lock:
+                if self.disk_bytes is not None:
+                    self.disk_bytes -= size
+
+    def remember(self, digest, value):
+        self.memory[digest] = value
+        self.memory.move_to_end(digest)
+        while len(self.memory) > self.memory_items:
+            self.memory.popitem(last=False)
+
+    def read(self, digest):
+        if not self.max_bytes:
+            return None
+        path = self.path(digest)
+        try:
+            with open(path) as f:
+                value = json.load(f)
+            os.utime(path)  # recently used files survive eviction
+            return value
+        except (OSError, ValueError):
+            return None
+
+    def write(self, digest, value):
+        if not self.max_bytes:
+            return
+        path = self.path(digest)
+        try:
+            # an overwritten entry gives back the size of the former file
+            previous = os.path.getsize(path)
+        except OSError:
+            previous = 0
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with tempfile.NamedTemporaryFile('w', dir=os.path.dirname(path), delete=False) as f:
+                json.dump(value, f)
+            os.replace(f.name, path)
+            size = os.path.getsize(path)
+        except OSError as e:
+            logger.error(f"Error while writing cache entry {path}: {e}")
+            return
+
+        with self.lock:
+            if self.disk_bytes is None:
+                self.disk_bytes = sum(size for _, size, _ in self.files())
+            else:
+                self.disk_bytes += size - previous
+            over_limit = self.disk_bytes > self.max_bytes
+        if over_limit:
+            self.evict()
+
+    def files(self):
+        for root, _, filenames in os.walk(self.directory):
+            for filename in filenames:
+                path = os.path.join(root, filename)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                yield path, stat.st_size, stat.st_mtime
+
+    def evict(self):
+        """Removes the least recently used files until the store is below 90% of max_bytes."""
+        files = sorted(self.files(), key=lambda file: file[2])
+        total = sum(size for _, size, _ in files)
+        removed = 0
+        for path, size, _ in files:
+            if total <= 0.9 * self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+        with self.lock:
+            self.disk_bytes = total
+            self.counters['evictions'] += removed
+
+    def stats(self):
+        with self.lock:
+            stats = dict(self.counters)
+            stats['hits'] = stats['memory_hits'] + stats['disk_hits']
+            requests = stats['hits'] + stats['misses']
+            stats['hit_rate'] = stats['hits'] / requests if requests else 0.0
+            stats['memory_items'] = len(self.memory)
+            stats['disk_bytes'] = self.disk_bytes
+        return stats
+
+
+class FoldCache(TieredCache):
+    """
+    Content-addressed cache of folding results.
+
+    Keys are built from the hash of the sequences and the folding parameters
+    (engine name and model settings), so the same transcript submitted again,
+    or a scan sharing mutants with an earlier one, reuses the earlier results.
+    """
+
+    @staticmethod
+    def sequence_hash(sequence):
+        return hashlib.sha256(sequence.encode()).hexdigest()
+
+    def fold_key(self, params, sequence):
+        return f"fold:{params}:{self.sequence_hash(sequence)}"
+
+    def pair_key(self, params, wild_sequence, mutant_sequence):
+        return f"pair:{params}:{self.sequence_hash(wild_sequence)}:{self.sequence_hash(mutant_sequence)}"
+
+    def get_fold(self, params, sequence):
+        return self.get(self.fold_key(params, sequence))
+
+    def set_fold(self, params, sequence, fold):
+        self.set(self.fold_key(params, sequence), fold)
+
+    def get_pair(self, params, wild_sequence, mutant_sequence):
+        return self.get(self.pair_key(params, wild_sequence, mutant_sequence))
+
+    def set_pair(self, params, wild_sequence, mutant_sequence, values):
+        self.set(self.pair_key(params, wild_sequence, mutant_sequence), values)
+
+    def scan_key(self, params, wild_sequence):
+        return f"scan:{params}:{self.sequence_hash(wild_sequence)}"
+
+    def scan_pairs(self, params, wild_sequence):
+        """Returns the ScanPairs holding the mutant results of the scans of a wild type."""
+        return ScanPairs(self, params, wild_sequence)
+
+
+class ScanPairs:
+    """
+    Mutant results of the scans of one wild type, stored as a single cache entry.
+
+    A scan adds one result per mutant: one file each would cost about as much as the
+    folding. The entry is read once when the scan starts, the new results stay in
+    memory and flush() writes the whole entry once, when the scan ends. It is used
+    in place of the FoldCache by cached_mutation_result and store_mutation_result;
+    pairs of another wild type go to the FoldCache itself.
+    """
+
+    def __init__(self, cache, params, wild_sequence):
+        self.cache = cache
+        self.params = params
+        self.wild_sequence = wild_sequence
+        self.key = cache.scan_key(params, wild_sequence)
+        self.pairs = dict(cache.get(self.key) or {})  # mutant hash -> values
+        self.added = 0
+
+    def get_pair(self, params, wild_sequence, mutant_sequence):
+        if (params, wild_sequence) != (self.params, self.wild_sequence):
+            return self.cache.get_pair(params, wild_sequence, mutant_sequence)
+        return self.pairs.get(self.cache.sequence_hash(mutant_sequence))
+
+    def set_pair(self, params, wild_sequence, mutant_sequence, values):
+        if (params, wild_sequence) != (self.params, self.wild_sequence):
+            self.cache.set_pair(params, wild_sequence, mutant_sequence, values)
+            return
+        self.pairs[self.cache.sequence_hash(mutant_sequence)] = values
+        self.added += 1
+
+    def flush(self):
+        """Writes the results added since the last flush, merged with those other scans stored meanwhile."""
+        if not self.added:
+            return
+        pairs = dict(self.cache.get(self.key) or {})
+        pairs.update(self.pairs)
+        self.cache.set(self.key, pairs)
+        self.pairs = pairs
+        self.added = 0
+
+
+_fold_cache = None
+_fold_cache_lock = threading.Lock()
+
+
+def get_fold_cache():
+    """Returns the fold cache shared by the whole process."""
+    global _fold_cache
+    with _fold_cache_lock:
+        if _fold_cache is None:
+            _fold_cache = FoldCache(CACHE_DIR)
+        return _fold_cache
@@ -0,0 +1,128 @@
+import os
+import json
+import time
+import hashlib
+import logging
+
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_FILE = 'scan-checkpoint.jsonl'
+# seconds between two fsync of the checkpoint, the lines are flushed to the OS after every result
+CHECKPOINT_SYNC_INTERVAL = float(os.getenv('SNP_CHECKPOINT_SYNC_INTERVAL', 1.0))
+
+
+def read_checkpoint_header(path):
+    """
+    Returns:
+    - dict: Description of the scan that wrote the checkpoint (sequence hash, mode, params), None without a readable checkpoint.
+    """
+    try:
+        with open(path) as f:
+            header = json.loads(f.readline())
+    except (OSError, ValueError):
+        return None
+    return header if isinstance(header, dict) else None
+
+
+class ScanCheckpoint:
+    """
+    Append-only record of the finished mutants of a single scan.
+
+    The first line describes the scan (hash of the wild type, mode, folding parameters),
+    every other line is one row of mutation_results.csv, in completion order. A scan
+    started again on the same analysis directory loads the rows, feeds them to the
+    aggregator in the same order and only folds the missing mutation keys, so the final
+    top 10 is the one an uninterrupted scan finishing in that order would give.
+    A line cut by a crash is dropped, a checkpoint of another scan is discarded.
+
+    Args:
+    - path (str): Checkpoint file, usually CHECKPOINT_FILE in the analysis directory.
+    - wild_sequence (str): Wild-type sequence of the scan.
+    - mode (str): Mutation mode of generate_mutations.
+    - params (str): Folding parameters of the engine (engine.params).
+    """
+
+    def __init__(self, path, wild_sequence, mode, params):
+        self.path = path
+        self.header = {
+            'sequence': hashlib.sha256(wild_sequence.encode()).hexdigest(),
+            'mode': mode,
+            'params': params
+        }
+        self.file = None
+        self.last_sync = 0.0
+
+    def load(self):
+        """
+        Returns:
+        - list of dict: Rows saved by an earlier run of the same scan, in completion order.
+        """
+        try:
+            with open(self.path) as f:
+                content = f.read()
+        except OSError:
+            return []
+        if content and not content.endswith('\n'):
+            # the last line was cut by a crash, later rows must not be appended to it
+            content = content[:content.rfind('\n') + 1]
+            with open(self.path, 'r+') as f:
+                f.truncate(len(content.encode()))
+        lines = content.splitlines()
+
+        try:
+            header = json.loads(lines[0]) if lines else None
+        except ValueError:
+            header = None
+        if header != self.header:
+            logger.warning(f"Discarding checkpoint {self.path} of another scan")
+            os.remove(self.path)
+            return []
+
+        rows = {}
+        for line in lines[1:]:
+            try:
+                row = json.loads(line)
+            except ValueError:
+                logger.warning(f"Skipping a corrupted line of checkpoint {self.path}")
+                continue
+            rows.setdefault(row['Mutation'], row)
+        return list(rows.values())
+
+    def open(self):
+        new = not os.path.exists(self.path)
+        self.file = open(self.path, 'a')
+        if new:
+            self.file.write(json.dumps(self.header) + '\n')
+            self.sync()
+        return self
+
+    def append(self, row):
+        self.file.write(json.dumps(row) + '\n')
+        self.file.flush()
+        if time.monotonic() - self.last_sync >= CHECKPOINT_SYNC_INTERVAL:
+            self.sync()
+
+    def sync(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.last_sync = time.monotonic()
+
+    def close(self):
+        if self.file is not None:
+            self.sync()
+            self.file.close()
+            self.file = None
+
+    def remove(self):
+        self.close()
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
@@ -0,0 +1,104 @@
+import os
+import logging
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+# nodes of a pair analysis run at the same time, the graph is at most three nodes wide
+DAG_WORKERS = int(os.getenv('SNP_PAIR_WORKERS', 4))
+# seconds between two calls of the check callback of run_dag
+DAG_CHECK_INTERVAL = 0.5
+
+# run returns False when the node failed, the nodes depending on it are then never run
+Node = namedtuple('Node', ['name', 'depends', 'run'])
+
+
+def order_nodes(nodes):
+    """
+    Checks the graph and orders the nodes so that each one comes after its dependencies.
+
+    Args:
+    - nodes (list of Node): Nodes of the graph.
+
+    Returns:
+    - list of Node: The same nodes in dependency order.
+    """
+    by_name = {node.name: node for node in nodes}
+    if len(by_name) != len(nodes):
+        raise ValueError("Duplicate node names in the graph")
+    for node in nodes:
+        for name in node.depends:
+            if name not in by_name:
+                raise ValueError(f"Node {node.name} depends on unknown node {name}")
+
+    ordered = []
+    visiting = set()
+    visited = set()
+
+    def visit(node):
+        if node.name in visited:
+            return
+        if node.name in visiting:
+            raise ValueError(f"Dependency cycle through node {node.name}")
+        visiting.add(node.name)
+        for name in node.depends:
+            visit(by_name[name])
+        visiting.discard(node.name)
+        visited.add(node.name)
+        ordered.append(node)
+
+    for node in nodes:
+        visit(node)
+    return ordered
+
+
+def run_dag(nodes, workers=None, check=None):
+    """
+    Runs every node of a dependency graph as soon as the nodes it depends on have finished.
+
+    After a failed node no further node is started, the running ones are waited for.
+    An exception raised by a node is raised again once the running nodes have returned.
+
+    Args:
+    - nodes (list of Node): Nodes of the graph, run() takes no argument.
+    - workers (int): Nodes run at the same time, defaults to SNP_PAIR_WORKERS.
+    - check (callable): Called every DAG_CHECK_INTERVAL seconds while nodes are running,
+      raising from it (cancelled or timed out job) stops the graph.
+
+    Returns:
+    - list of str: Names of the failed nodes, empty when every node finished.
+    """
+    nodes = order_nodes(nodes)
+    workers = workers or DAG_WORKERS
+    finished = set()
+    failed = []
+    waiting = list(nodes)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        running = {}
+
+        def start_ready():
+            for node in list(waiting):
+                if all(name in finished for name in node.depends):
+                    waiting.remove(node)
+                    running[pool.submit(node.run)] = node
+
+        start_ready()
+        while running:
+            done, _ = wait(running, timeout=DAG_CHECK_INTERVAL if check else None, return_when=FIRST_COMPLETED)
+            for future in done:
+                node = running.pop(future)
+                if future.result() is not False:
+                    finished.add(node.name)
+                else:
+                    failed.append(node.name)
+            if check:
+                check()
+            if not failed:
+                start_ready()
+
+    if failed:
+        logger.info(f"Nodes not run after {', '.join(failed)} failed: {', '.join(node.name for node in waiting)}")
+    return failed
@@ -0,0 +1,445 @@
+import os
+import re
+import logging
+import signal
+import tempfile
+import subprocess
+import numpy as np
+
+try:
+    import RNA
+except ImportError:  # ViennaRNA Python bindings are optional, the bash scripts are the fallback
+    RNA = None
+
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+DEFAULT_ENGINE = os.getenv('SNP_FOLDING_ENGINE', 'vienna')
+# seconds a single pipeline step (bash script or RNA* tool) may run, 0 means no limit
+STEP_TIMEOUT = float(os.getenv('SNP_STEP_TIMEOUT', 600))
+
+# process groups of the commands running in this process, killed when a scan worker is stopped
+_process_groups = set()
+
+
+def mutation_result(key, rnapdist, rnadistance):
+    """
+    Builds a single row of the mutation scan.
+
+    Args:
+    - key (str): Mutation key in the format "X_n_Y".
+    - rnapdist (float or str): RNApdist distance or "Error".
+    - rnadistance (float or str): RNAdistance (f) distance or "Error".
+
+    Returns:
+    - dict: Row with the columns used by mutation_results.csv.
+    """
+    return {
+        'Mutation': key,
+        'RNApdist': rnapdist,
+        'RNAdistance(f)': rnadistance,
+        'Z-score': None
+    }
+
+
+def kill_process_group(pgid, sig=signal.SIGKILL):
+    try:
+        os.killpg(pgid, sig)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+def kill_running_processes():
+    """Kills the process groups of all the commands started by run_process in this process."""
+    for pgid in list(_process_groups):
+        kill_process_group(pgid)
+
+
+def run_process(args, cwd=None, input=None, shell=False, timeout=STEP_TIMEOUT, groups=None):
+    """
+    Runs a command in its own process group, like subprocess.run(capture_output=True, text=True).
+
+    The command and every child it starts (bash scripts call several tools) share a
+    process group, which is killed as a whole when the timeout expires or when the
+    caller is interrupted, so no orphan keeps running.
+
+    Args:
+    - args (list or str): Command, a string when shell is True.
+    - cwd (str): Working directory.
+    - input (str): Standard input.
+    - shell (bool): Runs the command through the shell.
+    - timeout (float): Seconds before the process group is killed, 0 or None for no limit.
+    - groups (set): Set the process group is registered in while the command runs,
+      so that it can be killed from another thread (see jobs.JobContext).
+
+    Returns:
+    - subprocess.CompletedProcess
+
+    Raises:
+    - subprocess.TimeoutExpired: When the timeout expired.
+    """
+    process = subprocess.Popen(
+        args, cwd=cwd, shell=shell, text=True, start_new_session=True,
+        stdin=subprocess.PIPE if input is not None else subprocess.DEVNULL,
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE
+    )
+    registries = [_process_groups] if groups is None else [_process_groups, groups]
+    for registry in registries:
+        registry.add(process.pid)
+    try:
+        stdout, stderr = process.communicate(input, timeout=timeout or None)
+    except BaseException:
+        kill_process_group(process.pid)
+        process.communicate()
+        raise
+    finally:
+        for registry in registries:
+            registry.discard(process.pid)
+    return subprocess.CompletedProcess(args, process.returncode, stdout, stderr)
+
+
+def run_command(command, cwd=None):
+    try:
+        result = run_process(command, cwd=cwd, shell=True)
+    except subprocess.TimeoutExpired:
+        raise RuntimeError(f"Command timed out after {STEP_TIMEOUT:g} s: {command}")
+    if result.returncode != 0:
+        raise RuntimeError(f"Command failed: {command}\nError: {result.stderr.strip()}")
+    return result.stdout.strip()
+
+
+def run_tool(args, input):
+    """
+    Runs one of the RNA* tools with the given stdin, in a temporary directory:
+    RNApdist always writes the dot plots 1_dp.ps and 2_dp.ps to its working directory.
+    """
+    try:
+        with tempfile.TemporaryDirectory(prefix='rna-') as cwd:
+            result = run_process(args, cwd=cwd, input=input)
+    except subprocess.TimeoutExpired:
+        raise RuntimeError(f"Command timed out after {STEP_TIMEOUT:g} s: {' '.join(args)}")
+    if result.returncode != 0:
+        raise RuntimeError(f"Command failed: {' '.join(args)}\nError: {result.stderr.strip()}")
+    return result.stdout
+
+
+def dotbracket(sequence, structure, energy):
+    """Formats a structure like the RNAfold output saved in *-dotbracket.txt."""
+    return f"{sequence}\n{structure} ({energy:6.2f})\n"
+
+
+def parse_float(output):
+    """Parses a number printed by the RNA* tools, returns "Error" if it is not one."""
+    if output.replace('.', '', 1).replace('e-', '', 1).isdigit():
+        return float(output)
+    return "Error"
+
+
+class ViennaEngine:
+    """
+    Folding engine calling the ViennaRNA Python bindings in-process.
+
+    Reproduces `01-RNApdist`, `02-RNAfold` and `03-RNAdistance` without spawning
+    any process: the MFE structure and the base pair probabilities come from one
+    fold compound per sequence, RNApdist is the profile edit distance of the pair
+    probability profiles and RNAdistance (f) is the tree edit distance of the
+    fully expanded structures. Values are rounded like the tools print them (%g).
+    """
+
+    name = 'vienna'
+
+    def __init__(self):
+        if RNA is None:
+            raise RuntimeError("ViennaRNA Python bindings are not installed")
+        self.model_details = RNA.md()
+        # folding parameters, part of every cache key
+        self.params = f"vienna-{RNA.__version__}-T{self.model_details.temperature}-d{self.model_details.dangles}"
+
+    @staticmethod
+    def normalize(sequence):
+        return sequence.strip().upper().replace('T', 'U')
+
+    def fold(self, sequence):
+        """
+        Folds a sequence.
+
+        Returns:
+        - dict: MFE structure and energy, ensemble energy and the base pair probability
+          profile. Only plain Python values, so it can be shared with worker processes.
+        """
+        sequence = self.normalize(sequence)
+        fc = RNA.fold_compound(sequence, self.model_details)
+        structure, energy = fc.mfe()
+        fc.exp_params_rescale(energy)
+        _, ensemble_energy = fc.pf()
+        return {
+            'sequence': sequence,
+            'structure': structure,
+            'energy': energy,
+            'ensemble_energy': ensemble_energy,
+            'profile': self.bp_profile(fc.bpp(), len(sequence))
+        }
+
+    fold_wild_type = fold
+
+    @staticmethod
+    def bp_profile(bpp, length):
+        # (unpaired, upstream, downstream) probability of every position, as in Make_bp_profile_bppm
+        bpp = np.triu(np.array(bpp), 1)
+        upstream = bpp.sum(axis=1)
+        downstream = bpp.sum(axis=0)
+        return tuple(
+            value
+            for i in range(1, length + 1)
+            for value in (float(1 - upstream[i] - downstream[i]), float(upstream[i]), float(downstream[i]))
+        )
+
+    @staticmethod
+    def profile_array(profile):
+        # layout expected by profile_edit_distance: [length, 3, -, profile...]
+        array = RNA.floatArray(len(profile) + 3)
+        array[0] = len(profile) // 3
+        array[1] = 3
+        array[2] = 0
+        for i, value in enumerate(profile, 3):
+            array[i] = value
+        return array
+
+    def pdist(self, wt_fold, mut_fold):
+        distance = RNA.profile_edit_distance(self.profile_array(wt_fold['profile']), self.profile_array(mut_fold['profile']))
+        return float(f"{distance:g}")
+
+    @staticmethod
+    def tree_distance(wt_structure, mut_structure):
+        wt_tree = RNA.make_tree(RNA.expand_Full(wt_structure))
+        mut_tree = RNA.make_tree(RNA.expand_Full(mut_structure))
+        try:
+            return float(f"{RNA.tree_edit_distance(wt_tree, mut_tree):g}")
+        finally:
+            RNA.free_tree(wt_tree)
+            RNA.free_tree(mut_tree)
+
+    def evaluate(self, key, mutation, wild_fold):
+        """
+        Compares one mutant against the already folded wild type, so every mutant costs one fold.
+        """
+        mut_fold = self.fold(mutation)
+        return mutation_result(
+            key,
+            self.pdist(wild_fold, mut_fold),
+            self.tree_distance(wild_fold['structure'], mut_fold['structure'])
+        )
+
+    def artifacts(self, key, mutation, wild_fold):
+        """
+        Result files of one mutant, named like the files written by the pipeline scripts.
+        """
+        mut_fold = self.fold(mutation)
+        return {
+            'wt.txt': wild_fold['sequence'] + '\n',
+            'mut.txt': mutation + '\n',
+            'RNApdist-result.txt': f"{self.pdist(wild_fold, mut_fold):g}\n",
+            'wt-dotbracket.txt': dotbracket(wild_fold['sequence'], wild_fold['structure'], wild_fold['energy']),
+            'mut-dotbracket.txt': dotbracket(mut_fold['sequence'], mut_fold['structure'], mut_fold['energy']),
+            'RNAdistance-result.txt': f"f: {self.tree_distance(wild_fold['structure'], mut_fold['structure']):g}\n"
+        }
+
+
+class CliEngine:
+    """
+    Folding engine running the bash pipeline scripts in a temporary directory per mutant.
+    """
+
+    name = 'cli'
+    params = 'cli-pfScale15'
+
+    def __init__(self, script_directory, work_directory=None):
+        self.script_directory = script_directory
+        self.work_directory = work_directory
+
+    def run_script(self, script, cwd):
+        try:
+            run_command(f'bash {os.path.join(self.script_directory, script)}', cwd=cwd)
+        except RuntimeError as e:
+            logger.error(f"Error during {script}: {e}")
+
+    def fold_wild_type(self, wild_sequence):
+        """
+        Runs RNAfold on the wild type once, its output replaces wt-dotbracket.txt for every mutant.
+        """
+        with tempfile.TemporaryDirectory(dir=self.work_directory) as wild_dir:
+            with open(os.path.join(wild_dir, "wt.txt"), 'w') as f:
+                f.write(wild_sequence + '\n')
+            dotbracket = run_command('RNAfold --pfScale 15.0 < wt.txt', cwd=wild_dir)
+        return {
+            'sequence': wild_sequence,
+            'dotbracket': dotbracket + '\n'
+        }
+
+    def evaluate(self, key, mutation, wild_fold):
+        with tempfile.TemporaryDirectory(dir=self.work_directory) as mutation_dir:
+
+            with open(os.path.join(mutation_dir, "wt.txt"), 'w') as f:
+                f.write(wild_fold['sequence'] + '\n')
+            with open(os.path.join(mutation_dir, "mut.txt"), 'w') as f:
+                f.write(mutation + '\n')
+
+            # RNApdist folds both sequences itself, the wild-type ensemble cannot be passed to it
+            self.run_script("01-RNApdist", mutation_dir)
+
+            rnapdist_result_path = os.path.join(mutation_dir, "RNApdist-result.txt")
+            if os.path.exists(rnapdist_result_path):
+                with open(rnapdist_result_path) as f:
+                    rnapdist_output = f.read().strip()
+            else:
+                rnapdist_output = "Error: RNApdist-result.txt not found"
+                logger.error(rnapdist_output)
+
+            # only the mutant is folded, the wild-type structure comes from fold_wild_type
+            with open(os.path.join(mutation_dir, "wt-dotbracket.txt"), 'w') as f:
+                f.write(wild_fold['dotbracket'])
+            try:
+                run_command('RNAfold --pfScale 15.0 < mut.txt > mut-dotbracket.txt', cwd=mutation_dir)
+            except RuntimeError as e:
+                logger.error(f"Error during RNAfold: {e}")
+
+            self.run_script("03-RNAdistance", mutation_dir)
+
+            rnadistance_result_path = os.path.join(mutation_dir, "RNAdistance-result.txt")
+            if os.path.exists(rnadistance_result_path):
+                with open(rnadistance_result_path) as f:
+                    rnadistance_output = f.read().strip().split()
+            else:
+                rnadistance_output = ["Error", "RNAdistance-result.txt not found"]
+                logger.error(rnadistance_output)
+
+            return mutation_result(
+                key,
+                parse_float(rnapdist_output),
+                parse_float(rnadistance_output[1]) if len(rnadistance_output) > 1 else "Error"
+            )
+
+    def artifacts(self, key, mutation, wild_fold):
+        """
+        Result files of one mutant, named like the files written by the pipeline scripts.
+        """
+        wild_structure = wild_fold['dotbracket'].splitlines()[1].split()[0]
+        mut_dotbracket = run_tool(['RNAfold', '--pfScale', '15.0', '--noPS'], mutation + '\n')
+        mut_structure = mut_dotbracket.splitlines()[1].split()[0]
+        return {
+            'wt.txt': wild_fold['sequence'] + '\n',
+            'mut.txt': mutation + '\n',
+            'RNApdist-result.txt': run_tool(['RNApdist'], f"{wild_fold['sequence']}\n{mutation}\n"),
+            'wt-dotbracket.txt': wild_fold['dotbracket'],
+            'mut-dotbracket.txt': mut_dotbracket,
+            'RNAdistance-result.txt': run_tool(['RNAdistance', '--distance=f'], f"{wild_structure}\n{mut_structure}\n")
+        }
+
+
+class CliPipeEngine(CliEngine):
+    """
+    Folding engine running RNApdist, RNAfold and RNAdistance directly, sequences and
+    results go through stdin and stdout: no temporary directory or file per mutant.
+    """
+
+    name = 'cli-pipe'
+
+    def fold_wild_type(self, wild_sequence):
+        return {
+            'sequence': wild_sequence,
+            'dotbracket': run_tool(['RNAfold', '--pfScale', '15.0', '--noPS'], wild_sequence + '\n')
+        }
+
+    def evaluate(self, key, mutation, wild_fold):
+        try:
+            rnapdist = parse_float(run_tool(['RNApdist'], f"{wild_fold['sequence']}\n{mutation}\n").strip())
+        except RuntimeError as e:
+            logger.error(f"Error during RNApdist: {e}")
+            rnapdist = "Error"
+
+        try:
+            wild_structure = wild_fold['dotbracket'].splitlines()[1].split()[0]
+            mut_structure = run_tool(['RNAfold', '--pfScale', '15.0', '--noPS'], mutation + '\n').splitlines()[1].split()[0]
+            rnadistance_output = run_tool(['RNAdistance', '--distance=f'], f"{wild_structure}\n{mut_structure}\n").split()
+            rnadistance = parse_float(rnadistance_output[1]) if len(rnadistance_output) > 1 else "Error"
+        except (RuntimeError, IndexError) as e:
+            logger.error(f"Error during RNAfold/RNAdistance: {e}")
+            rnadistance = "Error"
+
+        return mutation_result(key, rnapdist, rnadistance)
+
+
+class CliBatchEngine(CliPipeEngine):
+    """
+    Folding engine sending a whole batch of mutants through one RNApdist, one RNAfold
+    and one RNAdistance process. The tools read multi-record input and compare every
+    record with the first one (--compare=f), the wild type, so process startup and
+    energy parameter loading happen once per batch instead of once per mutant.
+    """
+
+    name = 'cli-batch'
+    batch_size = 256
+
+    def evaluate_batch(self, items, wild_fold):
+        """
+        Evaluates (key, mutated sequence) pairs, returns one result row per pair in the same order.
+        Falls back to one process per mutant if the batch output cannot be parsed.
+        """
+        keys = [key for key, _ in items]
+        mutations = [mutation for _, mutation in items]
+        try:
+            pdist_output = run_tool(['RNApdist', '--compare=f'], '\n'.join([wild_fold['sequence']] + mutations) + '\n')
+            rnapdist = [parse_float(value) for value in pdist_output.split()]
+
+            fold_output = run_tool(['RNAfold', '--pfScale', '15.0', '--noPS'], '\n'.join(mutations) + '\n').splitlines()
+            mut_structures = [line.split()[0] for line in fold_output[1::2]]
+            wild_structure = wild_fold['dotbracket'].splitlines()[1].split()[0]
+
+            distance_output = run_tool(['RNAdistance', '--distance=f', '--compare=f'],
+                                       '\n'.join([wild_structure] + mut_structures) + '\n')
+            rnadistance = [parse_float(value) for value in re.findall(r'f:\s*(\S+)', distance_output)]
+        except (RuntimeError, IndexError) as e:
+            logger.error(f"Error during batch of {len(items)} mutants: {e}")
+            return [self.evaluate(key, mutation, wild_fold) for key, mutation in items]
+
+        if not len(rnapdist) == len(mut_structures) == len(rnadistance) == len(items):
+            logger.error(f"Unexpected batch output for {len(items)} mutants, evaluating them one by one")
+            return [self.evaluate(key, mutation, wild_fold) for key, mutation in items]
+
+        return [mutation_result(*row) for row in zip(keys, rnapdist, rnadistance)]
+
+
+ENGINES = {
+    ViennaEngine.name: ViennaEngine,
+    CliEngine.name: CliEngine,
+    CliPipeEngine.name: CliPipeEngine,
+    CliBatchEngine.name: CliBatchEngine,
+}
+
+
+def get_engine(name=None, script_directory=None, work_directory=None):
+    """
+    Creates a folding engine.
+
+    Args:
+    - name (str): Engine name from ENGINES, defaults to SNP_FOLDING_ENGINE ("vienna").
+    - script_directory (str): Directory with the pipeline bash scripts (cli engines).
+    - work_directory (str): Directory for per-mutant temporary directories (cli engine).
+
+    Returns:
+    - ViennaEngine or one of the cli engines. Falls back to the cli-pipe engine
+      when the ViennaRNA bindings are not installed.
+    """
+    name = name or DEFAULT_ENGINE
+    if name not in ENGINES:
+        raise ValueError(f"Unknown folding engine: {name}")
+
+    if name == ViennaEngine.name and RNA is None:
+        logger.warning("ViennaRNA Python bindings not found, falling back to the cli-pipe engine")
+        name = CliPipeEngine.name
+
+    if name in (CliEngine.name, CliPipeEngine.name, CliBatchEngine.name):
+        if script_directory is None:
+            script_directory = os.path.dirname(os.path.abspath(__file__))
+        return ENGINES[name](script_directory, work_directory)
+    return ENGINES[name]()
@@ -0,0 +1,90 @@
+import os
+import gzip
+import json
+import hashlib
+import logging
+import tempfile
+
+try:
+    import brotli
+except ImportError:  # Brotli is optional, the pictures are then only stored gzipped
+    brotli = None
+
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+# suffix of the manifest written next to a precompressed file
+MANIFEST_SUFFIX = '.json'
+# Content-Encoding -> suffix of the compressed variant
+ENCODING_SUFFIXES = {'br': '.br', 'gzip': '.gz'}
+
+
+def compress(data, encoding):
+    if encoding == 'br':
+        return brotli.compress(data, quality=11)
+    # mtime=0 keeps the variant, and so its hash, the same for the same content
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+
+def write_atomic(path, data):
+    with tempfile.NamedTemporaryFile('wb', dir=os.path.dirname(path) or '.', delete=False) as f:
+        f.write(data)
+    os.replace(f.name, path)
+
+
+def precompress(path):
+    """
+    Stores the compressed variants of a file next to it, with a manifest of their hashes.
+
+    A variant is only kept when it is smaller than the file. The manifest `<path>.json`
+    holds the SHA-256 and size of the file and of every variant, by Content-Encoding.
+
+    Args:
+    - path (str): File to compress, e.g. an SVG drawn by the pipeline.
+
+    Returns:
+    - dict: The manifest.
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+    manifest = {'sha256': hashlib.sha256(data).hexdigest(), 'size': len(data), 'encodings': {}}
+
+    for encoding, suffix in ENCODING_SUFFIXES.items():
+        if encoding == 'br' and brotli is None:
+            continue
+        variant = compress(data, encoding)
+        if len(variant) >= len(data):
+            continue
+        write_atomic(path + suffix, variant)
+        manifest['encodings'][encoding] = {'sha256': hashlib.sha256(variant).hexdigest(), 'size': len(variant)}
+
+    write_atomic(path + MANIFEST_SUFFIX, json.dumps(manifest).encode())
+    return manifest
+
+
+def load_manifest(path):
+    """
+    Returns the manifest of a file, precompressing it first when the manifest is missing
+    or older than the file (pictures drawn before precompression existed).
+
+    Args:
+    - path (str): Precompressed file.
+
+    Returns:
+    - dict: The manifest, see precompress.
+    """
+    manifest_path = path + MANIFEST_SUFFIX
+    try:
+        if os.path.getmtime(manifest_path) >= os.path.getmtime(path):
+            with open(manifest_path) as f:
+                return json.load(f)
+    except (OSError, ValueError):
+        pass
+    try:
+        return precompress(path)
+    except OSError as e:
+        # read-only directory, the file is served uncompressed
+        logger.warning(f"Could not precompress {path}: {e}")
+        with open(path, 'rb') as f:
+            data = f.read()
+        return {'sha256': hashlib.sha256(data).hexdigest(), 'size': len(data), 'encodings': {}}
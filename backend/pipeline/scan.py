@@ -0,0 +1,255 @@
+import os
+import time
+import signal
+import logging
+import hashlib
+import multiprocessing
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+from pipeline.engine import ViennaEngine, get_engine, kill_process_group, kill_running_processes
+from pipeline.script import process_mutations, cached_mutation_result, store_mutation_result, fold_wild_type
+
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+# "process" runs the mutants in worker processes, "thread" keeps them in the current process:
+# only for the cli engines, ViennaRNA in a thread would hold the GIL and the eventlet hub
+SCAN_EXECUTOR = os.getenv('SNP_SCAN_EXECUTOR', 'process')
+SCAN_WORKERS = int(os.getenv('SNP_SCAN_WORKERS', os.cpu_count() or 1))
+# mutants per task, by default the batch size of the engine (cli-batch) or 16
+SCAN_CHUNK_SIZE = int(os.getenv('SNP_SCAN_CHUNK_SIZE', 0))
+
+# seconds between two calls of the check callback of scan_mutations
+SCAN_CHECK_INTERVAL = 0.5
+# seconds the workers of a stopped scan get to kill their commands before being killed
+SCAN_STOP_GRACE = 1.0
+
+# state of a scan worker process, set once by _init_worker and kept between chunks
+_worker = {}
+
+
+def _terminate_worker(signum, frame):
+    kill_running_processes()
+    os._exit(1)
+
+
+def _init_process():
+    # own process group, a stopped scan kills the worker with the commands it started
+    os.setsid()
+    signal.signal(signal.SIGTERM, _terminate_worker)
+
+
+def _init_worker(engine_name, script_directory, work_directory, wild_fold):
+    _init_process()
+    _worker['engine'] = get_engine(engine_name, script_directory, work_directory)
+    _worker['wild_fold'] = wild_fold
+    _worker['script_directory'] = script_directory
+    _worker['work_directory'] = work_directory
+
+
+def _process_chunk(chunk):
+    return process_mutations(chunk, _worker['script_directory'], _worker['work_directory'],
+                             _worker['wild_fold']['sequence'], _worker['engine'], _worker['wild_fold'])
+
+
+def _call_with_engine(engine_name, script_directory, work_directory, function, args):
+    return function(get_engine(engine_name, script_directory, work_directory), *args)
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def sequence_digest(sequence):
+    return hashlib.blake2b(sequence.encode(), digest_size=16).digest()
+
+
+def stop_workers(pool):
+    """Terminates the worker processes of a ProcessPoolExecutor and the commands they run."""
+    pids = list(getattr(pool, '_processes', None) or {})
+    for pid in pids:
+        kill_process_group(pid, signal.SIGTERM)
+    pool.shutdown(wait=False, cancel_futures=True)
+    # a worker busy in a C extension (ViennaRNA) only handles SIGTERM after the call returns
+    time.sleep(SCAN_STOP_GRACE)
+    for pid in pids:
+        kill_process_group(pid)
+
+
+def wait_for(pool, futures, check=None):
+    """
+    Waits for the first of futures to complete, calling check every SCAN_CHECK_INTERVAL
+    seconds; the workers of a process pool are stopped when check raises.
+
+    Returns:
+    - set: The completed futures.
+    """
+    try:
+        done, _ = wait(futures, timeout=SCAN_CHECK_INTERVAL if check else None, return_when=FIRST_COMPLETED)
+        if check:
+            check()
+    except BaseException:
+        if isinstance(pool, ProcessPoolExecutor):
+            stop_workers(pool)
+        else:
+            pool.shutdown(wait=False, cancel_futures=True)
+        raise
+    return done
+
+
+def run_in_worker(function, engine, script_directory, work_directory, *args, check=None):
+    """
+    Calls function(engine, *args) in a new worker process, for the CPU-bound steps of a
+    scan outside scan_mutations: in the web process they would block the eventlet hub,
+    and with it every request and socket of the server, until ViennaRNA returns.
+
+    Args:
+    - function (callable): Module-level function taking the engine first, e.g. fold_wild_type.
+    - engine: Folding engine, created again in the worker from its name.
+    - script_directory (str): Directory with the pipeline bash scripts.
+    - work_directory (str): Analysis directory.
+    - check (callable): Called every SCAN_CHECK_INTERVAL seconds, raising from it stops the worker.
+
+    Returns:
+    - The return value of function.
+    """
+    pool = ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn'),
+                               initializer=_init_process)
+    with pool:
+        future = pool.submit(_call_with_engine, engine.name, script_directory, work_directory, function, args)
+        while not wait_for(pool, [future], check):
+            pass
+        return future.result()
+
+
+def fold_wild_type_in_worker(engine, wild_sequence, script_directory, work_directory, cache=None, check=None):
+    """fold_wild_type in a worker process, the fold cache is looked up and filled in this process."""
+    wild_fold = cache.get_fold(engine.params, wild_sequence) if cache is not None else None
+    if wild_fold is None:
+        wild_fold = run_in_worker(fold_wild_type, engine, script_directory, work_directory, wild_sequence, check=check)
+        if cache is not None:
+            cache.set_fold(engine.params, wild_sequence, wild_fold)
+    return wild_fold
+
+
+def scan_mutations(mutations, engine, wild_fold, script_directory, work_directory,
+                   executor=None, workers=None, chunk_size=None, cache=None, check=None):
+    """
+    Evaluates mutants in chunks and yields the results as soon as each chunk completes.
+
+    Mutations producing the same sequence (e.g. an insertion before or after the same
+    nucleotide, deletions inside a homopolymer run) are folded once, the result is
+    copied to every mutation key. With a fold cache, mutants folded by an earlier
+    scan of the same wild type are taken from the cache in this process and never
+    reach the workers; the results are written to the cache once, when the scan ends.
+
+    Args:
+    - mutations (iterable): (key, mutated sequence) pairs, e.g. from generate_mutations.
+    - engine: Folding engine from pipeline.engine.
+    - wild_fold (dict): Wild-type fold from engine.fold_wild_type().
+    - script_directory (str): Directory with the pipeline bash scripts.
+    - work_directory (str): Analysis directory.
+    - executor (str): "process" or "thread", defaults to SNP_SCAN_EXECUTOR. "thread" is
+      refused with the vienna engine.
+    - workers (int): Number of workers, defaults to SNP_SCAN_WORKERS.
+    - chunk_size (int): Mutants per task, defaults to SNP_SCAN_CHUNK_SIZE or the engine batch size.
+    - cache (FoldCache): Fold cache from pipeline.cache, the mutant results are kept in one
+      entry per wild type (ScanPairs).
+    - check (callable): Called every SCAN_CHECK_INTERVAL seconds while waiting for the
+      workers, raising from it (cancelled or timed out job) stops the workers at once.
+
+    Yields:
+    - dict: One row of mutation_results.csv per mutant, in completion order.
+    """
+    executor = executor or SCAN_EXECUTOR
+    workers = workers or SCAN_WORKERS
+    chunk_size = chunk_size or SCAN_CHUNK_SIZE or getattr(engine, 'batch_size', 16)
+
+    if executor == 'process':
+        # spawn: the workers must not inherit the eventlet hub of the web process
+        pool = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_worker,
+            initargs=(engine.name, script_directory, work_directory, wild_fold)
+        )
+
+        def submit(chunk):
+            return pool.submit(_process_chunk, chunk)
+    elif executor == 'thread':
+        if engine.name == ViennaEngine.name:
+            raise ValueError("The thread scan executor cannot run the vienna engine, use the process executor")
+        pool = ThreadPoolExecutor(max_workers=workers)
+
+        def submit(chunk):
+            return pool.submit(process_mutations, chunk, script_directory, work_directory,
+                               wild_fold['sequence'], engine, wild_fold)
+    else:
+        raise ValueError(f"Unknown scan executor: {executor}")
+
+    # the mutants of the earlier scans, read and written as one entry (ScanPairs)
+    pairs = cache.scan_pairs(engine.params, wild_fold['sequence']) if cache is not None else None
+    duplicates = {}  # digest -> keys waiting for the result of the same sequence
+    finished = {}  # digest -> result of the folded sequence
+    ready = []  # results of duplicates whose sequence was already folded
+
+    def unique_mutations():
+        for key, mutation in mutations:
+            digest = sequence_digest(mutation)
+            if digest in finished:
+                ready.append(dict(finished[digest], Mutation=key))
+            elif digest in duplicates:
+                duplicates[digest].append(key)
+            else:
+                cached = cached_mutation_result(pairs, engine, wild_fold, key, mutation) if pairs is not None else None
+                if cached is not None:
+                    finished[digest] = cached
+                    ready.append(cached)
+                    continue
+                duplicates[digest] = []
+                yield key, mutation
+
+    def fan_out(result, mutation):
+        digest = sequence_digest(mutation)
+        finished[digest] = result
+        if pairs is not None:
+            store_mutation_result(pairs, engine, wild_fold, mutation, result)
+        yield result
+        for key in duplicates.pop(digest):
+            yield dict(result, Mutation=key)
+
+    try:
+        chunks = chunked(unique_mutations(), chunk_size)
+        with pool:
+            # only a few chunks per worker are in flight, the rest is generated lazily
+            pending = {}
+            for chunk in islice(chunks, 2 * workers):
+                pending[submit(chunk)] = chunk
+
+            while pending:
+                done = wait_for(pool, pending, check)
+                for future in done:
+                    chunk = pending.pop(future)
+                    for result, (key, mutation) in zip(future.result(), chunk):
+                        yield from fan_out(result, mutation)
+                    chunk = next(chunks, None)
+                    if chunk is not None:
+                        pending[submit(chunk)] = chunk
+                    while ready:
+                        yield ready.pop()
+
+            # results taken from the cache when every remaining mutant was cached
+            while ready:
+                yield ready.pop()
+    finally:
+        # a stopped scan keeps the mutants it folded
+        if pairs is not None:
+            pairs.flush()
+
+    logger.info(f"Scanned {len(finished)} unique mutant sequences")
@@ -1,14 +1,27 @@
-import pandas as pd
-import subprocess
 import os
 import logging
-import shutil
-import tempfile
+from pipeline.engine import get_engine, mutation_result
 
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
-def generate_mutations(sequence):
+def count_mutations(length, mode='full'):
+    """Number of mutations generate_mutations yields for a sequence of the given length."""
+    if mode == 'substitutions':
+        return 3 * length
+    return 3 * length + length + 4 * (length + 1)
+
+def generate_mutations(sequence, mode='full'):
+    """
+    Yields (key, mutated sequence) for the single mutants of a sequence.
+
+    Args:
+    - sequence (str): The wild-type sequence.
+    - mode (str): "full" for substitutions, deletions and insertions, "substitutions"
+      for substitutions only (reduced mode for long sequences).
+    """
+    if mode not in ('full', 'substitutions'):
+        raise ValueError(f"Unknown mutation mode: {mode}")
     if 'T' in sequence:
         nucleotides = ['A', 'C', 'G', 'T']
     else:
@@ -21,6 +34,9 @@ def generate_mutations(sequence):
                 key = f"{sequence[i]}_{i+1}_{nucleotide}"
                 yield key, mutated_sequence
 
+    if mode == 'substitutions':
+        return
+
     for i in range(len(sequence)):
         mutated_sequence = sequence[:i] + sequence[i+1:]
         key = f"{sequence[i]}_{i+1}_-"
@@ -33,12 +49,6 @@ def generate_mutations(sequence):
             key = f"-_{i+1}_{nucleotide}"
             yield key, mutated_sequence
 
-def run_command(command, cwd=None):
-    result = subprocess.run(command, capture_output=True, text=True, shell=True, cwd=cwd)
-    if result.returncode != 0:
-        raise RuntimeError(f"Command failed: {command}\nError: {result.stderr.strip()}")
-    return result.stdout.strip()
-
 def generate_mutated_sequences(wild_sequence, mutations):
     """
     Generates a list of mutated sequences based on the wild-type sequence and a list of mutations.
@@ -77,69 +87,111 @@ def generate_mutated_sequences(wild_sequence, mutations):
 
     return mutated_sequences
 
-def process_mutation(key, mutation, script_directory, sequences_directory,wild_sequence):
+def fold_wild_type(engine, wild_sequence, cache=None):
+    """
+    Folds the wild type with the given engine, reusing a cached fold if there is one.
+    """
+    if cache is not None:
+        wild_fold = cache.get_fold(engine.params, wild_sequence)
+        if wild_fold is not None:
+            return wild_fold
+
+    wild_fold = engine.fold_wild_type(wild_sequence)
+    if cache is not None:
+        cache.set_fold(engine.params, wild_sequence, wild_fold)
+    return wild_fold
+
+def cached_mutation_result(cache, engine, wild_fold, key, mutation):
+    """
+    Returns the cached row for a mutant, or None if this pair of sequences was never folded.
+    """
+    values = cache.get_pair(engine.params, wild_fold['sequence'], mutation)
+    if values is None:
+        return None
+    return mutation_result(key, values['RNApdist'], values['RNAdistance(f)'])
+
+def store_mutation_result(cache, engine, wild_fold, mutation, result):
+    if "Error" in (result['RNApdist'], result['RNAdistance(f)']):
+        return
+    cache.set_pair(engine.params, wild_fold['sequence'], mutation, {
+        'RNApdist': result['RNApdist'],
+        'RNAdistance(f)': result['RNAdistance(f)']
+    })
+
+def save_mutant_artifacts(engine, wild_fold, key, mutation, directory):
+    """
+    Writes the result files of one mutant (sequences, dot-brackets, distances) into directory.
+    Used for the final top 10 only, the scan itself keeps nothing on disk.
+    """
+    os.makedirs(directory, exist_ok=True)
+    for filename, content in engine.artifacts(key, mutation, wild_fold).items():
+        with open(os.path.join(directory, filename), 'w') as f:
+            f.write(content)
+
+def save_top_10_artifacts(engine, wild_fold, mutations, mutated_sequences, analysis_dir):
+    """
+    Writes the artifacts of the final top 10 into analysis_dir/top_10/<rank>_<key>,
+    a mutant that fails is logged and skipped.
+    """
+    for rank, (key, mutated_sequence) in enumerate(zip(mutations, mutated_sequences), start=1):
+        try:
+            save_mutant_artifacts(engine, wild_fold, key, mutated_sequence, os.path.join(analysis_dir, 'top_10', f"{rank:02d}_{key}"))
+        except (RuntimeError, OSError) as e:
+            logger.error(f"Error while saving results of mutation {key}: {e}")
+
+def process_mutation(key, mutation, script_directory, sequences_directory, wild_sequence, engine=None, wild_fold=None, cache=None):
+    """
+    Computes RNApdist and RNAdistance (f) between the wild-type sequence and one mutant.
+
+    Args:
+    - key (str): Mutation key in the format "X_n_Y".
+    - mutation (str): The mutated sequence.
+    - script_directory (str): Directory with the pipeline bash scripts.
+    - sequences_directory (str): Analysis directory, used for temporary files by the cli engine.
+    - wild_sequence (str): The wild-type sequence.
+    - engine: Folding engine from pipeline.engine, by default the one returned by get_engine().
+    - wild_fold (dict): Wild-type fold from engine.fold_wild_type(), shared by all mutants
+      of a scan. Computed here if not given.
+    - cache (FoldCache): Fold cache from pipeline.cache, results are looked up and stored there.
+
+    Returns:
+    - dict: Row of mutation_results.csv, with "Error" in place of values that failed.
+    """
     try:
+        if engine is None:
+            engine = get_engine(script_directory=script_directory, work_directory=sequences_directory)
+        if wild_fold is None:
+            wild_fold = fold_wild_type(engine, wild_sequence, cache)
+
+        if cache is not None:
+            result = cached_mutation_result(cache, engine, wild_fold, key, mutation)
+            if result is not None:
+                return result
 
-        with tempfile.TemporaryDirectory(dir=sequences_directory) as mutation_dir:
-            
-            wt_filename = os.path.join(mutation_dir, "wt.txt")
-            with open(wt_filename, 'w') as f:
-                f.write(wild_sequence + '\n')
-  
-            mut_filename = os.path.join(mutation_dir, "mut.txt")
-            with open(mut_filename, 'w') as f:
-                f.write(mutation + '\n')
-  
-            try:
-                command = f'bash {os.path.join(script_directory, "01-RNApdist")}'
-                run_command(command, cwd=mutation_dir)
-            except RuntimeError as e:
-                logger.error(f"Error during RNApdist: {e}")
-                rnapdist_output = "Error during RNApdist"
-
-            rnapdist_result_path = os.path.join(mutation_dir, "RNApdist-result.txt")
-            if os.path.exists(rnapdist_result_path):
-                with open(rnapdist_result_path) as f:
-                    rnapdist_output = f.read().strip()
-            else:
-                rnapdist_output = "Error: RNApdist-result.txt not found"
-                logger.error(rnapdist_output)
-
-            
-            try:
-                command = f'bash {os.path.join(script_directory, "02-RNAfold")}'
-                run_command(command, cwd=mutation_dir)
-            except RuntimeError as e:
-                logger.error(f"Error during RNAfold: {e}")
-
-            
-            try:
-                command = f'bash {os.path.join(script_directory, "03-RNAdistance")}'
-                run_command(command, cwd=mutation_dir)
-            except RuntimeError as e:
-                logger.error(f"Error during RNAdistance: {e}")
-
-            rnadistance_result_path = os.path.join(mutation_dir, "RNAdistance-result.txt")
-            if os.path.exists(rnadistance_result_path):
-                with open(rnadistance_result_path) as f:
-                    rnadistance_output = f.read().strip().split()
-            else:
-                rnadistance_output = ["Error", "RNAdistance-result.txt not found"]
-                logger.error(rnadistance_output)
-
-            return {
-                
-                'Mutation': key,
-                'RNApdist': float(rnapdist_output) if rnapdist_output.replace('.', '', 1).replace('e-', '', 1).isdigit() else "Error",
-                'RNAdistance(f)': float(rnadistance_output[1]) if len(rnadistance_output) > 1 and rnadistance_output[1].replace('.', '', 1).replace('e-', '', 1).isdigit() else "Error",
-                'Z-score': None
-            }
+        result = engine.evaluate(key, mutation, wild_fold)
+        if cache is not None:
+            store_mutation_result(cache, engine, wild_fold, mutation, result)
+        return result
 
     except Exception as e:
         logger.error(f"Error processing mutation {key}: {e}")
-        return {
-            'Mutation': key,
-            'RNApdist': "Error",
-            'RNAdistance(f)': "Error",
-            'Z-score': None
-        }
+        return mutation_result(key, "Error", "Error")
+
+def process_mutations(items, script_directory, sequences_directory, wild_sequence, engine, wild_fold):
+    """
+    Evaluates a batch of (key, mutated sequence) pairs, in one go if the engine
+    supports it (evaluate_batch), otherwise with process_mutation one by one.
+
+    Returns:
+    - list of dict: One row of mutation_results.csv per pair, in the same order.
+    """
+    if hasattr(engine, 'evaluate_batch'):
+        try:
+            return engine.evaluate_batch(items, wild_fold)
+        except Exception as e:
+            logger.error(f"Error processing batch of {len(items)} mutations: {e}")
+
+    return [
+        process_mutation(key, mutation, script_directory, sequences_directory, wild_sequence, engine, wild_fold)
+        for key, mutation in items
+    ]
@@ -100,7 +100,12 @@ def add_edges(graph, subtree, previous_parent, current_parent, common_positions,
 
 
 
-file_path=os.path.join("RNAdistance-backtrack.txt")
+# the analysis directory is given explicitly, several analyses run in the same process
+parser = argparse.ArgumentParser(description="Draws the HIT trees of RNAdistance-backtrack.txt")
+parser.add_argument('directory', nargs='?', default='.', help="analysis directory, the current one by default")
+args = parser.parse_args()
+
+file_path=os.path.join(args.directory, "RNAdistance-backtrack.txt")
 
 # load HIT tree strings from file
 with open(file_path, 'r') as file:
@@ -150,5 +155,5 @@ graph2.node("R1", "R1", color="black", fillcolor="green", style="filled", shape=
 add_edges(graph2, tree_list2, "R1", "R1", common_positions, common_position_labels, pos_dict2, key_usage_count2, is_root=True)
 
 # save the graphs as SVG files
-graph1.render(os.path.join('tree_mut'), format='svg')
-graph2.render(os.path.join('tree_wt'), format='svg')
+graph1.render(os.path.join(args.directory, 'tree_mut'), format='svg')
+graph2.render(os.path.join(args.directory, 'tree_wt'), format='svg')
@@ -0,0 +1,32 @@
+import unittest
+
+import admission
+
+
+class AdmissionTests(unittest.TestCase):
+
+    def test_single_cost_grows_with_fourth_power(self):
+        ratio = admission.estimate_cost('single', 400) / admission.estimate_cost('single', 200)
+        self.assertAlmostEqual(ratio, 16, delta=0.1)
+
+    def test_idle_server_accepts(self):
+        decision = admission.admit('single', 200, 'full', 0, budget=10, max_job_cost=1e9)
+        self.assertEqual(decision.action, 'accept')
+
+    def test_busy_server_refuses_with_wait(self):
+        decision = admission.admit('pair', 100, 'full', 100, budget=100, max_job_cost=1e9, cores=2)
+        self.assertEqual(decision.action, 'busy')
+        self.assertAlmostEqual(decision.wait, decision.cost / 2)
+
+    def test_long_sequence_requires_reduced_mode(self):
+        full = admission.estimate_cost('single', 1000, 'full')
+        substitutions = admission.estimate_cost('single', 1000, 'substitutions')
+        decision = admission.admit('single', 1000, 'full', 0, max_job_cost=(full + substitutions) / 2)
+        self.assertEqual((decision.action, decision.mode), ('reduce', 'substitutions'))
+
+        decision = admission.admit('single', 1000, 'full', 0, max_job_cost=substitutions / 2)
+        self.assertEqual(decision.action, 'too_large')
+
+
+if __name__ == '__main__':
+    unittest.main()
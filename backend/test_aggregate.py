@@ -0,0 +1,60 @@
+import random
+import unittest
+
+import numpy as np
+import pandas as pd
+import scipy.stats as stats
+
+from pipeline.aggregate import ScanAggregator
+
+
+def pandas_top_10(results):
+    """Top 10 as run_single computed it with a full DataFrame sort."""
+    arr_pdist = np.array([r['RNApdist'] if isinstance(r['RNApdist'], float) else np.nan for r in results])
+    arr_distance = np.array([r['RNAdistance(f)'] if isinstance(r['RNAdistance(f)'], float) else np.nan for r in results])
+    pdist_z = stats.zscore(arr_pdist, nan_policy='omit')
+    distance_z = stats.zscore(arr_distance, nan_policy='omit')
+    rows = [dict(r, **{'Z-score': pdist_z[i] + distance_z[i]}) for i, r in enumerate(results)]
+    df = pd.DataFrame(rows)
+    return df.sort_values(by='Z-score', ascending=False, kind='stable').head(10)['Mutation'].tolist()
+
+
+class ScanAggregatorTests(unittest.TestCase):
+
+    def scan(self, results):
+        aggregator = ScanAggregator(top_k=10)
+        for result in results:
+            aggregator.add(result)
+        return aggregator
+
+    def random_results(self, count, seed, errors=0.0):
+        rng = random.Random(seed)
+        results = []
+        for i in range(count):
+            pdist = round(rng.uniform(0, 20), 3) if rng.random() >= errors else "Error"
+            distance = float(rng.randint(0, 30)) if rng.random() >= errors else "Error"
+            results.append({'Mutation': f'A_{i}_C', 'RNApdist': pdist, 'RNAdistance(f)': distance, 'Z-score': None})
+        return results
+
+    def test_final_top_10_matches_full_sort(self):
+        for seed in range(20):
+            results = self.random_results(500, seed, errors=0.05)
+            top = [row['Mutation'] for row in self.scan(results).finalize()]
+            self.assertEqual(top, pandas_top_10(results))
+
+    def test_candidates_stay_bounded(self):
+        aggregator = self.scan(self.random_results(2000, 1))
+        self.assertLess(len(aggregator.candidates), 200)
+
+    def test_provisional_top_10(self):
+        aggregator = self.scan(self.random_results(100, 2))
+        self.assertEqual(len(aggregator.provisional_top()), 10)
+
+    def test_all_errors(self):
+        results = self.random_results(20, 3, errors=1.0)
+        top = [row['Mutation'] for row in self.scan(results).finalize()]
+        self.assertEqual(top, pandas_top_10(results))
+
+
+if __name__ == '__main__':
+    unittest.main()
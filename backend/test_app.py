@@ -3,6 +3,7 @@ from flask import json
 from app import app
 from unittest.mock import patch
 import uuid
+import time
 
 class FlaskAppTests(unittest.TestCase):
 
@@ -14,6 +15,18 @@ class FlaskAppTests(unittest.TestCase):
     def tearDown(self):
         pass  
 
+    def wait_for_analysis(self, analysis_id, timeout=300):
+        """Polls the status endpoint until the queued analysis is finished."""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            response = self.app.get(f'/api/status/{analysis_id}')
+            self.assertEqual(response.status_code, 200)
+            status = json.loads(response.data).get('status')
+            if status in ('completed', 'error'):
+                return status
+            time.sleep(0.5)
+        self.fail(f"Analysis {analysis_id} not finished after {timeout} s")
+
 
     @patch('uuid.uuid4', return_value=uuid.uuid4())
     def test_post_analysis_request_pair(self, mock_uuid):
@@ -25,12 +38,13 @@ class FlaskAppTests(unittest.TestCase):
         }
         response = self.app.post('/api/analyze/pair', data=json.dumps(data), content_type='application/json')  
         print(response)
-        self.assertEqual(response.status_code, 200)  
+        self.assertEqual(response.status_code, 202)  
         self.assertIn(b'analysis_id', response.data)
 
         response_data = json.loads(response.data)
         analysis_id = response_data.get('analysis_id')
         print(f"Test received analysis_id: {analysis_id}")
+        self.wait_for_analysis(analysis_id)
         
         response = self.app.get(f'/api/results/pair/{analysis_id}')  
         self.assertEqual(response.status_code, 200)  
@@ -48,12 +62,37 @@ class FlaskAppTests(unittest.TestCase):
         }
         
         response = self.app.post('/api/analyze/single', data=json.dumps(data), content_type='application/json')  
-        self.assertEqual(response.status_code, 200)  
+        self.assertEqual(response.status_code, 202)  
         self.assertIn(b'analysis_id', response.data)  
         response_data = json.loads(response.data)
         received_analysis_id = response_data.get('analysis_id')
         
         print(f"Test received analysis_id: {received_analysis_id}")
+        self.assertEqual(self.wait_for_analysis(received_analysis_id), 'completed')
+
+    def test_single_mutation_results_pages(self):
+        """All mutants of a finished scan can be read page by page with filters."""
+        analysis_id = str(uuid.uuid4())
+        data = {'wildSequence': 'AUGCUAGCUAGCUA', 'analysisId': analysis_id}
+        response = self.app.post('/api/analyze/single', data=json.dumps(data), content_type='application/json')
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(self.wait_for_analysis(analysis_id), 'completed')
+
+        response = self.app.get(f'/api/results/single/{analysis_id}/mutations?page_size=20')
+        self.assertEqual(response.status_code, 200)
+        page = json.loads(response.data)
+        self.assertEqual(page['total'], 8 * 14 + 4)
+        self.assertEqual(len(page['rows']), 20)
+        z_scores = [row['Z-score'] for row in page['rows'] if row['Z-score'] is not None]
+        self.assertEqual(z_scores, sorted(z_scores, reverse=True))
+
+        response = self.app.get(f'/api/results/single/{analysis_id}/mutations?position_min=4&position_max=6&kind=substitution&sort=position&order=asc')
+        rows = json.loads(response.data)['rows']
+        self.assertEqual(len(rows), 9)
+        self.assertTrue(all(4 <= row['position'] <= 6 for row in rows))
+
+        response = self.app.get(f'/api/results/single/{analysis_id}/mutations?sort=sequence')
+        self.assertEqual(response.status_code, 400)
 
 
 if __name__ == '__main__':
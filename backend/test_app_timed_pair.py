@@ -17,6 +17,15 @@ class FlaskAppTests(unittest.TestCase):
         
         pass  
 
+    def wait_for_analysis(self, analysis_id):
+        """Polls the status endpoint until the queued analysis is finished."""
+        while True:
+            response = self.app.get(f'/api/status/{analysis_id}')
+            status = json.loads(response.data).get('status')
+            if response.status_code != 200 or status in ('completed', 'error'):
+                return status
+            time.sleep(0.1)
+
     def generate_sequences_pair(self, length):
         """Generate random RNA sequences of given length for pair."""
         bases = ['A', 'G', 'C', 'U']
@@ -65,9 +74,9 @@ class FlaskAppTests(unittest.TestCase):
 
                 start_time = time.time()
                 response = self.app.post('/api/analyze/pair', data=json.dumps(data), content_type='application/json')
-                execution_time = time.time() - start_time
 
-                if response.status_code == 200:
+                if response.status_code == 202 and self.wait_for_analysis(analysis_id) == 'completed':
+                    execution_time = time.time() - start_time
                     results.append((length, execution_time))
 
         with open('pair_results.csv', 'w', newline='') as csvfile:
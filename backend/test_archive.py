@@ -0,0 +1,110 @@
+import io
+import os
+import tempfile
+import unittest
+import zipfile
+from unittest.mock import patch, MagicMock
+
+import app
+import archive
+
+
+class StreamZipTests(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.files = {
+            'mutation_results.csv': b'Mutation,RNApdist\n' + b'A_1_C,1.0\n' * 20000,
+            'rna.ps': b'%!PS',
+            'scan-checkpoint.jsonl': b'{}\n',
+            'top_10/01_A_1_C/mut.svg': b'<svg/>',
+            'wt-dotbracket.svg.gz': b'\x1f\x8b'
+        }
+        for name, data in self.files.items():
+            path = os.path.join(self.directory.name, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as f:
+                f.write(data)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_filters(self):
+        self.assertEqual(archive.list_files(self.directory.name), ['mutation_results.csv', 'top_10/01_A_1_C/mut.svg'])
+        self.assertEqual(archive.list_files(self.directory.name, include=['*.svg']), ['top_10/01_A_1_C/mut.svg'])
+        self.assertEqual(archive.list_files(self.directory.name, exclude=['top_10/*']), ['mutation_results.csv'])
+        # nothing is deleted
+        self.assertTrue(os.path.exists(os.path.join(self.directory.name, 'rna.ps')))
+
+    def test_streamed_archive_is_valid(self):
+        names = archive.list_files(self.directory.name)
+        parts = list(archive.stream_zip(self.directory.name, names))
+        self.assertGreater(len(parts), 2)
+        with zipfile.ZipFile(io.BytesIO(b''.join(parts))) as z:
+            self.assertIsNone(z.testzip())
+            self.assertEqual(z.namelist(), names)
+            self.assertEqual(z.read('mutation_results.csv'), self.files['mutation_results.csv'])
+
+    def test_saved_archive_only_replaced_when_complete(self):
+        names = archive.list_files(self.directory.name)
+        zip_path = os.path.join(self.directory.name, 'analysis.zip')
+        parts = archive.stream_zip(self.directory.name, names, zip_path)
+        next(parts)
+        parts.close()  # client gone
+        self.assertEqual(os.listdir(self.directory.name).count('analysis.zip'), 0)
+        self.assertFalse(any(name.endswith('.part') for name in os.listdir(self.directory.name)))
+
+        data = b''.join(archive.stream_zip(self.directory.name, names, zip_path))
+        with open(zip_path, 'rb') as f:
+            self.assertEqual(f.read(), data)
+
+
+class ZipDownloadTests(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.analysis_dir = os.path.join(self.directory.name, 'pipeline', 'single-1')
+        os.makedirs(self.analysis_dir)
+        with open(os.path.join(self.analysis_dir, 'ten_best_results.csv'), 'w') as f:
+            f.write('no,Mutation\n1,A_1_C\n')
+        self.db = MagicMock()
+        self.db.read_processing_status.return_value = ({'type': 'single', 'processing_status': 'completed'}, 200)
+        self.patches = [patch.object(app, 'BASE_DIR', self.directory.name), patch.object(app, 'db_func', self.db)]
+        for p in self.patches:
+            p.start()
+        self.client = app.app.test_client()
+
+    def tearDown(self):
+        for p in self.patches:
+            p.stop()
+        self.directory.cleanup()
+
+    def test_finished_analysis_archive_is_cached(self):
+        first = self.client.get('/api/results/single-1/zip-download')
+        self.assertEqual(first.status_code, 200)
+        first.get_data()
+        zip_path = os.path.join(self.analysis_dir, 'single-1.zip')
+        self.assertTrue(os.path.exists(zip_path))
+
+        second = self.client.get('/api/results/single-1/zip-download')
+        # sent from the saved archive
+        self.assertIsNone(first.headers.get('ETag'))
+        self.assertIsNotNone(second.headers.get('ETag'))
+        self.assertEqual(second.data, first.data)
+        with zipfile.ZipFile(io.BytesIO(second.data)) as z:
+            self.assertEqual(z.namelist(), ['ten_best_results.csv'])
+        second.close()
+
+    def test_running_analysis_is_not_cached(self):
+        self.db.read_processing_status.return_value = ({'type': 'single', 'processing_status': 'processing'}, 200)
+        response = self.client.get('/api/results/single-1/zip-download?exclude=*.txt')
+        self.assertEqual(response.status_code, 200)
+        response.get_data()
+        self.assertFalse(os.path.exists(os.path.join(self.analysis_dir, 'single-1.zip')))
+
+    def test_missing_analysis(self):
+        self.assertEqual(self.client.get('/api/results/other/zip-download').status_code, 404)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from pipeline.cache import TieredCache, FoldCache
+
+
+class TieredCacheTests(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_memory_and_disk_tiers(self):
+        cache = TieredCache(self.directory.name, memory_items=1)
+        cache.set('a', {'value': 1})
+        cache.set('b', {'value': 2})  # pushes 'a' out of memory
+
+        self.assertEqual(cache.get('b'), {'value': 2})
+        self.assertEqual(cache.get('a'), {'value': 1})
+        self.assertIsNone(cache.get('c'))
+
+        stats = cache.stats()
+        self.assertEqual(stats['memory_hits'], 1)
+        self.assertEqual(stats['disk_hits'], 1)
+        self.assertEqual(stats['misses'], 1)
+
+    def test_disk_store_is_shared(self):
+        TieredCache(self.directory.name).set('a', [1, 2, 3])
+        self.assertEqual(TieredCache(self.directory.name).get('a'), [1, 2, 3])
+
+    def test_size_based_eviction(self):
+        cache = TieredCache(self.directory.name, memory_items=1, max_bytes=2000)
+        for i in range(20):
+            cache.set(f'key-{i}', 'x' * 200)
+
+        total = sum(size for _, size, _ in cache.files())
+        self.assertLessEqual(total, 2000)
+        self.assertGreater(cache.stats()['evictions'], 0)
+        self.assertEqual(cache.get('key-19'), 'x' * 200)
+
+    def test_overwrite_keeps_the_disk_size(self):
+        cache = TieredCache(self.directory.name, max_bytes=10000)
+        cache.set('first', 'x')
+        for i in range(50):
+            cache.set('key', 'x' * 100)
+        total = sum(size for _, size, _ in cache.files())
+        self.assertEqual(cache.stats()['disk_bytes'], total)
+        self.assertEqual(cache.stats()['evictions'], 0)
+        cache.delete('key')
+        self.assertEqual(cache.stats()['disk_bytes'], sum(size for _, size, _ in cache.files()))
+
+    def test_delete_drops_both_tiers(self):
+        cache = TieredCache(self.directory.name)
+        cache.set('a', 1)
+        cache.delete('a')
+        self.assertIsNone(cache.get('a'))
+        self.assertIsNone(TieredCache(self.directory.name).get('a'))
+
+
+class FoldCacheTests(unittest.TestCase):
+
+    def test_keys_depend_on_parameters(self):
+        with tempfile.TemporaryDirectory() as directory:
+            cache = FoldCache(directory)
+            cache.set_pair('vienna', 'GGGAAACCC', 'GGGAUACCC', {'RNApdist': 1.5, 'RNAdistance(f)': 2.0})
+
+            self.assertEqual(cache.get_pair('vienna', 'GGGAAACCC', 'GGGAUACCC'), {'RNApdist': 1.5, 'RNAdistance(f)': 2.0})
+            self.assertIsNone(cache.get_pair('cli', 'GGGAAACCC', 'GGGAUACCC'))
+            self.assertIsNone(cache.get_fold('vienna', 'GGGAAACCC'))
+
+    def test_scan_pairs_are_written_once(self):
+        with tempfile.TemporaryDirectory() as directory:
+            cache = FoldCache(directory)
+            pairs = cache.scan_pairs('vienna', 'GGGAAACCC')
+            with patch.object(FoldCache, 'write', wraps=cache.write) as write:
+                for mutant in ('GGGAUACCC', 'GGGAAACCA', 'AGGAAACCC'):
+                    pairs.set_pair('vienna', 'GGGAAACCC', mutant, {'RNApdist': 1.0, 'RNAdistance(f)': 2.0})
+                self.assertEqual(pairs.get_pair('vienna', 'GGGAAACCC', 'GGGAUACCC'), {'RNApdist': 1.0, 'RNAdistance(f)': 2.0})
+                self.assertEqual(write.call_count, 0)
+                pairs.flush()
+                pairs.flush()
+                self.assertEqual(write.call_count, 1)
+
+            # a later scan, in another process, reads the entry
+            later = FoldCache(directory).scan_pairs('vienna', 'GGGAAACCC')
+            self.assertEqual(later.get_pair('vienna', 'GGGAAACCC', 'AGGAAACCC'), {'RNApdist': 1.0, 'RNAdistance(f)': 2.0})
+            self.assertIsNone(later.get_pair('vienna', 'GGGAAACCC', 'GGGAAACCC'))
+            self.assertIsNone(FoldCache(directory).scan_pairs('cli', 'GGGAAACCC').get_pair('cli', 'GGGAAACCC', 'AGGAAACCC'))
+            # the pairs of another wild type are left to the fold cache
+            later.set_pair('vienna', 'CCCAAAGGG', 'CCCAAAGGA', {'RNApdist': 3.0, 'RNAdistance(f)': 4.0})
+            self.assertEqual(cache.get_pair('vienna', 'CCCAAAGGG', 'CCCAAAGGA'), {'RNApdist': 3.0, 'RNAdistance(f)': 4.0})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,128 @@
+import os
+import random
+import tempfile
+import unittest
+from unittest.mock import patch, MagicMock
+
+import app
+from pipeline.aggregate import ScanAggregator
+from pipeline.checkpoint import ScanCheckpoint
+
+
+class ScanCheckpointTests(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'scan-checkpoint.jsonl')
+        rng = random.Random(0)
+        self.results = [{'Mutation': f'A_{i}_C', 'RNApdist': round(rng.uniform(0, 20), 3),
+                         'RNAdistance(f)': float(rng.randint(0, 30)), 'Z-score': None} for i in range(200)]
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def checkpoint(self, sequence='AUGC', mode='full'):
+        return ScanCheckpoint(self.path, sequence, mode, 'vienna-test')
+
+    def scan(self, results, checkpoint):
+        """Stands in for the scan loop of run_single, folding only the mutants not checkpointed yet."""
+        aggregator = ScanAggregator(top_k=10)
+        finished = checkpoint.load()
+        for result in finished:
+            aggregator.add(result)
+        finished_keys = {result['Mutation'] for result in finished}
+        with checkpoint:
+            for result in results:
+                if result['Mutation'] in finished_keys:
+                    continue
+                checkpoint.append(result)
+                aggregator.add(result)
+        return aggregator
+
+    def test_resumed_scan_matches_uninterrupted_scan(self):
+        self.scan(self.results[:73], self.checkpoint())
+        resumed = self.scan(self.results, self.checkpoint())
+        uninterrupted = ScanAggregator(top_k=10)
+        for result in self.results:
+            uninterrupted.add(result)
+        self.assertEqual(len(resumed.rows), len(self.results))
+        self.assertEqual([row['Mutation'] for row in resumed.finalize()],
+                         [row['Mutation'] for row in uninterrupted.finalize()])
+
+    def test_resume_only_scans_missing_keys(self):
+        self.scan(self.results[:50], self.checkpoint())
+        appended = []
+        checkpoint = self.checkpoint()
+        checkpoint.append = lambda row: appended.append(row['Mutation'])
+        self.scan(self.results, checkpoint)
+        self.assertEqual(appended, [row['Mutation'] for row in self.results[50:]])
+
+    def test_torn_last_line_is_dropped(self):
+        self.scan(self.results[:10], self.checkpoint())
+        with open(self.path, 'a') as f:
+            f.write('{"Mutation": "A_10_')
+        self.assertEqual(len(self.checkpoint().load()), 10)
+        self.assertEqual(len(self.scan(self.results[:20], self.checkpoint()).rows), 20)
+        self.assertEqual(len(self.checkpoint().load()), 20)
+
+    def test_checkpoint_of_another_scan_is_discarded(self):
+        self.scan(self.results[:10], self.checkpoint())
+        self.assertEqual(self.checkpoint(mode='substitutions').load(), [])
+        self.assertFalse(os.path.exists(self.path))
+
+
+class ResumeInterruptedScansTests(unittest.TestCase):
+    """Single scans left in_progress when a backend with the local queue restarts."""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.db = MagicMock()
+        self.queue = MagicMock()
+        self.patches = [
+            patch.object(app, 'BASE_DIR', self.directory.name),
+            patch.object(app, 'db_func', self.db),
+            patch.object(app, 'job_queue', self.queue),
+            patch.object(app, 'mark_analysis_failed')
+        ]
+        for p in self.patches:
+            p.start()
+
+    def tearDown(self):
+        for p in reversed(self.patches):
+            p.stop()
+        self.directory.cleanup()
+
+    def write_checkpoint(self, analysis_id, sequence, mode):
+        analysis_dir = os.path.join(self.directory.name, 'pipeline', analysis_id)
+        os.makedirs(analysis_dir)
+        with ScanCheckpoint(os.path.join(analysis_dir, 'scan-checkpoint.jsonl'), sequence, mode, 'vienna-test') as checkpoint:
+            checkpoint.append({'Mutation': 'A_1_C', 'RNApdist': 1.0, 'RNAdistance(f)': 2.0, 'Z-score': None})
+
+    def test_scan_with_checkpoint_is_queued_again(self):
+        self.db.read_single_analyses.return_value = [('scan-1', 'AUGCAUGC')]
+        self.write_checkpoint('scan-1', 'AUGCAUGC', 'substitutions')
+        app.resume_interrupted_scans()
+        self.db.read_single_analyses.assert_called_once_with('in_progress')
+        args, kwargs = self.queue.submit.call_args
+        self.assertEqual(args, ('scan-1', 'single', 'AUGCAUGC', 'scan-1', 'substitutions'))
+        self.assertGreater(kwargs['cost'], 0)
+        app.mark_analysis_failed.assert_not_called()
+
+    def test_scan_without_checkpoint_is_marked_failed(self):
+        self.db.read_single_analyses.return_value = [('scan-1', 'AUGCAUGC'), ('scan-2', 'GGGAAACCC')]
+        # the checkpoint of scan-2 is the one of another sequence
+        self.write_checkpoint('scan-2', 'AUGCAUGC', 'full')
+        app.resume_interrupted_scans()
+        self.queue.submit.assert_not_called()
+        self.assertEqual([c.args[0] for c in app.mark_analysis_failed.call_args_list], ['scan-1', 'scan-2'])
+
+    def test_scan_is_marked_failed_when_the_queue_is_full(self):
+        self.db.read_single_analyses.return_value = [('scan-1', 'AUGCAUGC')]
+        self.write_checkpoint('scan-1', 'AUGCAUGC', 'full')
+        self.queue.submit.side_effect = app.QueueFull("full")
+        app.resume_interrupted_scans()
+        app.mark_analysis_failed.assert_called_once_with('scan-1', self.queue.submit.side_effect)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,137 @@
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from unittest.mock import patch, call, MagicMock
+
+import pandas as pd
+
+import app
+from pipeline.engine import RNA
+
+SEQUENCES = [
+    'GGGAAAUCCCAUGCUAGCUAGG',
+    'AAAUGCCCUAGCUAGGGAAACC',
+    'CUAGCUAGGCAUCGAUCGAUGC'
+]
+# (wild type, mutant) pairs of the pair analyses
+PAIRS = [
+    ('GGGAAAUCCCAUGCUAGCUAGG', 'GGGAAAUCCCAUGCUUGCUAGG'),
+    ('AAAUGCCCUAGCUAGGGAAACC', 'AAAUGCCCUAGCGAGGGAAACC'),
+    ('CUAGCUAGGCAUCGAUCGAUGC', 'CUAGCUAGGCAUCGAUCGAUGCA')
+]
+# steps of the pair pipeline and the programs they call, tree.py renders with graphviz (dot)
+PAIR_SCRIPTS = ['01-RNApdist', '02-RNAfold', '03-RNAdistance', '04-RNAplot', '98-find-domains', '99-find-differences', 'tree.py']
+PAIR_TOOLS = ['RNApdist', 'RNAfold', 'RNAdistance', 'RNAplot', 'epstopdf', 'pdf2svg', 'svgo', 'bc', 'dot']
+
+
+@unittest.skipIf(RNA is None, "ViennaRNA Python bindings are not installed")
+class ConcurrentSingleScanTests(unittest.TestCase):
+    """Single scans running in threads of one process, as the job queue runs them."""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        os.makedirs(os.path.join(self.directory.name, 'pipeline'))
+        # the database is not needed to compare the artifacts, and every scan folds from scratch
+        self.patches = [
+            patch.object(app, 'BASE_DIR', self.directory.name),
+            patch.object(app, 'db_func', MagicMock()),
+            patch.object(app, 'get_fold_cache', lambda: None)
+        ]
+        for p in self.patches:
+            p.start()
+        self.cwd = os.getcwd()
+
+    def tearDown(self):
+        for p in self.patches:
+            p.stop()
+        self.directory.cleanup()
+
+    def artifacts(self, analysis_id):
+        analysis_dir = os.path.join(self.directory.name, 'pipeline', analysis_id)
+        results = pd.read_csv(os.path.join(analysis_dir, 'mutation_results.csv'))
+        ten_best = pd.read_csv(os.path.join(analysis_dir, 'ten_best_results.csv'))
+        top_10 = sorted(os.listdir(os.path.join(analysis_dir, 'top_10')))
+        # the full table is in completion order, which differs between runs
+        return (results.sort_values('Mutation').reset_index(drop=True).to_dict('records'),
+                ten_best['Z-score'].round(6).tolist(), len(top_10))
+
+    def test_parallel_scans_match_serial_scans(self):
+        for i, sequence in enumerate(SEQUENCES):
+            app.start_single(sequence, f'serial-{i}')
+
+        threads = [threading.Thread(target=app.start_single, args=(sequence, f'parallel-{i}'))
+                   for i, sequence in enumerate(SEQUENCES)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(os.getcwd(), self.cwd)
+        for i in range(len(SEQUENCES)):
+            self.assertEqual(self.artifacts(f'parallel-{i}'), self.artifacts(f'serial-{i}'))
+
+
+@unittest.skipIf(not all(shutil.which(tool) for tool in PAIR_TOOLS), "tools of the pair pipeline are not installed")
+class ConcurrentPairAnalysisTests(unittest.TestCase):
+    """Pair analyses running their steps through run_dag in threads of one process, as the job queue runs them."""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        os.makedirs(os.path.join(self.directory.name, 'pipeline'))
+        # the analyses are written to the temporary tree, next to copies of the pipeline scripts
+        for name in PAIR_SCRIPTS:
+            shutil.copy2(os.path.join(app.BASE_DIR, 'pipeline', name), os.path.join(self.directory.name, 'pipeline', name))
+        self.db = MagicMock()
+        self.db.save_pair_results.return_value = ({}, 201)
+        # every pair is computed, none is restored from the fold cache
+        cache = MagicMock()
+        cache.get_pair.return_value = None
+        self.patches = [
+            patch.object(app, 'BASE_DIR', self.directory.name),
+            patch.object(app, 'db_func', self.db),
+            patch.object(app, 'get_fold_cache', lambda: cache)
+        ]
+        for p in self.patches:
+            p.start()
+        self.cwd = os.getcwd()
+
+    def tearDown(self):
+        for p in self.patches:
+            p.stop()
+        self.directory.cleanup()
+
+    def artifacts(self, analysis_id):
+        analysis_dir = os.path.join(self.directory.name, 'pipeline', analysis_id)
+        names = sorted(os.listdir(analysis_dir))
+        # the folds, distances and trees are deterministic; the plots go through epstopdf, only their presence is compared
+        contents = {}
+        for name in names:
+            if name.endswith('.txt') or name in ('tree_wt.svg', 'tree_mut.svg'):
+                with open(os.path.join(analysis_dir, name)) as f:
+                    contents[name] = f.read()
+        return names, contents
+
+    def test_parallel_pairs_match_serial_pairs(self):
+        for i, (wild_sequence, mutant_sequence) in enumerate(PAIRS):
+            app.run_pipeline(mutant_sequence, wild_sequence, f'serial-{i}')
+
+        threads = [threading.Thread(target=app.run_pipeline, args=(mutant_sequence, wild_sequence, f'parallel-{i}'))
+                   for i, (wild_sequence, mutant_sequence) in enumerate(PAIRS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(os.getcwd(), self.cwd)
+        for i in range(len(PAIRS)):
+            names, contents = self.artifacts(f'parallel-{i}')
+            self.assertEqual((names, contents), self.artifacts(f'serial-{i}'))
+            self.assertIn('tree_wt.svg', names)
+            self.assertIn('wt-dotbracket.svg', names)
+            self.assertIn(call(f'parallel-{i}', 'completed'), self.db.update_table_pair.call_args_list)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+import time
+import threading
+import unittest
+
+from pipeline.dag import Node, run_dag, order_nodes
+
+
+class RunDagTests(unittest.TestCase):
+
+    def setUp(self):
+        self.lock = threading.Lock()
+        self.events = []
+
+    def node(self, name, depends=(), seconds=0.0, ok=True):
+        def run():
+            with self.lock:
+                self.events.append(('start', name))
+            time.sleep(seconds)
+            with self.lock:
+                self.events.append(('end', name))
+            return ok
+        return Node(name, list(depends), run)
+
+    def position(self, event):
+        return self.events.index(event)
+
+    def test_nodes_run_after_their_dependencies(self):
+        nodes = [
+            self.node('distance', ['fold-wt', 'fold-mut']),
+            self.node('pdist', seconds=0.2),
+            self.node('fold-wt', seconds=0.1),
+            self.node('fold-mut', seconds=0.1),
+            self.node('tree', ['distance'])
+        ]
+        self.assertEqual(run_dag(nodes, workers=4), [])
+        self.assertGreater(self.position(('start', 'distance')), self.position(('end', 'fold-wt')))
+        self.assertGreater(self.position(('start', 'distance')), self.position(('end', 'fold-mut')))
+        self.assertGreater(self.position(('start', 'tree')), self.position(('end', 'distance')))
+
+    def test_independent_nodes_run_in_parallel(self):
+        nodes = [self.node(name, seconds=0.3) for name in ('pdist', 'fold-wt', 'fold-mut')]
+        start = time.monotonic()
+        run_dag(nodes, workers=3)
+        self.assertLess(time.monotonic() - start, 0.6)
+
+    def test_failed_node_stops_its_dependants(self):
+        nodes = [
+            self.node('fold', ok=False),
+            self.node('plot', ['fold']),
+            self.node('pdist', seconds=0.1)
+        ]
+        self.assertEqual(run_dag(nodes, workers=2), ['fold'])
+        self.assertNotIn(('start', 'plot'), self.events)
+        self.assertIn(('end', 'pdist'), self.events)
+
+    def test_exception_is_raised_again(self):
+        def fail():
+            raise RuntimeError('cancelled')
+        with self.assertRaises(RuntimeError):
+            run_dag([Node('fold', [], fail), self.node('plot', ['fold'])])
+        self.assertEqual(self.events, [])
+
+    def test_check_stops_the_graph(self):
+        def check():
+            raise RuntimeError('cancelled')
+        with self.assertRaises(RuntimeError):
+            run_dag([self.node('fold', seconds=0.1), self.node('plot', ['fold'])], check=check)
+        self.assertNotIn(('start', 'plot'), self.events)
+
+    def test_invalid_graphs(self):
+        with self.assertRaises(ValueError):
+            order_nodes([self.node('a', ['b']), self.node('b', ['a'])])
+        with self.assertRaises(ValueError):
+            order_nodes([self.node('a', ['missing'])])
+
+
+if __name__ == '__main__':
+    unittest.main()
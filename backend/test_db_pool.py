@@ -0,0 +1,94 @@
+import os
+import sqlite3
+import tempfile
+import threading
+import unittest
+
+from db_pool import ConnectionPool, PoolTimeout
+
+
+class ConnectionPoolTests(unittest.TestCase):
+    """The pool on SQLite, standing in for MySQL."""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'pool.sqlite')
+        self.pool = ConnectionPool(self.connect, size=2, timeout=0.2)
+        conn = self.pool.get()
+        conn.execute("CREATE TABLE pair (id TEXT)")
+        conn.commit()
+        conn.close()
+
+    def tearDown(self):
+        self.pool.close_all()
+        self.directory.cleanup()
+
+    def connect(self):
+        return sqlite3.connect(self.path, check_same_thread=False)
+
+    def test_connections_are_reused(self):
+        for _ in range(5):
+            conn = self.pool.get()
+            conn.cursor().execute("SELECT 1")
+            conn.close()
+        stats = self.pool.stats()
+        self.assertEqual(stats['created'], 1)
+        self.assertEqual(stats['reused'], 5)
+        self.assertEqual((stats['open'], stats['borrowed'], stats['idle']), (1, 0, 1))
+
+    def test_pool_is_bounded(self):
+        first, second = self.pool.get(), self.pool.get()
+        with self.assertRaises(PoolTimeout):
+            self.pool.get()
+        first.close()
+        self.pool.get().close()
+        second.close()
+        self.assertEqual(self.pool.stats()['timeouts'], 1)
+
+    def test_waiting_borrower_gets_returned_connection(self):
+        pool = ConnectionPool(self.connect, size=1, timeout=5)
+        conn = pool.get()
+        borrowed = []
+        thread = threading.Thread(target=lambda: borrowed.append(pool.get()))
+        thread.start()
+        conn.close()
+        thread.join(5)
+        self.assertEqual(len(borrowed), 1)
+        self.assertEqual(pool.stats()['created'], 1)
+        borrowed[0].close()
+        pool.close_all()
+
+    def test_returned_connection_is_rolled_back(self):
+        conn = self.pool.get()
+        conn.execute("INSERT INTO pair VALUES ('a')")
+        conn.close()
+        conn = self.pool.get()
+        self.assertEqual(conn.execute("SELECT COUNT(*) FROM pair").fetchone()[0], 0)
+        conn.close()
+
+    def test_dead_connection_is_replaced(self):
+        pool = ConnectionPool(self.connect, size=1, ping_after=0)
+        conn = pool.get()
+        raw = conn._conn
+        conn.close()
+        raw.close()  # e.g. closed by the server after wait_timeout
+        conn = pool.get()
+        self.assertEqual(conn.execute("SELECT 1").fetchone()[0], 1)
+        conn.close()
+        self.assertEqual(pool.stats()['broken'], 1)
+        self.assertEqual(pool.stats()['open'], 1)
+        pool.close_all()
+
+    def test_dropped_connection_returns_to_the_pool(self):
+        def leak():
+            self.pool.get().cursor().execute("SELECT 1")
+
+        for _ in range(3):
+            leak()
+        stats = self.pool.stats()
+        self.assertEqual(stats['leaked'], 3)
+        self.assertEqual(stats['borrowed'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,175 @@
+import json
+import time
+import tempfile
+import threading
+import unittest
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from unittest.mock import patch
+from urllib.parse import urlparse, parse_qs
+
+import app
+import dbsnp
+from pipeline.cache import TieredCache
+
+# 101 nt around the SNP, the reference allele 'G' at index 50
+SEQUENCE = 'A' * 50 + 'G' + 'C' * 50
+SNPS = {'rs328': ['rs328', 'G/T', '8', '1000']}
+SNPS.update({f'rs{i}': [f'rs{i}', 'G/A', '17', str(i * 1000)] for i in range(1000, 1120)})
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Answers like clinicaltables and Ensembl; failures lists status codes to send first."""
+
+    requests = []
+    failures = []
+    lock = threading.Lock()
+    running = 0
+    max_running = 0
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        StubHandler.requests.append(url.path)
+        with StubHandler.lock:
+            StubHandler.running += 1
+            StubHandler.max_running = max(StubHandler.max_running, StubHandler.running)
+        time.sleep(0.005)
+        with StubHandler.lock:
+            StubHandler.running -= 1
+        if StubHandler.failures:
+            self.send_response(StubHandler.failures.pop(0))
+            self.end_headers()
+            return
+        if url.path == '/search':
+            snp_id = parse_qs(url.query)['terms'][0]
+            body = [1 if snp_id in SNPS else 0, [snp_id], None, [SNPS[snp_id]] if snp_id in SNPS else []]
+        elif url.path.startswith('/sequence/region/human/'):
+            body = {'id': url.path.rsplit('/', 1)[1], 'seq': SEQUENCE}
+        else:
+            self.send_response(404)
+            self.end_headers()
+            return
+        data = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        regions = json.loads(self.rfile.read(int(self.headers['Content-Length'])))['regions']
+        StubHandler.requests.append(('POST', len(regions)))
+        data = json.dumps([{'query': region, 'id': region, 'seq': SEQUENCE} for region in regions]).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class DbSnpClientTests(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.url = f"http://127.0.0.1:{cls.server.server_port}"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        StubHandler.requests = []
+        StubHandler.failures = []
+        StubHandler.max_running = 0
+        self.directory = tempfile.TemporaryDirectory()
+        self.patches = [
+            patch.object(dbsnp, 'DBSNP_URL', f"{self.url}/search"),
+            patch.object(dbsnp, 'ENSEMBL_URL', self.url),
+            patch.object(dbsnp, 'HTTP_BACKOFF', 0),
+            patch.object(dbsnp, '_session', None),
+            patch.object(dbsnp, '_caches', self.caches())
+        ]
+        for p in self.patches:
+            p.start()
+
+    def tearDown(self):
+        for p in self.patches:
+            p.stop()
+        self.directory.cleanup()
+
+    def caches(self, ttl=3600):
+        return (TieredCache(f"{self.directory.name}/locus", ttl=ttl),
+                TieredCache(f"{self.directory.name}/sequence", ttl=ttl))
+
+    def test_sequences_around_the_snp(self):
+        result, code = dbsnp.snp_sequences('rs328')
+        self.assertEqual(code, 200)
+        self.assertEqual(result['wildType'], SEQUENCE)
+        self.assertEqual(result['mutantType'][50], 'T')
+        self.assertEqual(StubHandler.requests, ['/search', '/sequence/region/human/8:951..1051'])
+
+    def test_lookups_are_cached_on_disk(self):
+        dbsnp.snp_sequences('rs328')
+        dbsnp.snp_sequences('rs328')
+        self.assertEqual(len(StubHandler.requests), 2)
+        # a new process reads the disk tier
+        with patch.object(dbsnp, '_caches', self.caches()):
+            self.assertEqual(dbsnp.snp_sequences('rs328')[1], 200)
+        self.assertEqual(len(StubHandler.requests), 2)
+
+    def test_expired_entries_are_fetched_again(self):
+        with patch.object(dbsnp, '_caches', self.caches(ttl=-1)):
+            dbsnp.snp_sequences('rs328')
+            dbsnp.snp_sequences('rs328')
+        self.assertEqual(len(StubHandler.requests), 4)
+
+    def test_server_errors_are_retried(self):
+        StubHandler.failures = [503, 502]
+        self.assertEqual(dbsnp.snp_sequences('rs328')[1], 200)
+        self.assertEqual(StubHandler.requests[:3], ['/search'] * 3)
+
+    def test_unknown_snp_is_not_cached(self):
+        self.assertEqual(dbsnp.snp_sequences('rs1')[1], 404)
+        self.assertEqual(dbsnp.snp_sequences('rs1')[1], 404)
+        self.assertEqual(StubHandler.requests, ['/search', '/search'])
+
+    def test_unreachable_service(self):
+        with patch.object(dbsnp, 'DBSNP_URL', 'http://127.0.0.1:1/search'), patch.object(dbsnp, 'HTTP_RETRIES', 0):
+            result, code = dbsnp.snp_sequences('rs328')
+        self.assertEqual(code, 500)
+        self.assertIn('details', result)
+
+    def test_batch_merges_the_sequence_fetches(self):
+        snp_ids = [f'rs{i}' for i in range(1000, 1120)] + ['rs1', 'rs1000']
+        results = dbsnp.batch_snp_sequences(snp_ids, workers=4)
+
+        self.assertEqual([result['id'] for result in results], snp_ids[:-1])
+        self.assertTrue(all(result['status'] == 200 and result['mutantType'][50] == 'A' for result in results[:-1]))
+        self.assertEqual(results[-1]['status'], 404)
+        self.assertIn('error', results[-1])
+        self.assertEqual([request for request in StubHandler.requests if isinstance(request, tuple)],
+                         [('POST', 50), ('POST', 50), ('POST', 20)])
+        self.assertLessEqual(StubHandler.max_running, 4)
+
+        # a second batch is answered from the caches
+        count = len(StubHandler.requests)
+        self.assertEqual(dbsnp.batch_snp_sequences(snp_ids[:10]), results[:10])
+        self.assertEqual(len(StubHandler.requests), count)
+
+    def test_batch_endpoint_validation(self):
+        client = app.app.test_client()
+        self.assertEqual(client.post('/api/dbsnp/batch', json={'ids': []}).status_code, 400)
+        self.assertEqual(client.post('/api/dbsnp/batch', json={'ids': 'rs328'}).status_code, 400)
+        self.assertEqual(client.post('/api/dbsnp/batch', json={'ids': ['rs1'] * 201}).status_code, 400)
+        response = client.post('/api/dbsnp/batch', json={'ids': ['rs328']})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()['results'][0]['wildType'], SEQUENCE)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,204 @@
+import os
+import shutil
+import unittest
+from unittest.mock import patch
+
+from pipeline.engine import RNA, ViennaEngine, get_engine, CliEngine, CliPipeEngine, CliBatchEngine
+from pipeline.script import process_mutation
+
+PIPELINE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'pipeline')
+
+
+def read_sequence(directory, filename):
+    with open(os.path.join(PIPELINE_DIR, directory, filename)) as f:
+        return f.readline().strip()
+
+
+def read_structure(directory, filename):
+    with open(os.path.join(PIPELINE_DIR, directory, filename)) as f:
+        return f.read().splitlines()[1].split()[0]
+
+
+@unittest.skipIf(RNA is None, "ViennaRNA Python bindings are not installed")
+class ViennaEngineTests(unittest.TestCase):
+
+    def setUp(self):
+        self.engine = ViennaEngine()
+
+    def test_pdist_matches_rnapdist(self):
+        """RNApdist computed in-process matches testseq/RNApdist-result.txt."""
+        wt_fold = self.engine.fold(read_sequence('testseq', 'wt.txt'))
+        mut_fold = self.engine.fold(read_sequence('testseq', 'mut.txt'))
+        with open(os.path.join(PIPELINE_DIR, 'testseq', 'RNApdist-result.txt')) as f:
+            expected = float(f.read())
+        self.assertEqual(self.engine.pdist(wt_fold, mut_fold), expected)
+
+    def test_fold_matches_rnafold(self):
+        """MFE structure matches testseq/wt-dotbracket.txt."""
+        wt_fold = self.engine.fold(read_sequence('testseq', 'wt.txt'))
+        self.assertEqual(wt_fold['structure'], read_structure('testseq', 'wt-dotbracket.txt'))
+
+    def test_tree_distance_matches_rnadistance(self):
+        """RNAdistance (f) matches vegfa-3utr/RNAdistance-result.txt."""
+        distance = self.engine.tree_distance(
+            read_structure('vegfa-3utr', 'wt-dotbracket.txt'),
+            read_structure('vegfa-3utr', 'mut-dotbracket.txt')
+        )
+        self.assertEqual(distance, 73.0)
+
+    def test_evaluate_reuses_wild_fold(self):
+        """
+        Mutants evaluated against one shared wild-type fold match a recomputation folding both
+        sequences from scratch for every mutant, through the RNAfold/RNApdist code path of the
+        bindings (fold, pf_fold and Make_bp_profile) instead of the engine.
+        """
+        def recompute(sequence):
+            structure, _ = RNA.fold(sequence)
+            RNA.pf_fold(sequence)
+            return structure, RNA.Make_bp_profile(len(sequence))
+
+        wild_sequence = read_sequence('testseq', 'wt.txt').upper().replace('T', 'U')[:150]
+        wild_fold = self.engine.fold_wild_type(wild_sequence)
+        for position in (3, 10, 20, 75, 140):
+            mutation = wild_sequence[:position] + ('A' if wild_sequence[position] != 'A' else 'C') + wild_sequence[position + 1:]
+            shared = self.engine.evaluate('key', mutation, wild_fold)
+
+            wild_structure, wild_profile = recompute(wild_sequence)
+            mut_structure, mut_profile = recompute(mutation)
+            pdist = RNA.profile_edit_distance(wild_profile, mut_profile)
+            distance = RNA.tree_edit_distance(RNA.make_tree(RNA.expand_Full(wild_structure)),
+                                              RNA.make_tree(RNA.expand_Full(mut_structure)))
+            # the legacy profiles are single precision, the engine keeps doubles
+            self.assertAlmostEqual(shared['RNApdist'], pdist, delta=1e-4 * max(1.0, pdist))
+            self.assertEqual(shared['RNAdistance(f)'], distance)
+
+    def test_process_mutation(self):
+        wild_sequence = 'AUGCUAGCUAGCUA'
+        result = process_mutation('A_1_C', 'CUGCUAGCUAGCUA', PIPELINE_DIR, None, wild_sequence, self.engine)
+        self.assertEqual(result['Mutation'], 'A_1_C')
+        self.assertIsInstance(result['RNApdist'], float)
+        self.assertIsInstance(result['RNAdistance(f)'], float)
+
+
+def read_file(directory, filename):
+    with open(os.path.join(PIPELINE_DIR, directory, filename)) as f:
+        return f.read()
+
+
+def mutants(sequence, positions):
+    return [(f"{sequence[i]}_{i + 1}_{'A' if sequence[i] != 'A' else 'C'}",
+             sequence[:i] + ('A' if sequence[i] != 'A' else 'C') + sequence[i + 1:]) for i in positions]
+
+
+class CliOutputParsingTests(unittest.TestCase):
+    """
+    The cli engines on the outputs the RNA* tools printed for the testseq fixtures,
+    run_tool answers instead of the tools.
+    """
+
+    def setUp(self):
+        self.wild = read_sequence('testseq', 'wt.txt')
+        self.mutant = read_sequence('testseq', 'mut.txt')
+        self.outputs = {
+            self.wild: read_file('testseq', 'wt-dotbracket.txt'),
+            self.mutant: read_file('testseq', 'mut-dotbracket.txt')
+        }
+        self.calls = []
+
+    def run_tool(self, args, input):
+        self.calls.append(args[0])
+        records = input.split()
+        if args[0] == 'RNAfold':
+            return ''.join(self.outputs[record] for record in records)
+        if args[0] == 'RNApdist':
+            return read_file('testseq', 'RNApdist-result.txt') * (len(records) - 1)
+        if args[0] == 'RNAdistance':
+            return 'f: 73\n' * (len(records) - 1)
+        raise AssertionError(f"unexpected tool {args[0]}")
+
+    def test_pipe_engine(self):
+        engine = CliPipeEngine(PIPELINE_DIR)
+        with patch('pipeline.engine.run_tool', self.run_tool):
+            wild_fold = engine.fold_wild_type(self.wild)
+            result = engine.evaluate('key', self.mutant, wild_fold)
+        self.assertEqual(wild_fold['dotbracket'], self.outputs[self.wild])
+        self.assertEqual(result, {'Mutation': 'key', 'RNApdist': 182.865, 'RNAdistance(f)': 73.0, 'Z-score': None})
+
+    def test_batch_engine(self):
+        engine = CliBatchEngine(PIPELINE_DIR)
+        with patch('pipeline.engine.run_tool', self.run_tool):
+            wild_fold = engine.fold_wild_type(self.wild)
+            self.calls = []
+            results = engine.evaluate_batch([('a', self.mutant), ('b', self.mutant), ('c', self.mutant)], wild_fold)
+        # one process per tool for the whole batch
+        self.assertEqual(self.calls, ['RNApdist', 'RNAfold', 'RNAdistance'])
+        self.assertEqual([result['Mutation'] for result in results], ['a', 'b', 'c'])
+        self.assertTrue(all(result['RNApdist'] == 182.865 and result['RNAdistance(f)'] == 73.0 for result in results))
+
+    def test_batch_engine_falls_back_on_short_output(self):
+        engine = CliBatchEngine(PIPELINE_DIR)
+        run_tool = self.run_tool
+
+        def truncated(args, input):
+            output = run_tool(args, input)
+            return output.splitlines(keepends=True)[0] if '--compare=f' in args and args[0] == 'RNApdist' else output
+
+        with patch('pipeline.engine.run_tool', truncated):
+            wild_fold = engine.fold_wild_type(self.wild)
+            results = engine.evaluate_batch([('a', self.mutant), ('b', self.mutant)], wild_fold)
+        self.assertEqual([result['RNApdist'] for result in results], [182.865, 182.865])
+        self.assertEqual(self.calls.count('RNApdist'), 3)
+
+
+@unittest.skipIf(RNA is None or not all(shutil.which(tool) for tool in ('RNAfold', 'RNApdist', 'RNAdistance')),
+                 "ViennaRNA Python bindings or RNA* tools are not installed")
+class CliEngineEquivalenceTests(unittest.TestCase):
+    """The cli-pipe and cli-batch engines give the results of the in-process engine."""
+
+    def setUp(self):
+        self.vienna = ViennaEngine()
+        self.wild = read_sequence('testseq', 'wt.txt')[:150]
+        self.items = mutants(self.wild, (3, 10, 20, 75, 140))
+
+    def assertSameResults(self, results, expected):
+        for result, reference in zip(results, expected):
+            self.assertEqual(result['Mutation'], reference['Mutation'])
+            self.assertAlmostEqual(result['RNApdist'], reference['RNApdist'], delta=1e-4 * max(1.0, reference['RNApdist']))
+            self.assertEqual(result['RNAdistance(f)'], reference['RNAdistance(f)'])
+        self.assertEqual(len(results), len(expected))
+
+    def test_fixture_pair(self):
+        engine = CliPipeEngine(PIPELINE_DIR)
+        result = engine.evaluate('key', read_sequence('testseq', 'mut.txt'), engine.fold_wild_type(read_sequence('testseq', 'wt.txt')))
+        with open(os.path.join(PIPELINE_DIR, 'testseq', 'RNApdist-result.txt')) as f:
+            self.assertEqual(result['RNApdist'], float(f.read()))
+
+    def test_pipe_engine_matches_vienna(self):
+        engine = CliPipeEngine(PIPELINE_DIR)
+        files = set(os.listdir('.'))
+        wild_fold = engine.fold_wild_type(self.wild)
+        vienna_fold = self.vienna.fold_wild_type(self.wild)
+        self.assertSameResults([engine.evaluate(key, mutation, wild_fold) for key, mutation in self.items],
+                               [self.vienna.evaluate(key, mutation, vienna_fold) for key, mutation in self.items])
+        # the dot plots of RNApdist are not left in the working directory
+        self.assertEqual(set(os.listdir('.')), files)
+
+    def test_batch_engine_matches_vienna(self):
+        engine = CliBatchEngine(PIPELINE_DIR)
+        vienna_fold = self.vienna.fold_wild_type(self.wild)
+        self.assertSameResults(engine.evaluate_batch(self.items, engine.fold_wild_type(self.wild)),
+                               [self.vienna.evaluate(key, mutation, vienna_fold) for key, mutation in self.items])
+
+
+class GetEngineTests(unittest.TestCase):
+
+    def test_cli_engine(self):
+        self.assertIsInstance(get_engine('cli'), CliEngine)
+
+    def test_unknown_engine(self):
+        with self.assertRaises(ValueError):
+            get_engine('unknown')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,201 @@
+import os
+import time
+import sqlite3
+import tempfile
+import threading
+import unittest
+
+from jobs import JobQueue, QueueFull, JobStore, DurableJobQueue, JobCancelled, current_job
+from migrations import migrate, MIGRATIONS
+from pipeline.engine import run_process
+
+
+class JobQueueTests(unittest.TestCase):
+
+    def setUp(self):
+        self.errors = []
+        self.release = threading.Event()
+        handlers = {'wait': self.release.wait, 'fail': lambda: 1 / 0}
+        self.queue = JobQueue(handlers, workers=1, max_pending=2,
+                              on_error=lambda analysis_id, e: self.errors.append(analysis_id))
+
+    def tearDown(self):
+        self.release.set()
+        self.queue.shutdown()
+
+    def test_runs_jobs_in_background(self):
+        future = self.queue.submit('a', 'wait')
+        self.assertIn(self.queue.state('a'), ('queued', 'running'))
+        self.release.set()
+        future.result(timeout=5)
+        self.assertIsNone(self.queue.state('a'))
+        self.assertEqual(self.queue.stats()['finished'], 1)
+
+    def test_queue_is_bounded(self):
+        self.queue.submit('a', 'wait')
+        self.queue.submit('b', 'wait')
+        with self.assertRaises(QueueFull):
+            self.queue.submit('c', 'wait')
+
+    def test_failed_job_calls_on_error(self):
+        future = self.queue.submit('a', 'fail')
+        future.result(timeout=5)
+        self.assertEqual(self.errors, ['a'])
+        self.assertEqual(self.queue.stats()['failed'], 1)
+
+
+class JobCancellationTests(unittest.TestCase):
+
+    def setUp(self):
+        self.errors = []
+        self.started = threading.Event()
+        self.queue = JobQueue({'sleep': self.sleep}, workers=1,
+                              on_error=lambda analysis_id, e: self.errors.append(e), timeout=0)
+
+    def tearDown(self):
+        self.queue.shutdown()
+
+    def sleep(self):
+        self.started.set()
+        run_process('sleep 30 & sleep 30', shell=True, timeout=0, groups=current_job().process_groups)
+        current_job().check()
+
+    def test_cancel_kills_running_job(self):
+        future = self.queue.submit('a', 'sleep')
+        self.assertTrue(self.started.wait(5))
+        start = time.monotonic()
+        self.assertTrue(self.queue.cancel('a'))
+        future.result(timeout=5)
+        self.assertLess(time.monotonic() - start, 2)
+        self.assertIsInstance(self.errors[0], JobCancelled)
+        self.assertEqual(self.queue.stats()['cancelled'], 1)
+
+    def test_cancel_queued_job_frees_slot(self):
+        self.queue.submit('a', 'sleep')
+        self.queue.submit('b', 'sleep')
+        self.assertTrue(self.queue.cancel('b'))
+        self.assertIsNone(self.queue.state('b'))
+        self.queue.cancel('a')
+
+    def test_timeout_cancels_job(self):
+        queue = JobQueue({'sleep': self.sleep}, workers=1,
+                         on_error=lambda analysis_id, e: self.errors.append(e), timeout=0.5)
+        queue.submit('a', 'sleep').result(timeout=5)
+        queue.shutdown()
+        self.assertEqual(self.errors[0].reason, 'timed out')
+
+
+class JobStoreTests(unittest.TestCase):
+    """The durable queue on SQLite, standing in for the MySQL job table."""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        path = os.path.join(self.directory.name, 'jobs.sqlite')
+        self.connect = lambda: sqlite3.connect(path, timeout=10)
+        self.store = JobStore(self.connect, 'sqlite')
+        migrate(self.connect, self.job_migrations(), dialect='sqlite')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    @staticmethod
+    def job_migrations():
+        return [migration for migration in MIGRATIONS if migration[0] == '004-job']
+
+    def test_claim_takes_oldest_job_once(self):
+        self.store.enqueue('a', 'pair', ['AUGC', 'AUGG', 'a'])
+        self.store.enqueue('b', 'single', ['AUGC', 'b'])
+        self.assertEqual(self.store.claim('worker-1'), ('a', 'pair', ['AUGC', 'AUGG', 'a']))
+        self.assertEqual(self.store.claim('worker-2')[0], 'b')
+        self.assertIsNone(self.store.claim('worker-3'))
+        self.assertEqual(self.store.counts(), {'running': 2})
+
+    def test_schema_has_the_claim_index(self):
+        self.assertEqual(migrate(self.connect, self.job_migrations(), dialect='sqlite'), [])
+        indexes = self.store.execute("SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'job'", fetch=True)
+        self.assertIn(('job_status_created',), indexes)
+
+    def test_pending_cost(self):
+        self.store.enqueue('a', 'pair', [], 2.5)
+        self.store.enqueue('b', 'single', [], 4.0)
+        self.store.claim('worker-1')
+        self.assertEqual(self.store.pending_cost(), 6.5)
+        self.store.finish('a', 'worker-1', 'finished')
+        self.assertEqual(self.store.pending_cost(), 4.0)
+
+    def test_concurrent_claims_never_share_a_job(self):
+        for i in range(20):
+            self.store.enqueue(str(i), 'single', [])
+        claimed = []
+
+        def claim_all(worker_id):
+            while (job := self.store.claim(worker_id)) is not None:
+                claimed.append(job[0])
+
+        threads = [threading.Thread(target=claim_all, args=(f'worker-{i}',)) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(sorted(claimed, key=int), [str(i) for i in range(20)])
+
+    def test_stale_job_is_requeued_then_failed(self):
+        self.store.enqueue('a', 'single', [])
+        self.store.claim('dead-worker')
+        self.assertEqual(self.store.requeue_stale(stale_after=-1, max_attempts=2), [])
+        self.assertEqual(self.store.state('a'), 'queued')
+
+        self.store.claim('other-worker')
+        # the first worker cannot finish a job given to another one
+        self.assertEqual(self.store.finish('a', 'dead-worker', 'finished'), 0)
+        self.assertEqual(self.store.requeue_stale(stale_after=-1, max_attempts=2), ['a'])
+        self.assertEqual(self.store.state('a'), 'failed')
+
+    def test_request_cancel(self):
+        self.store.enqueue('a', 'single', [])
+        self.store.enqueue('b', 'single', [])
+        self.assertEqual(self.store.request_cancel('a'), 'cancelled')
+        self.store.claim('worker-1')
+        self.assertEqual(self.store.request_cancel('b'), 'cancelling')
+        self.assertEqual(self.store.cancel_requested('worker-1'), ['b'])
+        self.store.finish('b', 'worker-1', 'cancelled')
+        self.assertEqual(self.store.request_cancel('b'), None)
+
+    def test_cancelling_jobs_count_against_the_bound(self):
+        queue = DurableJobQueue(self.store, {}, max_pending=2)
+        queue.submit('a', 'single')
+        queue.submit('b', 'single')
+        self.store.claim('worker-1')
+        self.store.request_cancel('a')
+        self.store.request_cancel('b')
+        # 'a' still holds its worker, 'b' was cancelled before it started
+        self.assertEqual(self.store.counts(), {'cancelling': 1, 'cancelled': 1})
+        queue.submit('c', 'single')
+        with self.assertRaises(QueueFull):
+            queue.submit('d', 'single')
+
+    def test_durable_queue_runs_jobs(self):
+        done = threading.Event()
+        results = []
+
+        def handler(*args):
+            results.append(args)
+            done.set()
+
+        queue = DurableJobQueue(self.store, {'single': handler}, workers=2, poll_interval=0.05)
+        queue.start()
+        try:
+            queue.submit('a', 'single', 'AUGC', 'a')
+            self.assertTrue(done.wait(5))
+            deadline = time.monotonic() + 5
+            while self.store.state('a') != 'finished' and time.monotonic() < deadline:
+                time.sleep(0.05)
+        finally:
+            queue.shutdown()
+        self.assertEqual(results, [('AUGC', 'a')])
+        self.assertEqual(self.store.state('a'), 'finished')
+        self.assertIsNone(queue.state('a'))
+
+
+if __name__ == '__main__':
+    unittest.main()
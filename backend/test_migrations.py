@@ -0,0 +1,89 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+
+from migrations import migrate, migrate_when_ready, MIGRATIONS, RESULT_TABLES
+
+
+class MigrationTests(unittest.TestCase):
+    """The migration runner on SQLite, standing in for MySQL."""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        path = os.path.join(self.directory.name, 'schema.sqlite')
+        self.connect = lambda: sqlite3.connect(path)
+        self.migrations = [
+            ('001-pair', ["CREATE TABLE pair (id TEXT PRIMARY KEY)"]),
+            ('002-pair-status', ["ALTER TABLE pair ADD COLUMN processing_status TEXT"])
+        ]
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_migrations_are_applied_once_in_order(self):
+        self.assertEqual(migrate(self.connect, self.migrations[:1], dialect='sqlite'), ['001-pair'])
+        self.assertEqual(migrate(self.connect, self.migrations, dialect='sqlite'), ['002-pair-status'])
+        self.assertEqual(migrate(self.connect, self.migrations, dialect='sqlite'), [])
+        conn = self.connect()
+        conn.execute("INSERT INTO pair (id, processing_status) VALUES ('a', 'completed')")
+        conn.close()
+
+    def test_failed_migration_is_not_recorded(self):
+        broken = self.migrations + [('003-broken', ["ALTER TABLE missing ADD COLUMN x TEXT"])]
+        with self.assertRaises(sqlite3.OperationalError):
+            migrate(self.connect, broken, dialect='sqlite')
+        conn = self.connect()
+        applied = [row[0] for row in conn.execute("SELECT id FROM schema_migrations ORDER BY id")]
+        conn.close()
+        self.assertEqual(applied, ['001-pair', '002-pair-status'])
+
+    def result_tables(self):
+        conn = self.connect()
+        for table in RESULT_TABLES:
+            conn.execute(f"CREATE TABLE {table} (id INTEGER PRIMARY KEY, task_id TEXT, created_at INTEGER)")
+            conn.executemany(f"INSERT INTO {table} (id, task_id, created_at) VALUES (?, ?, ?)",
+                             [(1, 'a', 1), (2, 'a', 2), (3, 'b', 1), (4, 'a', 2)])
+        conn.execute("CREATE TABLE top_10 (wild_type_seq_id TEXT, rank_snp INTEGER)")
+        conn.commit()
+        conn.close()
+
+    def test_result_tables_get_unique_task_id(self):
+        self.result_tables()
+        migrate(self.connect, MIGRATIONS[:2], dialect='sqlite')
+        conn = self.connect()
+        for table in RESULT_TABLES:
+            self.assertEqual([row[0] for row in conn.execute(f"SELECT id FROM {table} ORDER BY id")], [3, 4])
+            # the deleted duplicates are kept aside
+            self.assertEqual([row[0] for row in conn.execute(f"SELECT id FROM {table}_duplicates ORDER BY id")], [1, 2])
+            with self.assertRaises(sqlite3.IntegrityError):
+                conn.execute(f"INSERT INTO {table} (id, task_id, created_at) VALUES (5, 'b', 3)")
+        conn.close()
+
+    def test_steps_can_run_again_after_a_failure(self):
+        self.result_tables()
+        conn = self.connect()
+        # index left by an earlier run stopped after the first table
+        conn.execute("CREATE UNIQUE INDEX rna_pdist_result_task_id ON rna_pdist_result (id)")
+        conn.commit()
+        conn.close()
+        # a first run failing on top_10 leaves the result tables migrated but the migration unrecorded
+        failing = [(MIGRATIONS[0][0], MIGRATIONS[0][1] + ["ALTER TABLE missing ADD COLUMN x TEXT"])]
+        with self.assertRaises(sqlite3.OperationalError):
+            migrate(self.connect, failing, dialect='sqlite')
+        self.assertEqual(migrate(self.connect, MIGRATIONS[:2], dialect='sqlite'), [m[0] for m in MIGRATIONS[:2]])
+        self.assertEqual(migrate(self.connect, MIGRATIONS[:2], dialect='sqlite'), [])
+
+    def test_migrate_when_ready_gives_up(self):
+        attempts = []
+
+        def connect():
+            attempts.append(1)
+            return None
+
+        with self.assertRaises(RuntimeError):
+            migrate_when_ready(connect, attempts=3, interval=0)
+        self.assertEqual(len(attempts), 3)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+import os
+import gzip
+import json
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch, MagicMock
+
+import app
+from pipeline.precompress import precompress, load_manifest, MANIFEST_SUFFIX
+
+SVG = '<svg xmlns="http://www.w3.org/2000/svg">' + '<circle cx="1" cy="1" r="1"/>' * 500 + '</svg>'
+
+
+class PrecompressTests(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'wt-dotbracket.svg')
+        with open(self.path, 'w') as f:
+            f.write(SVG)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_variants_and_manifest(self):
+        manifest = precompress(self.path)
+        with open(self.path + '.gz', 'rb') as f:
+            self.assertEqual(gzip.decompress(f.read()).decode(), SVG)
+        self.assertLess(manifest['encodings']['gzip']['size'], manifest['size'])
+        with open(self.path + MANIFEST_SUFFIX) as f:
+            self.assertEqual(json.load(f), manifest)
+        # the same picture gives the same hashes
+        self.assertEqual(precompress(self.path), manifest)
+
+    def test_manifest_of_a_picture_drawn_before_precompression(self):
+        self.assertFalse(os.path.exists(self.path + MANIFEST_SUFFIX))
+        manifest = load_manifest(self.path)
+        self.assertTrue(os.path.exists(self.path + '.gz'))
+        self.assertEqual(load_manifest(self.path), manifest)
+
+
+class SvgEndpointTests(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'wt-dotbracket.svg')
+        with open(self.path, 'w') as f:
+            f.write(SVG)
+        self.db = MagicMock()
+        self.db.extract_mut_or_wt_dotbracket_svg_from_database.return_value = self.path
+        self.patches = [patch.object(app, 'db_func', self.db),
+                        patch.object(app, 'svg_cache', app.TieredCache(None, max_bytes=0))]
+        for p in self.patches:
+            p.start()
+        self.client = app.app.test_client()
+
+    def tearDown(self):
+        for p in self.patches:
+            p.stop()
+        self.directory.cleanup()
+
+    def get(self, **headers):
+        return self.client.get('/api/results/pair/pair-1/rna-plot-wt', headers=headers)
+
+    def test_encoding_negotiation(self):
+        plain = self.get()
+        self.assertEqual(plain.status_code, 200)
+        self.assertIsNone(plain.headers.get('Content-Encoding'))
+        self.assertEqual(plain.data.decode(), SVG)
+        self.assertIn('Accept-Encoding', plain.headers['Vary'])
+        self.assertIn('max-age', plain.headers['Cache-Control'])
+
+        gzipped = self.get(**{'Accept-Encoding': 'gzip, deflate'})
+        self.assertEqual(gzipped.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(gzipped.data).decode(), SVG)
+        self.assertNotEqual(gzipped.headers['ETag'], plain.headers['ETag'])
+        self.assertFalse(gzipped.headers['ETag'].startswith('W/'))
+
+    def test_conditional_get_and_path_cache(self):
+        first = self.get(**{'Accept-Encoding': 'gzip'})
+        second = self.get(**{'Accept-Encoding': 'gzip', 'If-None-Match': first.headers['ETag']})
+        self.assertEqual(second.status_code, 304)
+        self.assertEqual(self.db.extract_mut_or_wt_dotbracket_svg_from_database.call_count, 1)
+
+    def test_saving_the_pictures_precompresses_them(self):
+        shutil.copy(self.path, os.path.join(self.directory.name, 'mut-dotbracket.svg'))
+        self.db.save_pair_results.return_value = ({}, 201)
+        self.assertEqual(app.save_plot_result('pair-1', self.directory.name), 'completed')
+        self.assertTrue(os.path.exists(self.path + '.gz'))
+        self.assertTrue(os.path.exists(os.path.join(self.directory.name, 'mut-dotbracket.svg.gz')))
+
+
+if __name__ == '__main__':
+    unittest.main()
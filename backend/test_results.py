@@ -0,0 +1,91 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch, MagicMock
+
+import app
+
+CSV = 'no,Mutation,RNApdist,RNAdistance(f),Z-score\n1,A_1_C,1.0,2.0,3.0\n'
+
+
+class SingleResultsTests(unittest.TestCase):
+    """Conditional GET of /api/results/single/<id>, with the database replaced by a mock."""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        analysis_dir = os.path.join(self.directory.name, 'pipeline', 'single-1')
+        os.makedirs(analysis_dir)
+        with open(os.path.join(analysis_dir, 'ten_best_results.csv'), 'w') as f:
+            f.write(CSV)
+        self.db = MagicMock()
+        self.db.read_sequences_from_database_top_10.return_value = (
+            {'wild_type_sequence': 'AUGC', 'mutant_sequences': {'1': 'CUGC'}}, 201)
+        self.status('completed')
+        self.patches = [
+            patch.object(app, 'BASE_DIR', self.directory.name),
+            patch.object(app, 'db_func', self.db),
+            patch.object(app, 'results_cache', app.TieredCache(None, max_bytes=0))
+        ]
+        for p in self.patches:
+            p.start()
+        self.client = app.app.test_client()
+
+    def tearDown(self):
+        for p in self.patches:
+            p.stop()
+        self.directory.cleanup()
+
+    def status(self, processing_status):
+        self.db.read_processing_status.return_value = ({'type': 'single', 'processing_status': processing_status}, 200)
+
+    def get(self, **headers):
+        return self.client.get('/api/results/single/single-1', headers=headers)
+
+    def test_if_none_match(self):
+        first = self.get()
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(first.get_json()['wt_sequence'], 'AUGC')
+        self.assertEqual(first.headers['Cache-Control'], 'no-cache')
+
+        second = self.get(**{'If-None-Match': first.headers['ETag']})
+        self.assertEqual(second.status_code, 304)
+        self.assertEqual(second.data, b'')
+        self.assertEqual(self.get(**{'If-None-Match': '"other"'}).status_code, 200)
+
+    def test_if_modified_since(self):
+        first = self.get()
+        last_modified = first.headers['Last-Modified']
+        self.assertEqual(self.get(**{'If-Modified-Since': last_modified}).status_code, 304)
+        self.assertEqual(self.get(**{'If-Modified-Since': 'Mon, 01 Jan 2001 00:00:00 GMT'}).status_code, 200)
+
+    def test_completed_results_are_served_from_memory(self):
+        self.get()
+        self.get()
+        self.assertEqual(self.db.read_sequences_from_database_top_10.call_count, 1)
+        self.assertEqual(self.db.read_processing_status.call_count, 1)
+
+    def test_polls_of_a_running_scan(self):
+        self.status('in_progress')
+        first = self.get()
+        self.assertEqual(first.status_code, 200)
+        # the sequences may still change without the CSV, only the ETag validates the response
+        self.assertNotIn('Last-Modified', first.headers)
+
+        with patch.object(app.pd, 'read_csv') as read_csv:
+            second = self.get(**{'If-None-Match': first.headers['ETag']})
+        self.assertEqual(second.status_code, 304)
+        read_csv.assert_not_called()
+        self.assertEqual(self.db.read_sequences_from_database_top_10.call_count, 1)
+
+        # the end of the scan changes the ETag
+        self.status('completed')
+        third = self.get(**{'If-None-Match': first.headers['ETag']})
+        self.assertEqual(third.status_code, 200)
+        self.assertNotEqual(third.headers['ETag'], first.headers['ETag'])
+
+    def test_missing_results(self):
+        self.assertEqual(self.client.get('/api/results/single/other').status_code, 404)
+
+
+if __name__ == '__main__':
+    unittest.main()
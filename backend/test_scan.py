@@ -0,0 +1,100 @@
+import os
+import time
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from pipeline.engine import RNA, get_engine
+from pipeline.cache import FoldCache
+from pipeline.scan import scan_mutations, run_in_worker
+from pipeline.script import generate_mutations, process_mutation, fold_wild_type, save_top_10_artifacts
+
+PIPELINE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'pipeline')
+
+
+@unittest.skipIf(RNA is None, "ViennaRNA Python bindings are not installed")
+class ScanTests(unittest.TestCase):
+
+    def setUp(self):
+        self.wild_sequence = 'AAAUGCCCUAGCUAGGGAAACCCUUAGC'
+        self.engine = get_engine('vienna')
+        self.wild_fold = self.engine.fold_wild_type(self.wild_sequence)
+        self.expected = {
+            key: process_mutation(key, mutation, PIPELINE_DIR, None, self.wild_sequence, self.engine, self.wild_fold)
+            for key, mutation in generate_mutations(self.wild_sequence)
+        }
+
+    def scan(self, executor, engine=None, wild_fold=None):
+        results = scan_mutations(generate_mutations(self.wild_sequence), engine or self.engine, wild_fold or self.wild_fold,
+                                 PIPELINE_DIR, None, executor=executor, workers=2, chunk_size=5)
+        return {result['Mutation']: result for result in results}
+
+    def test_process_scan_matches_process_mutation(self):
+        """Every mutation key gets a result, duplicated sequences included."""
+        self.assertEqual(self.scan('process'), self.expected)
+
+    @unittest.skipIf(not all(shutil.which(tool) for tool in ('RNAfold', 'RNApdist', 'RNAdistance')),
+                     "RNA* tools are not installed")
+    def test_thread_scan_matches_process_scan(self):
+        engine = get_engine('cli-pipe', PIPELINE_DIR)
+        wild_fold = engine.fold_wild_type(self.wild_sequence)
+        self.assertEqual(self.scan('thread', engine, wild_fold), self.scan('process', engine, wild_fold))
+
+    def test_thread_scan_refuses_vienna(self):
+        """ViennaRNA in a thread of the web process would block the eventlet hub."""
+        with self.assertRaises(ValueError):
+            self.scan('thread')
+
+    def test_run_in_worker(self):
+        self.assertEqual(run_in_worker(fold_wild_type, self.engine, PIPELINE_DIR, None, self.wild_sequence), self.wild_fold)
+        with tempfile.TemporaryDirectory() as directory:
+            run_in_worker(save_top_10_artifacts, self.engine, PIPELINE_DIR, directory,
+                          self.wild_fold, ['A_1_C'], ['C' + self.wild_sequence[1:]], directory)
+            self.assertTrue(os.path.exists(os.path.join(directory, 'top_10', '01_A_1_C', 'mut-dotbracket.txt')))
+
+    def test_check_stops_worker(self):
+        def check():
+            raise KeyboardInterrupt
+
+        started = time.monotonic()
+        with self.assertRaises(KeyboardInterrupt):
+            run_in_worker(fold_wild_type, self.engine, PIPELINE_DIR, None, 'GGGAAAUCCC' * 500, check=check)
+        self.assertLess(time.monotonic() - started, 10)
+
+    def test_cached_scan(self):
+        """The mutants are written to the cache once per scan, and not folded again by the next scan."""
+        with tempfile.TemporaryDirectory() as directory:
+            cache = FoldCache(directory)
+            with patch.object(FoldCache, 'write', wraps=cache.write) as write:
+                results = list(scan_mutations(generate_mutations(self.wild_sequence), self.engine, self.wild_fold,
+                                              PIPELINE_DIR, None, executor='process', workers=2, chunk_size=5, cache=cache))
+            self.assertEqual(write.call_count, 1)
+            self.assertEqual({result['Mutation']: result for result in results}, self.expected)
+
+            with patch('pipeline.scan.ProcessPoolExecutor.submit') as submit:
+                results = scan_mutations(generate_mutations(self.wild_sequence), self.engine, self.wild_fold,
+                                         PIPELINE_DIR, None, executor='process', workers=2, chunk_size=5,
+                                         cache=FoldCache(directory))
+                self.assertEqual({result['Mutation']: result for result in results}, self.expected)
+            submit.assert_not_called()
+
+    def test_check_stops_process_scan(self):
+        """An exception raised by check stops the workers before the scan finishes."""
+        wild_sequence = 'GGGAAAUCCCAUGCUAGCUAGGCAUCGAUCGAUGCUAGCUAGC' * 8
+        wild_fold = self.engine.fold_wild_type(wild_sequence)
+        started = time.monotonic()
+
+        def check():
+            if time.monotonic() - started > 1:
+                raise KeyboardInterrupt
+
+        with self.assertRaises(KeyboardInterrupt):
+            for _ in scan_mutations(generate_mutations(wild_sequence), self.engine, wild_fold, PIPELINE_DIR, None,
+                                    executor='process', workers=2, chunk_size=5, check=check):
+                pass
+        self.assertLess(time.monotonic() - started, 10)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -12,6 +12,18 @@ const generateRandomValidSequence = (length) => {
   return result;
 };
 
+// analyses are queued by the backend, results are available once the status is completed
+const waitForAnalysis = async (analysisId) => {
+  for (;;) {
+    const response = await request(apiUrl).get(`/api/status/${analysisId}`);
+    expect(response.status).toBe(200);
+    if (response.body.status === 'completed' || response.body.status === 'error') {
+      return response.body.status;
+    }
+    await new Promise((resolve) => setTimeout(resolve, 500));
+  }
+};
+
 const generateMutantSequence = (wildSequence) => {
   const characters = 'AUGC';
   const index = Math.floor(Math.random() * wildSequence.length);
@@ -40,8 +52,9 @@ describe('Integration Tests For Pair Analysis', () => {
     };
 
     const response = await request(apiUrl).post('/api/analyze/pair').send(newAnalysisData);
-    expect(response.status).toBe(200);
+    expect(response.status).toBe(202);
     expect(response.body).toHaveProperty('analysis_id', analysisId);
+    expect(await waitForAnalysis(analysisId)).toBe('completed');
   });
 
   test('should return analysis results for a given analysis ID', async () => {
@@ -67,8 +80,9 @@ describe('Integration Tests For Pair Analysis', () => {
     };
 
     const createResponse = await request(apiUrl).post('/api/analyze/pair').send(newAnalysisData);
-    expect(createResponse.status).toBe(200);
+    expect(createResponse.status).toBe(202);
     expect(createResponse.body).toHaveProperty('analysis_id');
+    expect(await waitForAnalysis(analysisId)).toBe('completed');
 
 
     const svgResponse = await request(apiUrl).get(`/api/results/pair/${analysisId}/rna-plot-mut`);
@@ -88,8 +102,9 @@ describe('Integration Tests For Pair Analysis', () => {
     };
 
     const createResponse = await request(apiUrl).post('/api/analyze/pair').send(newAnalysisData);
-    expect(createResponse.status).toBe(200);
+    expect(createResponse.status).toBe(202);
     expect(createResponse.body).toHaveProperty('analysis_id');
+    expect(await waitForAnalysis(analysisId)).toBe('completed');
 
     const response = await request(apiUrl).get(`/api/results/${analysisId}/zip-download`);
     expect(response.status).toBe(200);
@@ -111,8 +126,9 @@ describe('Integration Tests For Single Analysis', () => {
     };
 
     const response = await request(apiUrl).post('/api/analyze/single').send(newAnalysisData);
-    expect(response.status).toBe(200);
+    expect(response.status).toBe(202);
     expect(response.body).toHaveProperty('analysis_id', analysisId);
+    expect(await waitForAnalysis(analysisId)).toBe('completed');
   });
 
   test('should return single analysis results for a given analysis ID', async () => {
@@ -133,8 +149,9 @@ describe('Integration Tests For Single Analysis', () => {
     };
 
     const createResponse = await request(apiUrl).post('/api/analyze/single').send(newAnalysisData);
-    expect(createResponse.status).toBe(200);
+    expect(createResponse.status).toBe(202);
     expect(createResponse.body).toHaveProperty('analysis_id');
+    expect(await waitForAnalysis(analysisId)).toBe('completed');
 
     const response = await request(apiUrl).get(`/api/results/${analysisId}/zip-download`);
     expect(response.status).toBe(200);
@@ -51,6 +51,11 @@ const AnalysisPage = () => {
       console.log("RNAdistance: ", data.RNAdistance);
       setMutantSequence(data.mut_sequence);
       setWildSequence(data.wt_sequence);
+      // the result document already lists the SVG endpoints, null for a picture not drawn
+      setSvgUrlMut(data.svg?.["rna-plot-mut"] ?? null);
+      setSvgUrlWt(data.svg?.["rna-plot-wt"] ?? null);
+      setTreeSvgUrlMut(data.svg?.["hit-tree-mut"] ?? null);
+      setTreeSvgUrlWt(data.svg?.["hit-tree-wt"] ?? null);
       console.log("Mutant:", data.mut_sequence);
       console.log("Wild type:", data.wt_sequence);
     } catch (error) {
@@ -71,30 +76,6 @@ const AnalysisPage = () => {
     }
   }, [analysisId]);
   
-  const fetchSvgUrls = useCallback(async () => {
-    try {
-      const endpoints = {
-        svgMut: `/pair/${analysisId}/rna-plot-mut`,
-        svgWt: `/pair/${analysisId}/rna-plot-wt`,
-        treeMut: `/pair/${analysisId}/hit-tree-mut`,
-        treeWt: `/pair/${analysisId}/hit-tree-wt`,
-      };
-  
-      for (const [key, endpoint] of Object.entries(endpoints)) {
-        const response = await fetch(`/api/results${endpoint}`);
-        if (!response.ok) throw new Error(`Failed to fetch ${key}`);
-        const url = response.url;
-        if (key === "svgMut") setSvgUrlMut(url);
-        if (key === "svgWt") setSvgUrlWt(url);
-        if (key === "treeMut") setTreeSvgUrlMut(url);
-        if (key === "treeWt") setTreeSvgUrlWt(url);
-      }
-    } catch (error) {
-      console.error("Error fetching SVG URLs:", error);
-      setError("Failed to fetch SVG URLs");
-    }
-  }, [analysisId]);
-
   useEffect(() => {
     setMutantSequence(mut_sequence);
     setWildSequence(wt_sequence);
@@ -103,8 +84,7 @@ const AnalysisPage = () => {
   useEffect(() => {
     fetchResults();
     fetchDownloadUrl();
-    fetchSvgUrls();
-  }, [analysisId, fetchResults, fetchDownloadUrl, fetchSvgUrls]);
+  }, [analysisId, fetchResults, fetchDownloadUrl]);
   
   useEffect(() => {
     if (wildSequence && mutantSequence) {
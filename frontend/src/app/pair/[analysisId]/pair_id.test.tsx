@@ -84,6 +84,12 @@ describe('AnalysisPage', () => {
       RNAdistance: { RNAdistance_result: { f: 0.2, h: 0.3 }, RNAdistance_backtrack: 'backtrack_data' },
       mut_sequence: mutantSequence,
       wt_sequence: wildSequence,
+      svg: {
+        'rna-plot-mut': '/api/results/pair/12345/rna-plot-mut',
+        'rna-plot-wt': '/api/results/pair/12345/rna-plot-wt',
+        'hit-tree-mut': '/api/results/pair/12345/hit-tree-mut',
+        'hit-tree-wt': '/api/results/pair/12345/hit-tree-wt',
+      },
     };
 
     (fetch as jest.Mock)
@@ -94,22 +100,6 @@ describe('AnalysisPage', () => {
       .mockResolvedValueOnce({
         ok: true,
         blob: async () => new Blob(['test'], { type: 'application/zip' }),
-      })
-      .mockResolvedValueOnce({
-        ok: true,
-        url: 'http://localhost:8080/api/results/pair/12345/rna-plot-mut',
-      })
-      .mockResolvedValueOnce({
-        ok: true,
-        url: 'http://localhost:8080/api/results/pair/12345/rna-plot-wt',
-      })
-      .mockResolvedValueOnce({
-        ok: true,
-        url: 'http://localhost:8080/api/results/pair/12345/hit-tree-mut',
-      })
-      .mockResolvedValueOnce({
-        ok: true,
-        url: 'http://localhost:8080/api/results/pair/12345/hit-tree-wt',
       });
 
     renderWithProviders(<AnalysisPage />);
@@ -131,7 +121,7 @@ describe('AnalysisPage', () => {
     });
   });
 
-  test('displays error message when fetch SVG URLs fails', async () => {
+  test('shows no SVG the pipeline did not draw', async () => {
     (fetch as jest.Mock)
       .mockResolvedValueOnce({
         ok: true,
@@ -141,24 +131,21 @@ describe('AnalysisPage', () => {
           RNAdistance: { RNAdistance_result: { f: 0.2, h: 0.3 }, RNAdistance_backtrack: 'backtrack_data' },
           mut_sequence: mutantSequence,
           wt_sequence: wildSequence,
+          svg: { 'rna-plot-mut': null, 'rna-plot-wt': null, 'hit-tree-mut': null, 'hit-tree-wt': null },
         }),
       })
       .mockResolvedValueOnce({
         ok: true,
         blob: async () => new Blob(['test'], { type: 'application/zip' }),
-      })
-      .mockResolvedValueOnce({
-        ok: false,
-        url: '',
       });
 
     renderWithProviders(<AnalysisPage />);
 
     await waitFor(() => {
-      const errorMessage = screen.getByTestId('error-message');
-      expect(errorMessage).toBeInTheDocument();
-      console.log(errorMessage.textContent);
+      expect(screen.getByText(/backtrack_data/i)).toBeInTheDocument();
     });
+    expect(screen.queryByAltText('WT SVG')).not.toBeInTheDocument();
+    expect(screen.queryByAltText('TREE MUT SVG')).not.toBeInTheDocument();
   });
 
   test('displays error message when fetch fails', async () => {
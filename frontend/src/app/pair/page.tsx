@@ -1,11 +1,39 @@
 "use client"; //rendering on the client's side - must have for hooks like useState
-import React, { useEffect, useState} from "react";
+import React, { useEffect, useRef, useState} from "react";
 import { useRouter } from "next/navigation";
 import io from "socket.io-client";
 import { useTheme } from "next-themes";
 import { v4 as uuidv4 } from "uuid";
 import "../../styles/index.css";
 
+// analyses run in the background, the results page is opened once the analysis is finished
+const STATUS_POLL_INTERVAL = 1000;
+// a pair analysis takes seconds, give up on the status after 10 minutes
+const MAX_STATUS_POLLS = 600;
+
+const sleep = (ms: number, signal: AbortSignal) =>
+  new Promise<void>((resolve, reject) => {
+    const timer = setTimeout(resolve, ms);
+    signal.addEventListener("abort", () => {
+      clearTimeout(timer);
+      reject(new DOMException("Aborted", "AbortError"));
+    }, { once: true });
+  });
+
+const waitForAnalysis = async (analysisId: string, signal: AbortSignal) => {
+  for (let poll = 0; poll < MAX_STATUS_POLLS; poll++) {
+    const response = await fetch(`/api/status/${analysisId}`, { signal });
+    if (!response.ok) throw new Error("Failed to fetch the analysis status.");
+    const data = await response.json();
+    if (data.status === "completed") return;
+    if (data.status === "error") throw new Error("Analysis failed.");
+    await sleep(STATUS_POLL_INTERVAL, signal);
+  }
+  throw new Error("The analysis is taking too long, check its results later.");
+};
+
+const isAbort = (err: unknown) => err instanceof DOMException && err.name === "AbortError";
+
 const PairPage = () => {
   const [analysisId] = useState(uuidv4());
   const [mutantSequence, setMutantSequence] = useState<string>("");
@@ -16,6 +44,8 @@ const PairPage = () => {
   const [fetchDbSnp, setFetchDbSnp] = useState<boolean>(false);
   const [isSubmitted, setIsSubmitted] = useState<boolean>(false);
   const router = useRouter();
+  // stops waiting for the analysis when the page is left
+  const statusPolling = useRef<AbortController | null>(null);
 
   const MAX_SEQUENCE_LENGTH = 2000;
   const MIN_SEQUENCE_LENGTH = 10;
@@ -50,6 +80,10 @@ const PairPage = () => {
     };
   }, [message, analysisId]);
 
+  useEffect(() => {
+    return () => statusPolling.current?.abort();
+  }, []);
+
   useEffect(() => {
     const searchParams = new URLSearchParams(window.location.search);
     const mut_sequence = searchParams.get('mut_sequence');
@@ -281,11 +315,21 @@ const PairPage = () => {
         body: JSON.stringify({ analysisId: analysisId, mutantSequence, wildSequence }),
       });
   
-      if (!response.ok) throw new Error("Failed to start analysis");
+      if (!response.ok) {
+        // long sequences and busy servers are refused with the reason in "error"
+        const errorData = await response.json().catch(() => ({}));
+        throw new Error(errorData.error || "Failed to start analysis");
+      }
   
       const responseData = await response.json();
+      if (response.status === 202) {
+        statusPolling.current = new AbortController();
+        await waitForAnalysis(responseData.analysis_id, statusPolling.current.signal);
+      }
       router.push(`/pair/${responseData.analysis_id}`);
     } catch (err) {
+      // the page was left while waiting, nothing to show
+      if (isAbort(err)) return;
       setError(err instanceof Error ? err.message : "An unknown error occurred");
       setIsSubmitted(false);
     }
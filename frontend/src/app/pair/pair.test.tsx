@@ -100,6 +100,36 @@ describe('PairPage', () => {
     });
   });
 
+  test('stops polling the status when the page is left', async () => {
+    const { unmount } = renderWithProviders(<PairPage />);
+    const wildSequence = generateRandomValidSequence(100);
+
+    fireEvent.change(screen.getByPlaceholderText(/Enter Mutant RNA Sequence/i), { target: { value: generateMutantSequence(wildSequence) } });
+    fireEvent.change(screen.getByPlaceholderText(/Enter Wild-type RNA Sequence/i), { target: { value: wildSequence } });
+
+    (fetch as jest.Mock)
+      .mockResolvedValueOnce({
+        ok: true,
+        status: 202,
+        json: async () => ({ analysis_id: '12345' }),
+      })
+      .mockResolvedValue({
+        ok: true,
+        json: async () => ({ status: 'in_progress' }),
+      });
+
+    fireEvent.click(screen.getByText(/Submit/i));
+
+    await waitFor(() => {
+      expect(fetch).toHaveBeenCalledWith('/api/status/12345', expect.anything());
+    });
+    const { signal } = (fetch as jest.Mock).mock.calls[1][1];
+    unmount();
+
+    expect(signal.aborted).toBe(true);
+    expect(mockPush).not.toHaveBeenCalled();
+  });
+
   test('displays error when sequences are too long', async () => {
     renderWithProviders(<PairPage />);
     const mutantInput = screen.getByPlaceholderText(/Enter Mutant RNA Sequence/i);
@@ -6,6 +6,7 @@ import { useTheme } from "next-themes";
 
 import { useSearchParams } from 'next/navigation';
 import { useRouter } from "next/navigation";
+import io from "socket.io-client";
 import "../../../styles/index.css";
 
 interface TaskStatus {
@@ -26,6 +27,21 @@ interface CombinedText {
   rows: DataRow[];
 }
 
+interface Top10Update {
+  provisional: boolean;
+  rows: DataRow[];
+}
+
+const TOP_10_COLUMNS = ["no", "Mutation", "RNApdist", "RNAdistance(f)", "Z-score"];
+
+// the analysis is still queued or scanned, its results file does not exist yet
+const isRunning = async (analysisId: string | string[]) => {
+  const response = await fetch(`/api/status/${analysisId}`);
+  if (!response.ok) return false;
+  const data = await response.json();
+  return data.status === "pending" || data.status === "in_progress";
+};
+
 interface ApiResponse {
   csv_data: CombinedText;
   wt_sequence: string;
@@ -44,6 +60,9 @@ const AnalysisResults = () => {
   const [combinedText, setCombinedText] = useState<CombinedText | null>(null);
   const [wildSequence, setWildSequence] = useState<string | null>(null);
   const [mutantSequences, setMutantSequences] = useState<{ [key: string]: string }>({});
+  const [running, setRunning] = useState(false);
+  const [provisional, setProvisional] = useState(false);
+  const [progress, setProgress] = useState<string | null>(null);
   const [sortConfig, setSortConfig] = useState<{ key: string | null; direction: "asc" | "desc" }>({
     key: null,
     direction: "asc",
@@ -59,15 +78,24 @@ const AnalysisResults = () => {
     try {
       console.log("Fetching results");
       const response = await fetch(`/api/results/single/${analysisId}`);
-      if (!response.ok) throw new Error("Failed to fetch results");
+      if (!response.ok) {
+        // the page is opened as soon as the analysis is queued, the socket sends the top 10 until it ends
+        if (response.status === 404 && (await isRunning(analysisId))) {
+          setRunning(true);
+          return false;
+        }
+        throw new Error("Failed to fetch results");
+      }
 
       const data: ApiResponse = await response.json();
       console.log("Fetched results:", data);
       setCombinedText(data.csv_data);
       setWildSequence(data.wt_sequence);
       setMutantSequences(data.mutant_sequences);
+      return true;
     } catch (err: unknown) {
       setError(err instanceof Error ? err.message : "An unknown error occurred while fetching combined text");
+      return false;
     }
   }, [analysisId]);
 
@@ -84,12 +112,54 @@ const AnalysisResults = () => {
     }
   }, [analysisId]);
 
+  const loadResults = useCallback(async () => {
+    if (await fetchResults()) {
+      fetchResultsZIP();
+    }
+  }, [fetchResults, fetchResultsZIP]);
+
   useEffect(() => {
+      loadResults();
+  }, [analysisId, loadResults]);
 
-      console.log("Program reached the point where analysis is completed.");
-      fetchResults();
-      fetchResultsZIP();
-  }, [analysisId, fetchResults, fetchResultsZIP]);
+  useEffect(() => {
+    const socket = io(`/${analysisId}`, {
+      transports: ["websocket"],
+      path: "/socket.io",
+      autoConnect: true,
+      reconnection: true,
+      reconnectionAttempts: 5,
+      reconnectionDelay: 1000,
+    });
+
+    // an analysis finished before the socket connected sent its events to nobody
+    socket.on("connect", () => {
+      loadResults();
+    });
+
+    socket.on("progress_update", (data: { progress: string }) => {
+      setProgress(data.progress);
+    });
+
+    socket.on("top_10_update", (data: Top10Update) => {
+      setCombinedText({ columns: TOP_10_COLUMNS, rows: data.rows });
+      setProvisional(data.provisional);
+    });
+
+    socket.on("task_status", (data: TaskStatus) => {
+      if (data.analysis_id !== analysisId || data.status === "Analysis started") return;
+      setRunning(false);
+      if (data.status === "Analysis completed") {
+        loadResults();
+      } else {
+        setError(data.status);
+      }
+    });
+
+    return () => {
+      socket.disconnect();
+    };
+  }, [analysisId, loadResults]);
 
   const handleSort = (key: string) => {
     setSortConfig((prev) => {
@@ -111,6 +181,8 @@ const AnalysisResults = () => {
 
     const handleRowClick = (row) => {
       const mutantSequence = mutantSequences[row.no];
+      // the sequences of the top 10 are saved when the scan ends
+      if (!mutantSequence) return;
       const query = new URLSearchParams({
         mut_sequence: mutantSequence,
         wt_sequence: wildSequence,
@@ -144,6 +216,20 @@ const AnalysisResults = () => {
           </div>
         </div>
     
+        {running && (
+          <>
+            <div className="relative mb-6 h-4 rounded-full bg-gray-200 dark:bg-gray-700">
+              <div
+                className="absolute h-4 rounded-full transition-all duration-300 bg-green-400 dark:bg-green-500"
+                style={{ width: `${progress ?? 0}%` }}
+              ></div>
+            </div>
+            <p data-testid="progress" className="text-sm text-center mb-4">
+              {progress ?? 0}% Completed{provisional ? " - best mutants so far:" : ""}
+            </p>
+          </>
+        )}
+    
         {combinedText && (
           <div className="overflow-x-auto mb-6 rounded-sm bg-gray-100 dark:bg-gray-700">
             <table className="min-w-full table-auto border-collapse">
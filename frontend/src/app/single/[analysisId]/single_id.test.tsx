@@ -1,4 +1,4 @@
-import { render, screen, fireEvent, waitFor } from '@testing-library/react';
+import { render, screen, fireEvent, waitFor, act } from '@testing-library/react';
 import AnalysisResults from './page';
 import { ThemeProvider } from 'next-themes';
 import { useRouter, useParams, useSearchParams } from 'next/navigation';
@@ -9,6 +9,18 @@ jest.mock('next/navigation', () => ({
   useSearchParams: jest.fn(),
 }));
 
+// handlers registered by the page, called by the tests in place of the server
+const mockSocketHandlers = {};
+jest.mock('socket.io-client', () => ({
+  __esModule: true,
+  default: jest.fn(() => ({
+    on: (event, handler) => {
+      mockSocketHandlers[event] = handler;
+    },
+    disconnect: jest.fn(),
+  })),
+}));
+
 const renderWithProviders = (ui) => {
   return render(
     <ThemeProvider>
@@ -91,6 +103,50 @@ describe('AnalysisResults', () => {
     });
   });
 
+  test('follows a running analysis with the socket', async () => {
+    (fetch as jest.Mock).mockReset();
+    (fetch as jest.Mock)
+      .mockResolvedValueOnce({ ok: false, status: 404, json: async () => ({ error: 'File not found' }) })
+      .mockResolvedValueOnce({ ok: true, json: async () => ({ analysis_id: '12345', status: 'in_progress' }) });
+
+    renderWithProviders(<AnalysisResults />);
+
+    await waitFor(() => {
+      expect(screen.getByTestId('progress')).toBeInTheDocument();
+    });
+    expect(screen.queryByTestId('error-message')).not.toBeInTheDocument();
+
+    act(() => {
+      mockSocketHandlers['progress_update']({ progress: '42.00' });
+      mockSocketHandlers['top_10_update']({
+        provisional: true,
+        rows: [{ no: 1, Mutation: 'A_1_C', RNApdist: 0.4, 'RNAdistance(f)': 0.5, 'Z-score': 0.6 }],
+      });
+    });
+    expect(screen.getByText(/42.00% Completed/i)).toBeInTheDocument();
+    expect(screen.getByText('A_1_C')).toBeInTheDocument();
+
+    const mockResponse = {
+      csv_data: { columns: ['col1', 'col2'], rows: [{ no: 1, Mutation: 'A_1_C', RNApdist: 0.4, 'RNAdistance(f)': 0.5, 'Z-score': 0.6 }] },
+      wt_sequence: generateRandomValidSequence(50),
+      mutant_sequences: { 1: generateRandomValidSequence(50) },
+    };
+    (fetch as jest.Mock).mockResolvedValueOnce({
+      ok: true,
+      json: async () => mockResponse,
+    });
+
+    act(() => {
+      mockSocketHandlers['task_status']({ analysis_id: '12345', status: 'Analysis completed' });
+    });
+
+    await waitFor(() => {
+      expect(screen.queryByTestId('progress')).not.toBeInTheDocument();
+      expect(screen.getByText(mockResponse.wt_sequence)).toBeInTheDocument();
+    });
+    expect(fetch).toHaveBeenCalledWith('/api/results/single/12345');
+  });
+
   test('handles row click and navigates to pair page', async () => {
     const mockResponse = {
       csv_data: { columns: ['col1', 'col2'], rows: [{ no: 1, Mutation: 'mut1', RNApdist: 0.1, 'RNAdistance(f)': 0.2, 'Z-score': 0.3 }] },
@@ -246,8 +246,13 @@ const SinglePage = () => {
         body: JSON.stringify({ analysisId: analysisId, wildSequence }),
       });
 
-      if (!response.ok) throw new Error("Failed to start analysis.");
+      if (!response.ok) {
+        // long sequences and busy servers are refused with the reason in "error"
+        const errorData = await response.json().catch(() => ({}));
+        throw new Error(errorData.error || "Failed to start analysis.");
+      }
 
+      // the analysis is queued (202), the results page follows it until the results are ready
       const responseData = await response.json();
       router.push(`/single/${responseData.analysis_id}`);
     } catch (err) {
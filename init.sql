@@ -1,4 +1,5 @@
 -- Create the database
+-- (later schema changes are applied by the backend at startup, see backend/migrations.py)
 CREATE DATABASE IF NOT EXISTS SNPsniper_database;
 USE SNPsniper_database;
 